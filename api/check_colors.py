@@ -0,0 +1,71 @@
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+
+from utils.color_difference import color_palettes, match_colors, parse_color
+from utils.delta_e import DEFAULT_METRIC
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.server import cancel_on_disconnect, ops_router, rejection_response, request_deadline
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+STAGES = ("palette_match",)
+MAX_COLORS = 200  # colours per request
+
+
+class CheckColorsRequest(BaseModel):
+    colors: List[Union[str, List[int]]] = Field(..., max_length=MAX_COLORS)
+    season: Optional[str] = None
+    seasons: Optional[List[str]] = None
+    threshold: float = 40
+    metric: str = DEFAULT_METRIC
+
+
+@app.post("/api/check_colors")
+async def check_colors_api(request: Request, body: CheckColorsRequest):
+    """
+    Check a list of colours (hex or RGB) against one season, or several, in
+    one call: for every colour and season, the minimum distance to the
+    palette, the nearest swatch and whether the colour is allowed.
+    """
+    try:
+        colors = [parse_color(c) for c in body.colors]
+        seasons = list(body.seasons or [])
+        if body.season is not None:
+            seasons.insert(0, body.season)
+        if not seasons:
+            raise ValueError("Provide a season or a list of seasons.")
+        seasons = list(dict.fromkeys(seasons))
+        unknown = [season for season in seasons if season not in color_palettes]
+        if unknown:
+            raise ValueError(f"Unknown season: {', '.join(unknown)}. Choose from {', '.join(color_palettes)}.")
+
+        deadline = request_deadline(request)
+        with track_request("check_colors") as record:
+            async with get_executor().admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline):
+                record.ticket = ticket
+                matches = await ticket.run(
+                    match_colors, colors, seasons, body.threshold, body.metric, pool="process", stage="palette_match"
+                ) if colors else []
+        return {
+            "seasons": seasons,
+            "results": [{"color": list(c), "seasons": m} for c, m in zip(colors, matches)],
+            "message": "Color check successful.",
+            "timings": ticket.timings(),
+        }
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
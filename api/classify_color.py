@@ -1,61 +1,137 @@
-from fastapi import FastAPI, File, Form, UploadFile
-from pydantic import BaseModel
-import numpy as np
-from PIL import Image
-from utils.identify_clothing_color import process_image_with_combined_method
-from utils.color_difference import color_is_allowed
-from io import BytesIO
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from utils.identify_clothing_color import (
+    KMEANS_K, choose_k, dominant_colors, foreground_mask, kmeans_options, parse_k, process_image_with_combined_method,
+)
+from utils.garment_palette import palette_clusters
+from utils.color_difference import color_is_allowed, match_colors
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.server import cancel_on_disconnect, decode_image, ops_router, rejection_response, request_deadline
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 app = FastAPI()
+app.include_router(ops_router)
+
+STAGES = ("decode", "garment_color", "palette_match")
+AUTO_K_STAGES = ("decode", "auto_k", "garment_color", "palette_match")
+PALETTE_STAGES = ("decode", "garment_palette")
+MODES = ("kmeans", "palette", "colors")
+# Clustering engine, sample size and default k come from the environment
+# (see utils.identify_clothing_color.kmeans_options); requests can override k.
+kmeans_options()  # fail at startup on an unknown engine
+parse_k(KMEANS_K)  # or an invalid default k
+
+def _choose_k(image_np, foreground_only):
+    """choose_k over the pixels the clustering stage will see."""
+    mask = foreground_mask(image_np) if foreground_only else None
+    return choose_k(image_np, mask, seed=0)[0]
 
 @app.post("/api/classify_color")
-async def classify_season_api(file: UploadFile = File(...), season_dict: str = Form(...)):
+async def classify_season_api(request: Request, file: UploadFile = File(...), season_dict: str = Form(...),
+                              mode: str = Form("kmeans"), k: str = Form(KMEANS_K)):
     """
     Serverless function to classify a season based on an uploaded image.
+
+    mode "kmeans" checks the k-means garment colour against the season.
+    mode "palette" clusters the garment from the season's own swatches
+    (utils.garment_palette) and also returns the share of garment pixels
+    near an allowed swatch and the clusters found.
+    mode "colors" returns the k dominant colours with the share of the
+    garment each covers, each checked against the season, so the client
+    can pick primary and secondary colours; the verdict is the largest's.
+    k is the number of clusters for "kmeans" and "colors", or "auto" to
+    pick it per image; the k used is returned.
     """
-    print(season_dict)
     try:
-        print(f"Received file: {file.filename}")
+        logger.debug("Received file: %s, season_dict: %s", file.filename, season_dict)
         # Read the uploaded image file
         contents = await file.read()
 
         season = json.loads(season_dict)
-        print(season)
         season = season["season"]
-        print("HERE: ", season)
-        
 
-        pil_image = Image.open(BytesIO(contents)).convert("RGB")
-        print("PIL Image Mode:", pil_image.mode)  # Debug print
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}. Choose from {', '.join(MODES)}.")
+        k = parse_k(k)
+        plan = AUTO_K_STAGES if k == "auto" else STAGES
 
-        image_np = np.array(pil_image)
-        print("Image Shape:", image_np.shape)  # Debug print
-        
-        if image_np is None or len(image_np.shape) != 3 or image_np.shape[-1] != 3:  # Validate the image
-            raise ValueError("Invalid image file or incorrect number of channels (not RGB).")
+        deadline = request_deadline(request)
+        if mode == "palette":
+            with track_request("classify_color", contents) as record:
+                async with get_executor().admit(deadline, PALETTE_STAGES) as ticket, \
+                        cancel_on_disconnect(request, deadline):
+                    record.ticket = ticket
+                    record.engines["kmeans"] = "palette-seeded"
+                    image_np = await ticket.run(decode_image, contents, stage="decode")
+                    result = await ticket.run(palette_clusters, image_np, season, stage="garment_palette")
+            return {
+                "color is allowed (T/F)": result["allowed"],
+                "allowed fraction": result["allowed_fraction"],
+                "clusters": result["clusters"],
+                "message": "Color identification successful.",
+                "timings": ticket.timings(),
+            }
 
-        
-        clothing_color = process_image_with_combined_method(image_np)
-        print("Clothing Color:", clothing_color)  # Debug print
+        if mode == "colors":
+            with track_request("classify_color", contents) as record:
+                async with get_executor().admit(deadline, plan) as ticket, cancel_on_disconnect(request, deadline):
+                    record.ticket = ticket
+                    sampling, record.engines["kmeans"] = kmeans_options()
+                    sampling["foreground_only"] = True
+                    image_np = await ticket.run(decode_image, contents, stage="decode")
+                    if k == "auto":
+                        k = await ticket.run(_choose_k, image_np, True, stage="auto_k")
+                    colors = await ticket.run(
+                        dominant_colors, image_np, stage="garment_color", k=k, **sampling
+                    )
+                    if not colors:
+                        raise ValueError("Could not identify clothing color.")
+                    matches = await ticket.run(
+                        match_colors, [rgb for rgb, _ in colors], [season], pool="process", stage="palette_match"
+                    )
+            results = [
+                {"rgb": list(rgb), "coverage": coverage, **match[season]}
+                for (rgb, coverage), match in zip(colors, matches)
+            ]
+            return {
+                "color is allowed (T/F)": results[0]["allowed"],
+                "allowed coverage": sum(r["coverage"] for r in results if r["allowed"]),
+                "colors": results,
+                "k": k,
+                "message": "Color identification successful.",
+                "timings": ticket.timings(),
+            }
 
-        if clothing_color is None or len(clothing_color) != 3:
-            raise ValueError("Could not identify clothing color.")
-        
-        print("identifying clothing color exited sucessfully")
+        with track_request("classify_color", contents) as record:
+            async with get_executor().admit(deadline, plan) as ticket, cancel_on_disconnect(request, deadline):
+                record.ticket = ticket
+                sampling, record.engines["kmeans"] = kmeans_options()
+                image_np = await ticket.run(decode_image, contents, stage="decode")
+                logger.debug("Image Shape: %s", image_np.shape)
+                if k == "auto":
+                    k = await ticket.run(_choose_k, image_np, sampling.get("foreground_only", False), stage="auto_k")
+
+                clothing_color = await ticket.run(
+                    process_image_with_combined_method, image_np, stage="garment_color",
+                    k=k, **sampling
+                )
+                logger.debug("Clothing Color: %s", clothing_color)
+
+                if clothing_color is None or len(clothing_color) != 3:
+                    raise ValueError("Could not identify clothing color.")
 
-        allowed = color_is_allowed(clothing_color, season)
-        print(allowed)
-        print(clothing_color)
+                allowed = await ticket.run(color_is_allowed, clothing_color, season, pool="process", stage="palette_match")
+        logger.debug("Color allowed: %s", allowed)
         return{
             "color is allowed (T/F)": allowed,
-            "message": "Color identification successful."
+            "k": k,
+            "message": "Color identification successful.",
+            "timings": ticket.timings(),
         }
-        #TODO: Would like to have
-        # return{
-        #     "color is allowed (T/F)": allowed,
-        #     "RGB value of clothing": list(clothing_color),
-        #     "message": "Color identification successful."
-        # }
+    except ExecutorRejected as e:
+        return rejection_response(e)
     except Exception as e:
         return {"error": str(e)}
         
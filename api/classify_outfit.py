@@ -0,0 +1,89 @@
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+import logging
+from utils.getData import features_from_parsing, garment_color_from_parsing, parse_face
+from utils.classify import score_seasons
+from utils.color_difference import color_is_allowed
+from utils.degradation import get_degradation_controller
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.identify_clothing_color import KMEANS_K, kmeans_options, parse_k
+from utils.server import cancel_on_disconnect, decode_image, ops_router, rejection_response, request_deadline
+
+logger = logging.getLogger(__name__)
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+STAGES = ("decode", "parse", "features", "classify", "garment_color", "palette_match")
+# Same clustering configuration as /api/classify_color.
+kmeans_options()  # fail at startup on an unknown engine
+GARMENT_K = parse_k(KMEANS_K)
+
+
+@app.post("/api/classify_outfit")
+async def classify_outfit_api(request: Request, file: UploadFile = File(...)):
+    """
+    Season and outfit check from one photo of a person wearing the garment.
+
+    The image is decoded and parsed by BiSeNet once. The parsing gives the
+    face features, and so the season, and its cloth class gives the garment
+    pixels, whose colour is then checked against that season. Photos
+    without clothing in the parsing fall back to the white-background
+    garment method.
+    """
+    try:
+        contents = await file.read()
+
+        deadline = request_deadline(request)
+        executor = get_executor()
+        controller = get_degradation_controller()
+        tier = controller.current()
+        options, kmeans_label = kmeans_options()
+        with track_request("classify_outfit", contents) as record:
+            async with executor.admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline), \
+                    controller.observing(deadline):
+                record.ticket = ticket
+                record.engines["tier"] = tier.name
+                record.engines["kmeans"] = kmeans_label
+                image_np = await ticket.run(decode_image, contents, stage="decode")
+
+                resized_image, parsing = await ticket.run(parse_face, image_np, stage="parse", **tier.parse_options())
+                features = await ticket.run(
+                    features_from_parsing, resized_image, parsing, stage="features", **tier.feature_options()
+                )
+                scores = await ticket.run(
+                    score_seasons, features["skin_color"], features["hair_color"], features["eye_color"],
+                    features["undertone"], pool="process", stage="classify",
+                )
+
+                clothing_color, source = await ticket.run(
+                    garment_color_from_parsing, image_np, parsing, stage="garment_color", k=GARMENT_K, **options
+                )
+                palette = scores["palette"]
+                allowed = await ticket.run(
+                    color_is_allowed, clothing_color, palette, pool="process", stage="palette_match"
+                )
+        logger.debug("Season %s, garment %s from %s, allowed %s", scores["season"], clothing_color, source, allowed)
+
+        return {
+            "season": scores["season"],
+            "margin": scores["margin"],
+            "tier": tier.name,
+            "clothing color": [int(c) for c in clothing_color],
+            "clothing source": source,
+            "color is allowed (T/F)": allowed,
+            "message": "Season and outfit classification successful.",
+            "timings": ticket.timings(),
+        }
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
@@ -1,12 +1,14 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-import numpy as np
-import cv2
-from PIL import Image
-from utils.getData import extract_features
-from utils.classify import classify_season
-from io import BytesIO
+import logging
+from utils.getData import features_from_parsing, parse_face
+from utils.classify import score_seasons
+from utils.degradation import get_degradation_controller
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.server import cancel_on_disconnect, decode_image, ops_router, rejection_response, request_deadline
 
+logger = logging.getLogger(__name__)
 app = FastAPI()
 
 app.add_middleware(
@@ -16,45 +18,58 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.include_router(ops_router)
+
+STAGES = ("decode", "parse", "features", "classify")
 
 
 @app.post("/api/classify_season")
-async def classify_season_api(file: UploadFile = File(...)):
+async def classify_season_api(request: Request, file: UploadFile = File(...)):
     #print("FastAPI app is running with endpoints:", app.routes)
 
     """
     Serverless function to classify a season based on an uploaded image.
     """
     try:
-        print(f"Received file: {file.filename}")
+        logger.debug("Received file: %s", file.filename)
         # Read the uploaded image file
         contents = await file.read()
 
-        pil_image = Image.open(BytesIO(contents)).convert("RGB")
-        print("PIL Image Mode:", pil_image.mode)  # Debug print
-
-        image_np = np.array(pil_image)
-        print("Image Shape:", image_np.shape)  # Debug print
-        
-        if image_np is None or len(image_np.shape) != 3 or image_np.shape[-1] != 3:  # Validate the image
-            raise ValueError("Invalid image file or incorrect number of channels (not RGB).")
+        deadline = request_deadline(request)
+        executor = get_executor()
+        controller = get_degradation_controller()
+        tier = controller.current()
+        with track_request("classify_season", contents) as record:
+            async with executor.admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline), \
+                    controller.observing(deadline):
+                record.ticket = ticket
+                record.engines["tier"] = tier.name
+                image_np = await ticket.run(decode_image, contents, stage="decode")
+                logger.debug("Image Shape: %s", image_np.shape)
 
-        
-        features = extract_features(image_np)
-        print("Extracted Features:", features)  # Debug print
+                resized_image, parsing = await ticket.run(parse_face, image_np, stage="parse", **tier.parse_options())
+                features = await ticket.run(
+                    features_from_parsing, resized_image, parsing, stage="features", **tier.feature_options()
+                )
+                logger.debug("Extracted Features: %s", features)
 
-        skin_rgb = features["skin_color"]
-        hair_rgb = features["hair_color"]
-        eye_rgb = features["eye_color"]
-        tone = features["undertone"]
-        print("get data exited sucessfully")
+                skin_rgb = features["skin_color"]
+                hair_rgb = features["hair_color"]
+                eye_rgb = features["eye_color"]
+                tone = features["undertone"]
 
-        season = classify_season(skin_rgb, hair_rgb, eye_rgb, tone)
+                scores = await ticket.run(score_seasons, skin_rgb, hair_rgb, eye_rgb, tone, pool="process", stage="classify")
 
         return{
-            "season": season,
-            "message": "Color season classification successful."
+            "season": scores["season"],
+            "margin": scores["margin"],
+            "scores": scores["scores"],
+            "tier": tier.name,
+            "message": "Color season classification successful.",
+            "timings": ticket.timings(),
         }
+    except ExecutorRejected as e:
+        return rejection_response(e)
     except Exception as e:
         return {"error": str(e)}
         
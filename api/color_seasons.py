@@ -0,0 +1,60 @@
+from typing import List, Union
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from utils.color_difference import parse_color, seasons_for_color
+from utils.delta_e import DEFAULT_METRIC
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.server import cancel_on_disconnect, ops_router, rejection_response, request_deadline
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+STAGES = ("palette_match",)
+
+
+class ColorSeasonsRequest(BaseModel):
+    color: Union[str, List[int]]
+    threshold: float = 40
+    metric: str = DEFAULT_METRIC
+
+
+@app.post("/api/color_seasons")
+async def color_seasons_api(request: Request, body: ColorSeasonsRequest):
+    """
+    For one garment colour, list every season with its minimum distance, the
+    nearest palette swatch and whether the colour is allowed. The optional
+    metric picks the colour difference (see utils.delta_e); thresholds are
+    metric-specific.
+    """
+    try:
+        color = parse_color(body.color)
+
+        deadline = request_deadline(request)
+        with track_request("color_seasons") as record:
+            async with get_executor().admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline):
+                record.ticket = ticket
+                seasons = await ticket.run(
+                    seasons_for_color, color, body.threshold, body.metric, stage="palette_match"
+                )
+        return {
+            "color": list(color),
+            "seasons": sorted(seasons, key=lambda s: s["delta_e"]),
+            "message": "Color season lookup successful.",
+            "timings": ticket.timings(),
+        }
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,177 @@
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from utils.color_difference import parse_color
+from utils.custom_palettes import get_custom_palettes
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.server import cancel_on_disconnect, ops_router, rejection_response, request_deadline
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+Color = Union[str, List[int]]
+
+
+class CreatePaletteRequest(BaseModel):
+    name: str
+    swatches: List[Color]
+
+
+class UpdatePaletteRequest(BaseModel):
+    name: Optional[str] = None
+    swatches: Optional[List[Color]] = None
+    add: List[Color] = []
+    remove: List[Color] = []
+
+
+class CheckRequest(BaseModel):
+    colors: List[Color]
+    threshold: float = 40
+
+
+class NearestRequest(BaseModel):
+    colors: List[Color]
+    k: int = 5
+
+
+async def _run(request, stage, fn, *args):
+    """
+    Run one registry operation as an admitted request on the executor. The
+    registry does SQLite writes and CAM02-UCS conversions, and its first use
+    bulk-loads every stored palette, none of which belongs on the event loop.
+    """
+    deadline = request_deadline(request)
+    with track_request("custom_palettes") as record:
+        async with get_executor().admit(deadline, (stage,)) as ticket, cancel_on_disconnect(request, deadline):
+            record.ticket = ticket
+            return await ticket.run(fn, *args, stage=stage)
+
+
+def _create(name, swatches):
+    palettes = get_custom_palettes()
+    return palettes.get(palettes.create(name, swatches))
+
+
+def _update(palette_id, name, swatches, add, remove):
+    palettes = get_custom_palettes()
+    palettes.update(palette_id, name, swatches, add, remove)
+    return palettes.get(palette_id)
+
+
+def _list():
+    return get_custom_palettes().list()
+
+
+def _get(palette_id):
+    return get_custom_palettes().get(palette_id)
+
+
+def _delete(palette_id):
+    get_custom_palettes().delete(palette_id)
+
+
+def _check(palette_id, colors, threshold):
+    return get_custom_palettes().check(palette_id, colors, threshold) if colors else []
+
+
+def _nearest(palette_id, colors, k):
+    return get_custom_palettes().nearest(palette_id, colors, k)
+
+
+@app.post("/api/custom_palettes")
+async def create_palette_api(request: Request, body: CreatePaletteRequest):
+    """Register a custom palette and return it with its new id."""
+    try:
+        palette = await _run(request, "custom_palette_write", _create, body.name, body.swatches)
+        return {"palette": palette, "message": "Palette created."}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.get("/api/custom_palettes")
+async def list_palettes_api(request: Request):
+    """Ids and names of every custom palette."""
+    try:
+        return {"palettes": await _run(request, "custom_palette_read", _list)}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.get("/api/custom_palettes/{palette_id}")
+async def get_palette_api(request: Request, palette_id: str):
+    try:
+        return {"palette": await _run(request, "custom_palette_read", _get, palette_id)}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.put("/api/custom_palettes/{palette_id}")
+async def update_palette_api(request: Request, palette_id: str, body: UpdatePaletteRequest):
+    """
+    Rename a palette and/or change its swatches: replace them all with
+    swatches, or add and remove individual ones.
+    """
+    try:
+        palette = await _run(
+            request, "custom_palette_write", _update, palette_id, body.name, body.swatches, body.add, body.remove
+        )
+        return {"palette": palette, "message": "Palette updated."}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.delete("/api/custom_palettes/{palette_id}")
+async def delete_palette_api(request: Request, palette_id: str):
+    try:
+        await _run(request, "custom_palette_write", _delete, palette_id)
+        return {"message": "Palette deleted."}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.post("/api/custom_palettes/{palette_id}/check")
+async def check_palette_api(request: Request, palette_id: str, body: CheckRequest):
+    """For each colour: minimum distance, nearest swatch and whether it is allowed."""
+    try:
+        colors = [parse_color(c) for c in body.colors]
+        results = await _run(request, "palette_match", _check, palette_id, colors, body.threshold)
+        return {"results": [{"color": list(c), **r} for c, r in zip(colors, results)]}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.post("/api/custom_palettes/{palette_id}/nearest")
+async def nearest_palette_api(request: Request, palette_id: str, body: NearestRequest):
+    """The k nearest swatches of the palette for each colour."""
+    try:
+        colors = [parse_color(c) for c in body.colors]
+        matches = await _run(request, "nearest_swatches", _nearest, palette_id, colors, body.k)
+        return {"results": [{"color": list(c), "swatches": m} for c, m in zip(colors, matches)]}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,60 @@
+from typing import List, Optional, Union
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+
+from utils.color_difference import color_palettes, nearest_swatches, parse_color
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.server import cancel_on_disconnect, ops_router, rejection_response, request_deadline
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+STAGES = ("nearest_swatches",)
+MAX_COLORS = 200  # colours per request
+
+
+class NearestSwatchesRequest(BaseModel):
+    colors: List[Union[str, List[int]]] = Field(..., max_length=MAX_COLORS)
+    k: int = 5
+    season: Optional[str] = None
+    radius: Optional[float] = None
+
+
+@app.post("/api/nearest_swatches")
+async def nearest_swatches_api(request: Request, body: NearestSwatchesRequest):
+    """
+    Closest palette swatches ("closest allowed alternatives") for each colour,
+    as the k nearest or everything within radius, optionally for one season.
+    """
+    try:
+        colors = [parse_color(c) for c in body.colors]
+        if body.season is not None and body.season not in color_palettes:
+            raise ValueError(f"Unknown season: {body.season}")
+
+        deadline = request_deadline(request)
+        with track_request("nearest_swatches") as record:
+            async with get_executor().admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline):
+                record.ticket = ticket
+                matches = await ticket.run(
+                    nearest_swatches, colors, body.k, body.season, body.radius, stage="nearest_swatches"
+                )
+        return {
+            "results": [{"color": list(c), "swatches": m} for c, m in zip(colors, matches)],
+            "message": "Nearest swatch lookup successful.",
+            "timings": ticket.timings(),
+        }
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,61 @@
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+import base64
+import json
+import logging
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.garment_palette import palette_coverage
+from utils.server import cancel_on_disconnect, decode_image, ops_router, rejection_response, request_deadline
+
+logger = logging.getLogger(__name__)
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+STAGES = ("decode", "palette_coverage")
+
+
+@app.post("/api/palette_coverage")
+async def palette_coverage_api(request: Request, file: UploadFile = File(...), season_dict: str = Form(...),
+                               threshold: float = Form(40), png: str = Form("")):
+    """
+    Which parts of an uploaded garment are in a season's palette: every
+    non-white pixel is matched to its nearest swatch. Returns the share of
+    the garment that is allowed, the swatches it maps to and, when png is
+    "mask" or "overlay", a base64-encoded PNG of the coverage map.
+    """
+    try:
+        contents = await file.read()
+        season = json.loads(season_dict)["season"]
+
+        deadline = request_deadline(request)
+        with track_request("palette_coverage", contents) as record:
+            async with get_executor().admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline):
+                record.ticket = ticket
+                image_np = await ticket.run(decode_image, contents, stage="decode")
+                coverage = await ticket.run(
+                    palette_coverage, image_np, season, threshold, png=png or None, stage="palette_coverage"
+                )
+        logger.debug("Palette coverage for %s: %s", season, coverage["coverage"])
+
+        return {
+            "season": season,
+            "coverage": coverage["coverage"],
+            "pixels": coverage["pixels"],
+            "swatches": coverage["swatches"],
+            "png": base64.b64encode(coverage["png"]).decode() if coverage["png"] else None,
+            "message": "Palette coverage successful.",
+            "timings": ticket.timings(),
+        }
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
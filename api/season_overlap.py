@@ -0,0 +1,69 @@
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from utils.executor import ExecutorRejected, get_executor
+from utils.flight_recorder import track_request
+from utils.season_overlap import DEFAULT_DELTA_E, get_season_overlap
+from utils.server import cancel_on_disconnect, ops_router, rejection_response, request_deadline
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Adjust this to your frontend origin if not for testing
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.include_router(ops_router)
+
+STAGES = ("season_overlap",)
+
+
+class SeasonOverlapRequest(BaseModel):
+    season: Optional[str] = None
+    other: Optional[str] = None
+    delta_e: float = DEFAULT_DELTA_E
+
+
+def _season_overlap(season, other, delta_e):
+    """The response body for one overlap query; runs on the executor."""
+    overlap = get_season_overlap()
+    if season is not None and other is not None:
+        return {"overlap": overlap.pair(season, other, delta_e)}
+    if season is not None:
+        return {"season": season, "delta_e": delta_e, "neighbours": overlap.neighbours(season, delta_e)}
+    if other is not None:
+        raise ValueError("Provide season together with other.")
+    return {
+        "seasons": overlap.seasons,
+        "delta_e": delta_e,
+        "similarity": overlap.similarity(delta_e).round(4).tolist(),
+        "chamfer": overlap.chamfer.round(3).tolist(),
+    }
+
+
+@app.post("/api/season_overlap")
+async def season_overlap_api(request: Request, body: SeasonOverlapRequest):
+    """
+    Palette overlap between seasons, from the precomputed overlap structure:
+    with season and other, the shared swatches of that pair; with season
+    only, every other season ranked by similarity; with neither, the full
+    similarity matrix.
+    """
+    try:
+        deadline = request_deadline(request)
+        with track_request("season_overlap") as record:
+            async with get_executor().admit(deadline, STAGES) as ticket, cancel_on_disconnect(request, deadline):
+                record.ticket = ticket
+                result = await ticket.run(
+                    _season_overlap, body.season, body.other, body.delta_e, stage="season_overlap"
+                )
+        return {**result, "timings": ticket.timings()}
+    except ExecutorRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return {"error": str(e)}
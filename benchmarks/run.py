@@ -0,0 +1,428 @@
+"""
+Benchmarks for the colour pipeline. Correctness checks live in tests/; these
+only time things.
+
+    python -m benchmarks.run             # every benchmark
+    python -m benchmarks.run cam02ucs    # only the named ones
+"""
+
+import sys
+import time
+
+import numpy as np
+
+BENCHMARKS = {}
+
+
+def benchmark(fn):
+    """Register fn under its name."""
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def per_call(fn, n):
+    """Seconds per call of fn over n calls."""
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+@benchmark
+def cam02ucs():
+    from colorspacious import cspace_convert
+
+    from utils.cam02ucs import srgb_to_cam02ucs
+
+    rng = np.random.default_rng(0)
+    for n in (10 ** 3, 10 ** 6, 10 ** 7):
+        colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+        ours = per_call(lambda: srgb_to_cam02ucs(colors), 1)
+        line = f"{n:>10} colours: {ours * 1e3:9.1f} ms ({n / ours / 1e6:6.2f} M colours/s)"
+        if n <= 10 ** 6:
+            theirs = per_call(lambda: cspace_convert(colors.astype(np.float64), "sRGB1", "CAM02-UCS"), 1)
+            line += f", colorspacious batched {theirs * 1e3:9.1f} ms ({theirs / ours:.1f}x)"
+        print(line)
+
+    samples = iter(rng.integers(0, 256, (4000, 3)))
+    loop = per_call(lambda: cspace_convert(next(samples), "sRGB1", "CAM02-UCS"), 2000)
+    ours = per_call(lambda: srgb_to_cam02ucs(next(samples)), 2000)
+    print(f"single colour: colorspacious {loop * 1e6:.1f} us, srgb_to_cam02ucs {ours * 1e6:.1f} us")
+
+
+@benchmark
+def palette_index():
+    from colorspacious import cspace_convert
+    from scipy.spatial import distance
+
+    from utils.color_difference import get_palette_index, hex_to_rgb
+    from utils.palette_index import to_ucs
+
+    index = get_palette_index()
+
+    def loop_is_allowed(color, season, threshold=40):
+        color_lch = cspace_convert(color, "sRGB1", "CAM02-UCS")
+        for allowed_color in index.hex[season]:
+            if distance.euclidean(color_lch, cspace_convert(hex_to_rgb(allowed_color), "sRGB1", "CAM02-UCS")) < threshold:
+                return True
+        return False
+
+    # A colour far from every palette forces the loop to scan all swatches.
+    worst = (255, 255, 0)
+    for name, fn in (("loop", loop_is_allowed), ("index", index.is_allowed)):
+        print(f"{name:>5}: {per_call(lambda: fn(worst, 'Cool Winter', 5), 200) * 1e6:8.1f} us per call")
+
+    # Reverse lookup: one pass over all seasons vs one check per season.
+    seconds = per_call(lambda: [index.is_allowed(worst, s, 5) for s in index.seasons], 200)
+    print(f"per-season checks: {seconds * 1e6:8.1f} us for all {len(index.seasons)} seasons")
+    seconds = per_call(lambda: index.seasons_for_color(worst, 5), 200)
+    print(f"seasons_for_color: {seconds * 1e6:8.1f} us for all {len(index.seasons)} seasons")
+
+    # Nearest swatches: KD-tree vs brute-force scan, single and batched.
+    def brute_nearest(colors, k=5):
+        ucs = to_ucs(colors).reshape(-1, 3)
+        diff = ucs[:, None, :] - index.all_ucs[None, :, :]
+        return np.argsort(np.sqrt(np.sum(diff * diff, axis=2)), axis=1)[:, :k]
+
+    batch = np.random.default_rng(0).integers(0, 256, (10000, 3))
+    index.nearest(worst)  # build the trees outside the timing
+    index.nearest(worst, season="Cool Winter")
+    print(f"nearest, 1 colour:        {per_call(lambda: index.nearest(worst, k=5), 200) * 1e6:8.1f} us")
+    seconds = per_call(lambda: index.nearest(worst, k=5, season="Cool Winter"), 200)
+    print(f"nearest, 1 colour/season: {seconds * 1e6:8.1f} us")
+    for name, fn in (("kd-tree", lambda: index.nearest(batch, k=5)), ("brute", lambda: brute_nearest(batch))):
+        seconds = per_call(fn, 3)
+        print(f"{name:>7}, {len(batch)} colours:  {seconds * 1e3:8.1f} ms ({seconds / len(batch) * 1e6:.2f} us/colour)")
+
+
+@benchmark
+def delta_e():
+    from utils.delta_e import METRICS
+
+    rng = np.random.default_rng(0)
+    # Query colours x one season-sized palette and x every swatch.
+    for n, m in ((1, 1000), (1000, 1000), (10000, 1000)):
+        a = METRICS["ciede2000"].convert(rng.integers(0, 256, (n, 3)))
+        b = METRICS["ciede2000"].convert(rng.integers(0, 256, (m, 3)))
+        for name, metric in METRICS.items():
+            seconds = per_call(lambda: metric.pairwise(a, b), 1)
+            print(f"{name:>9} {n:>6} x {m}: {seconds * 1e3:9.2f} ms ({n * m / seconds / 1e6:7.1f} M pairs/s)")
+
+
+@benchmark
+def season_overlap():
+    from utils.color_difference import get_palette_index
+    from utils.season_overlap import SeasonOverlap
+
+    index = get_palette_index()
+    start = time.perf_counter()
+    overlap = SeasonOverlap(index)
+    print(f"build: {(time.perf_counter() - start) * 1e3:.1f} ms, "
+          f"{overlap.nearest_dist.nbytes + overlap.nearest_row.nbytes} bytes")
+    print(f"similarity matrix (first call): {per_call(lambda: overlap.similarity(5.0), 1) * 1e6:.1f} us")
+    print(f"cached pair score: {per_call(lambda: overlap.similarity(5.0)[2, 5], 10000) * 1e6:.2f} us")
+
+
+@benchmark
+def color_histogram():
+    import cv2
+
+    from utils.color_histogram import _assign, color_histogram, select_k, weighted_kmeans
+
+    rng = np.random.default_rng(0)
+
+    def garment(height, width):
+        # Four fabric colours with sensor noise.
+        palette = np.array([[30, 60, 140], [200, 190, 170], [150, 30, 40], [20, 20, 25]])
+        regions = (np.arange(width)[None, :] // max(1, width // 7) + np.arange(height)[:, None] // max(1, height // 5)) % 4
+        noisy = palette[regions] + rng.normal(0, 8, (height, width, 3))
+        return np.clip(noisy, 0, 255).astype(np.uint8)
+
+    for height, width in ((200, 150), (1000, 1000), (4000, 3000)):
+        img = garment(height, width)
+        pixels = img.reshape(-1, 3)
+
+        start = time.perf_counter()
+        colours, counts = color_histogram(img)
+        hist_time = time.perf_counter() - start
+        start = time.perf_counter()
+        inertia, _, centers, _ = weighted_kmeans(colours, counts, 4, seed=0, attempts=10)
+        fit_time = time.perf_counter() - start
+
+        cv2.setRNGSeed(0)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+        start = time.perf_counter()
+        cv_inertia, _, cv_centers = cv2.kmeans(
+            pixels.astype(np.float32), 4, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS
+        )
+        cv_time = time.perf_counter() - start
+
+        # Inertia of the histogram centres over the real pixels, for a like-for-like comparison.
+        _, d2 = _assign(pixels.astype(np.float64), centers)
+        matched = np.sqrt(((np.sort(centers, axis=0) - np.sort(cv_centers, axis=0)) ** 2).sum(axis=1)).max()
+        print(f"{width}x{height}: {len(colours)} occupied bins")
+        print(f"  histogram {hist_time * 1e3:7.1f} ms + weighted k-means {fit_time * 1e3:6.1f} ms"
+              f" = {(hist_time + fit_time) * 1e3:7.1f} ms, pixel inertia {d2.sum():.4g}")
+        print(f"  cv2.kmeans {cv_time * 1e3:22.1f} ms, pixel inertia {cv_inertia:.4g}"
+              f" ({cv_time / (hist_time + fit_time):.1f}x); centres differ by at most {matched:.2f} levels")
+
+    # Automatic k on a 20k-pixel sample: chosen k and cost against one
+    # fixed-k (k=4) run on the same sample.
+    def banded(colours, height=1500, width=1200):
+        band = (np.arange(height) // (height // (6 * len(colours)))) % len(colours)
+        base = np.array(colours, dtype=np.float64)[band][:, None, :].repeat(width, axis=1)
+        base *= (0.85 + 0.15 * np.sin(np.arange(width) / width * np.pi))[None, :, None]  # shading
+        return np.clip(base + rng.normal(0, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+
+    fabrics = [[40, 80, 160], [200, 190, 170], [150, 30, 40], [20, 120, 60], [230, 200, 40]]
+    for n_colours in range(1, len(fabrics) + 1):
+        pixels = banded(fabrics[:n_colours]).reshape(-1, 3)
+        sample = pixels[rng.integers(0, len(pixels), 20000)]
+        colours, counts = color_histogram(sample)
+        start = time.perf_counter()
+        k, _, inertias = select_k(colours, counts, seed=0)
+        auto_time = time.perf_counter() - start
+        start = time.perf_counter()
+        weighted_kmeans(colours, counts, 4, seed=0, attempts=10)
+        fixed_time = time.perf_counter() - start
+        cv2.setRNGSeed(0)
+        start = time.perf_counter()
+        cv2.kmeans(sample.astype(np.float32), 4, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+        cv_time = time.perf_counter() - start
+        print(f"{n_colours} fabric colour(s): chose k={k} in {auto_time * 1e3:.1f} ms "
+              f"(inertia ratios {[round(i / inertias[0], 3) for i in inertias]}); "
+              f"one k=4 run: weighted {fixed_time * 1e3:.1f} ms, cv2.kmeans {cv_time * 1e3:.1f} ms")
+
+
+@benchmark
+def garment_palette():
+    import cv2
+
+    from utils.color_difference import color_is_allowed, get_palette_index
+    from utils.garment_palette import palette_clusters, palette_coverage
+    from utils.identify_clothing_color import process_image_with_combined_method
+
+    shirt = cv2.cvtColor(cv2.imread("test_environment/sample_inputs/shirt.jpg"), cv2.COLOR_BGR2RGB)
+    big = cv2.resize(shirt, (2000, 2000), interpolation=cv2.INTER_CUBIC)
+    index = get_palette_index()
+
+    for name, img in (("shirt.jpg", shirt), ("shirt.jpg @ 4 MP", big)):
+        start = time.perf_counter()
+        colour = process_image_with_combined_method(img, foreground_only=True, sample_size=20000, seed=0)
+        kmeans_time = time.perf_counter() - start
+        palette_clusters(img, index.seasons[0])  # warm up
+        print(f"{name} ({img.shape[1]}x{img.shape[0]}): k-means colour {tuple(int(v) for v in colour)} in {kmeans_time * 1e3:.1f} ms")
+        for season in index.seasons:
+            start = time.perf_counter()
+            result = palette_clusters(img, season)
+            seconds = time.perf_counter() - start
+            tight = palette_clusters(img, season, threshold=10)
+            top = result["clusters"][0]
+            print(f"  {season:<14} k-means {str(color_is_allowed(colour, season)):<5}  "
+                  f"palette {str(result['allowed']):<5} {result['allowed_fraction']:6.1%} in palette "
+                  f"({tight['allowed_fraction']:6.1%} at dE 10), "
+                  f"{len(result['clusters'])} clusters, top {top['rgb']} {top['fraction']:.0%} "
+                  f"-> {top['nearest']} dE {top['delta_e']:.1f}  ({seconds * 1e3:.1f} ms)")
+
+    # Per-pixel coverage map on one core.
+    cv2.setNumThreads(1)
+    season = "True Winter"
+    for png in (None, "mask", "overlay"):
+        palette_coverage(big, season, png=png)
+        runs = []
+        for _ in range(5):
+            start = time.perf_counter()
+            coverage = palette_coverage(big, season, png=png)
+            runs.append(time.perf_counter() - start)
+        size = f", {len(coverage['png']) / 1e3:.0f} kB PNG" if png else ""
+        print(f"palette_coverage 4 MP, png={png}: {min(runs) * 1e3:.1f} ms{size}, "
+              f"coverage {coverage['coverage']:.2%}, {len(coverage['swatches'])} swatches")
+
+
+@benchmark
+def median_color():
+    import cv2
+
+    from utils.identify_clothing_color import (
+        _remove_white_background,
+        foreground_mask,
+        remove_white_background_and_get_median,
+    )
+
+    shirt = cv2.cvtColor(cv2.imread("test_environment/sample_inputs/shirt.jpg"), cv2.COLOR_BGR2RGB)
+
+    def original_remove_white_background(img, white_threshold=250):
+        # The previous implementation: always build the result image, copy
+        # the subject pixels out and np.median each channel.
+        subject_mask = foreground_mask(img, white_threshold)
+        result_img = cv2.bitwise_and(img, img, mask=subject_mask)
+        subject_pixels = img[subject_mask == 255]
+        if len(subject_pixels) == 0:
+            return result_img, (0, 0, 0)
+        return result_img, tuple(int(np.median(subject_pixels[:, c])) for c in range(3))
+
+    # np.median over the copied-out pixels against the histogram median.
+    for size in (980, 2000, 4000):
+        img = cv2.resize(shirt, (size, size), interpolation=cv2.INTER_CUBIC)
+        line = []
+        for name, fn in (
+            ("np.median + result image", lambda: original_remove_white_background(img)),
+            ("histogram + result image", lambda: remove_white_background_and_get_median(img)),
+            ("histogram only", lambda: _remove_white_background(img, with_result=False)),
+        ):
+            seconds = min(per_call(fn, 1) for _ in range(3))
+            line.append(f"{name} {seconds * 1e3:.1f} ms")
+        print(f"{size * size / 1e6:5.1f} MP: " + ", ".join(line))
+
+
+@benchmark
+def garment_kmeans():
+    # Whole-image cv2 k-means (the original behaviour) against foreground-only
+    # k-means on a sample and the histogram engine, on the sample shirt, a
+    # 12 MP upscale of it and a synthetic striped garment.
+    import cv2
+
+    from utils.identify_clothing_color import process_image_with_combined_method
+    from utils.palette_index import to_ucs
+
+    def striped_shirt(height, width, seed=0):
+        rng = np.random.default_rng(seed)
+        img = np.full((height, width, 3), 255, dtype=np.uint8)
+        body = np.zeros((height, width), dtype=np.uint8)
+        cv2.ellipse(body, (width // 2, height // 2), (width // 3, height * 2 // 5), 0, 0, 360, 255, -1)
+        stripes = (np.arange(height) // max(1, height // 24)) % 3 == 0
+        colours = np.where(stripes[:, None, None], [[[30, 60, 140]]], [[[200, 190, 170]]])
+        noisy = np.clip(colours + rng.normal(0, 8, (height, width, 3)), 0, 240).astype(np.uint8)
+        img[body > 0] = noisy[body > 0]
+        return img
+
+    shirt = cv2.cvtColor(cv2.imread("test_environment/sample_inputs/shirt.jpg"), cv2.COLOR_BGR2RGB)
+
+    images = {
+        "shirt.jpg": shirt,
+        "shirt.jpg @ 12 MP": cv2.resize(shirt, (3464, 3464), interpolation=cv2.INTER_CUBIC),
+        "striped @ 12 MP": striped_shirt(4000, 3000),
+    }
+    modes = {
+        "full image (original)": {},
+        "foreground, 20k random": {"foreground_only": True, "sample_size": 20000, "sampling": "random"},
+        "foreground, 20k grid": {"foreground_only": True, "sample_size": 20000, "sampling": "grid"},
+        "foreground, histogram": {"foreground_only": True, "engine": "histogram"},
+        "full image, histogram": {"engine": "histogram"},
+    }
+    for name, img in images.items():
+        print(f"{name} ({img.shape[1]}x{img.shape[0]}):")
+        reference = None
+        for mode, options in modes.items():
+            results, seconds = [], []
+            for seed in range(3):
+                start = time.perf_counter()
+                results.append(process_image_with_combined_method(img, seed=seed, **options))
+                seconds.append(time.perf_counter() - start)
+            ucs = to_ucs(np.array(results))
+            if reference is None:
+                reference = ucs[0]
+            drift = np.sqrt(((ucs - reference) ** 2).sum(axis=1)).max()
+            if options.get("engine") == "histogram":
+                clustered = "histogram bins"
+            else:
+                pixels = options.get("sample_size", img.shape[0] * img.shape[1])
+                clustered = f"{pixels * 12 / 1e6:.2f} MB clustered"
+            print(f"  {mode:<24} {min(seconds) * 1e3:8.1f} ms  {clustered:>18}  "
+                  f"colours {[tuple(int(v) for v in c) for c in results]}  max dE from original run 0: {drift:.2f}")
+
+
+@benchmark
+def custom_palettes():
+    import os
+    import tempfile
+
+    from utils.custom_palettes import CustomPalettes
+
+    rng = np.random.default_rng(0)
+    n_palettes, n_swatches = 10000, 40
+
+    def random_palette():
+        return ["#%02X%02X%02X" % tuple(c) for c in rng.integers(0, 256, (n_swatches, 3))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "custom.sqlite3")
+        store = CustomPalettes(path)
+
+        start = time.perf_counter()
+        ids = [store.create(f"palette {i}", random_palette()) for i in range(n_palettes)]
+        seconds = time.perf_counter() - start
+        print(f"create {n_palettes} x {n_swatches}: {seconds:.2f} s ({seconds / n_palettes * 1e3:.3f} ms per palette)")
+
+        def per_op(label, fn, n=1000):
+            start = time.perf_counter()
+            for i in range(n):
+                fn(i)
+            print(f"{label:<34} {(time.perf_counter() - start) / n * 1e6:8.1f} us")
+
+        targets = rng.choice(ids, 1000, replace=False)
+        per_op("update: add 1 swatch", lambda i: store.update(targets[i], add=["#123456"]))
+        per_op("update: remove 1 swatch", lambda i: store.update(targets[i], remove=["#123456"]))
+        per_op("update: replace all swatches", lambda i: store.update(targets[i], swatches=random_palette()))
+        query = rng.integers(0, 256, (1, 3))
+        per_op("check 1 colour", lambda i: store.check(targets[i], query))
+        batch = rng.integers(0, 256, (100, 3))
+        per_op("check 100 colours", lambda i: store.check(targets[i], batch), n=200)
+        per_op("nearest k=5, 1 colour", lambda i: store.nearest(targets[i], query))
+
+        victims = ids[:1000]
+        per_op("delete palette", lambda i: store.delete(victims[i]))
+        per_op("create palette (reuses freed rows)", lambda i: ids.append(store.create("new", random_palette())))
+
+        start = time.perf_counter()
+        reopened = CustomPalettes(path)
+        print(f"reopen from SQLite ({len(reopened.index)} palettes, {len(reopened.index.slab)} swatches): "
+              f"{time.perf_counter() - start:.2f} s")
+
+
+@benchmark
+def flight_recorder():
+    from io import BytesIO
+
+    from PIL import Image
+
+    from utils.flight_recorder import FlightRecorder, RequestRecord
+
+    # Time on the caller's thread; hashing and writing happen on the writer.
+    recorder = FlightRecorder(threshold=0.0)
+    buffer = BytesIO()
+    Image.new("RGB", (4000, 3000)).save(buffer, format="BMP")
+    contents = buffer.getvalue()
+    record = RequestRecord("check", contents)
+    record.latency = 1.0
+    seconds = per_call(lambda: recorder.record(record), 20)
+    recorder.flush()
+    print(f"record() on the caller's thread: {seconds * 1e3:.2f} ms for a {len(contents) / 1e6:.0f} MB upload")
+
+
+@benchmark
+def palette_store():
+    import json
+
+    from utils.palette_index import PaletteIndex
+    from utils.palette_store import PALETTES_PATH, PaletteStore, read_artifact
+
+    def parse():
+        with open(PALETTES_PATH) as f:
+            PaletteIndex(json.load(f))
+
+    store = PaletteStore(reload_interval=5)
+    store.current()  # compiles the artifact if it is missing or stale
+    print(f"load artifact:        {per_call(read_artifact, 200) * 1e6:8.1f} us")
+    print(f"parse + convert JSON: {per_call(parse, 200) * 1e6:8.1f} us")
+    print(f"store.current():      {per_call(store.current, 100000) * 1e9:8.1f} ns")
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmark: {', '.join(unknown)}. Choose from {', '.join(BENCHMARKS)}.")
+    for name in names:
+        print(f"== {name}")
+        BENCHMARKS[name]()
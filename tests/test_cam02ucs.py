@@ -0,0 +1,42 @@
+"""
+utils.cam02ucs against colorspacious, which it replaces.
+"""
+
+import numpy as np
+import pytest
+from colorspacious import cspace_convert
+
+from utils.cam02ucs import srgb_to_cam02ucs
+
+
+@pytest.fixture(scope="module")
+def samples():
+    """Random 8-bit colours, the cube corners and the greys."""
+    rng = np.random.default_rng(0)
+    return np.concatenate([
+        rng.integers(0, 256, (50000, 3)),
+        np.array([[r, g, b] for r in (0, 255) for g in (0, 255) for b in (0, 255)]),
+        np.repeat(np.arange(256)[:, None], 3, axis=1),
+    ])
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float64])
+def test_matches_colorspacious(samples, dtype):
+    expected = cspace_convert(samples.astype(np.float64), "sRGB1", "CAM02-UCS")
+    assert np.abs(srgb_to_cam02ucs(samples.astype(dtype)) - expected).max() < 1e-9
+
+
+def test_fractional_input():
+    rgb = np.random.default_rng(1).random((1000, 3)) * 255
+    expected = cspace_convert(rgb, "sRGB1", "CAM02-UCS")
+    assert np.abs(srgb_to_cam02ucs(rgb) - expected).max() < 1e-9
+
+
+def test_single_colour():
+    single = srgb_to_cam02ucs((12, 200, 77))
+    assert single.shape == (3,)
+    assert np.allclose(single, cspace_convert((12, 200, 77), "sRGB1", "CAM02-UCS"), rtol=0, atol=1e-9)
+
+
+def test_chunking_does_not_change_results(samples):
+    assert np.array_equal(srgb_to_cam02ucs(samples, chunk=997), srgb_to_cam02ucs(samples))
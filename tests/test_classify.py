@@ -0,0 +1,114 @@
+"""
+The vectorised season classifier against the original per-season loop.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from utils.classify import FEATURES, SEASONS, classify_season, classify_season_batch, score_seasons
+
+
+def reference_classify(skin_rgb, hair_rgb, eye_rgb, tone):
+    """The per-season loop classify_season used before SeasonTable."""
+
+    def in_range(color, cmin, cmax):
+        return all(cmin[i] <= color[i] <= cmax[i] for i in range(3))
+
+    def centroid(cmin, cmax):
+        return tuple((cmin[i] + cmax[i]) // 2 for i in range(3))
+
+    def distance(color1, color2):
+        return math.sqrt(sum((color1[i] - color2[i]) ** 2 for i in range(3)))
+
+    possible_matches = []
+    distances = []
+    for season in SEASONS:
+        if tone not in season["undertones"]:
+            continue
+        if (
+            in_range(skin_rgb, season["skin_min"], season["skin_max"]) and
+            in_range(hair_rgb, season["hair_min"], season["hair_max"]) and
+            in_range(eye_rgb, season["eye_min"], season["eye_max"])
+        ):
+            possible_matches.append(season["name"])
+        total = (
+            distance(skin_rgb, centroid(season["skin_min"], season["skin_max"]))
+            + distance(hair_rgb, centroid(season["hair_min"], season["hair_max"]))
+            + distance(eye_rgb, centroid(season["eye_min"], season["eye_max"]))
+        )
+        distances.append((season["name"], total))
+    if possible_matches:
+        return possible_matches[0] if len(possible_matches) == 1 else possible_matches[0] + " (multiple matches?)"
+    return min(distances, key=lambda x: x[1])[0]
+
+
+TONES = sorted({tone for season in SEASONS for tone in season["undertones"]})
+
+
+@pytest.fixture(scope="module")
+def random_people():
+    rng = np.random.default_rng(0)
+    n = 20000
+    skins = rng.integers(140, 240, (n, 3))
+    # Medians of even-sized masks come back as floats ending in .5.
+    skins = np.where(rng.random((n, 1)) < 0.5, skins, skins + 0.5)
+    return skins, rng.integers(30, 180, (n, 3)), rng.integers(20, 120, (n, 3)), rng.choice(TONES, n).tolist()
+
+
+@pytest.fixture(scope="module")
+def near_people():
+    """People drawn around each season's own ranges, so in-range matches happen."""
+    rng = np.random.default_rng(1)
+    picked = rng.integers(0, len(SEASONS), 20000)
+    features = [
+        np.array([[rng.integers(lo - 2, hi + 3) for lo, hi in zip(SEASONS[i][f"{f}_min"], SEASONS[i][f"{f}_max"])]
+                  for i in picked])
+        for f in FEATURES
+    ]
+    return (*features, [str(rng.choice(SEASONS[i]["undertones"])) for i in picked])
+
+
+def _reference(skins, hairs, eyes, tones):
+    return [
+        reference_classify(tuple(s), tuple(h), tuple(e), t)
+        for s, h, e, t in zip(skins.tolist(), hairs.tolist(), eyes.tolist(), tones)
+    ]
+
+
+@pytest.mark.parametrize("people", ["random_people", "near_people"])
+def test_batch_matches_reference(people, request):
+    skins, hairs, eyes, tones = request.getfixturevalue(people)
+    assert classify_season_batch(skins, hairs, eyes, tones) == _reference(skins, hairs, eyes, tones)
+
+
+def test_batch_chunks_agree(near_people):
+    skins, hairs, eyes, tones = near_people
+    assert classify_season_batch(skins, hairs, eyes, tones, chunk_size=997) == \
+        classify_season_batch(skins, hairs, eyes, tones)
+
+
+def test_scalar_matches_reference(near_people):
+    skins, hairs, eyes, tones = (values[:2000] for values in near_people)
+    for s, h, e, t in zip(skins.tolist(), hairs.tolist(), eyes.tolist(), tones):
+        assert classify_season(s, h, e, t) == reference_classify(s, h, e, t)
+
+
+def test_unknown_undertone():
+    with pytest.raises(ValueError):
+        classify_season_batch([(200, 170, 150)], [(140, 110, 90)], [(80, 80, 60)], ["violet"])
+
+
+@pytest.mark.parametrize("people", ["random_people", "near_people"])
+def test_score_seasons_follows_the_decision(people, request):
+    skins, hairs, eyes, tones = (values[:3000] for values in request.getfixturevalue(people))
+    for s, h, e, t in zip(skins.tolist(), hairs.tolist(), eyes.tolist(), tones):
+        scores = score_seasons(s, h, e, t)
+        assert scores["season"].split(" (")[0] == scores["palette"] == scores["scores"][0]["season"]
+        distances = sorted(score["distance"] for score in scores["scores"])
+        if scores["scores"][0]["match"] or len(distances) == 1:
+            assert scores["margin"] is None
+        else:
+            assert scores["scores"][0]["distance"] == distances[0]
+            assert scores["margin"] == distances[1] - distances[0]
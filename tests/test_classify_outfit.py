@@ -0,0 +1,70 @@
+"""
+/api/classify_outfit end to end, with a stand-in for BiSeNet: a synthetic
+portrait whose class map is known, with and without a cloth region.
+"""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+import cv2  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from api import classify_outfit  # noqa: E402
+from utils.classify import SEASONS  # noqa: E402
+from utils.identify_clothing_color import kmeans_options, process_image_with_combined_method  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def portrait():
+    image = np.full((400, 300, 3), 255, dtype=np.uint8)
+    labels = np.zeros(image.shape[:2], dtype=np.uint8)
+    for cls, (top, bottom, left, right), rgb in (
+        (17, (20, 80, 90, 210), (135, 105, 85)),   # hair
+        (1, (80, 200, 100, 200), (195, 165, 145)),  # face
+        (5, (120, 135, 125, 175), (75, 75, 55)),    # eyes
+        (14, (200, 250, 125, 175), (195, 165, 145)),  # neck
+        (16, (250, 400, 40, 260), (200, 30, 40)),   # top
+    ):
+        image[top:bottom, left:right] = rgb
+        labels[top:bottom, left:right] = cls
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    return image, labels, buffer.getvalue()
+
+
+def _post(monkeypatch, upload, parsing_labels):
+    def stub_parse_face(image_np, input_size=512, **_):
+        size = (input_size, input_size)
+        return cv2.resize(image_np, size), cv2.resize(parsing_labels, size, interpolation=cv2.INTER_NEAREST)
+
+    monkeypatch.setattr(classify_outfit, "parse_face", stub_parse_face)
+    client = TestClient(classify_outfit.app)
+    return client.post("/api/classify_outfit", files={"file": ("outfit.png", upload)}).json()
+
+
+def test_garment_colour_from_the_cloth_class(monkeypatch, portrait):
+    _, labels, upload = portrait
+    body = _post(monkeypatch, upload, labels)
+    assert "error" not in body, body
+    assert body["clothing source"] == "cloth"
+    assert body["season"].split(" (")[0] in {season["name"] for season in SEASONS}
+    assert np.abs(np.array(body["clothing color"]) - (200, 30, 40)).max() <= 2, body
+    assert "timings" in body
+
+
+def test_white_background_fallback_matches_classify_color(monkeypatch, portrait):
+    # Without a cloth class the garment colour must be exactly what
+    # /api/classify_color computes under the same configuration.
+    image, labels, upload = portrait
+    body = _post(monkeypatch, upload, np.where(labels == 16, 0, labels).astype(np.uint8))
+    assert body["clothing source"] == "white_background", body
+    options, _ = kmeans_options()
+    if options.get("seed") is None:
+        pytest.skip("the configured k-means engine is not seeded")
+    expected = process_image_with_combined_method(image, k=classify_outfit.GARMENT_K, **options)
+    assert body["clothing color"] == [int(c) for c in expected]
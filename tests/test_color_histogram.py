@@ -0,0 +1,95 @@
+"""
+Quantised histograms and weighted k-means against per-pixel computations.
+"""
+
+import numpy as np
+import pytest
+
+from utils.color_histogram import _assign, color_histogram, quantize, select_k, weighted_kmeans
+
+
+def _garment(rng, height, width, palette):
+    palette = np.asarray(palette)
+    regions = (np.arange(width)[None, :] // max(1, width // 7) + np.arange(height)[:, None] // max(1, height // 5))
+    noisy = palette[regions % len(palette)] + rng.normal(0, 8, (height, width, 3))
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+FABRICS = [[30, 60, 140], [200, 190, 170], [150, 30, 40], [20, 20, 25]]
+
+
+@pytest.fixture(scope="module")
+def image():
+    return _garment(np.random.default_rng(0), 200, 150, FABRICS)
+
+
+def test_quantize_packs_the_top_bits():
+    pixels = np.array([[0, 0, 0], [255, 255, 255], [8, 16, 24]], dtype=np.uint8)
+    assert quantize(pixels, 5).tolist() == [0, (1 << 15) - 1, (1 << 10) + (2 << 5) + 3]
+    with pytest.raises(ValueError):
+        quantize(pixels, 0)
+    with pytest.raises(ValueError):
+        quantize(pixels.astype(np.int32))
+
+
+@pytest.mark.parametrize("bits", [3, 5, 8])
+def test_histogram_matches_per_pixel_grouping(image, bits):
+    colours, counts = color_histogram(image, bits=bits)
+    pixels = image.reshape(-1, 3)
+    bins = quantize(image, bits)
+    occupied, inverse, expected_counts = np.unique(bins, return_inverse=True, return_counts=True)
+    assert counts.tolist() == expected_counts.tolist()
+    for channel in range(3):
+        sums = np.bincount(inverse, weights=pixels[:, channel])
+        assert np.allclose(colours[:, channel], sums / expected_counts)
+
+
+def test_mask_drops_pixels(image):
+    mask = np.zeros(image.shape[:2], dtype=np.uint8)
+    mask[:, : image.shape[1] // 2] = 1
+    masked = color_histogram(image, mask)
+    cropped = color_histogram(np.ascontiguousarray(image[:, : image.shape[1] // 2]))
+    assert masked[1].sum() == mask.sum()
+    assert np.array_equal(masked[1], cropped[1]) and np.allclose(masked[0], cropped[0])
+    with pytest.raises(ValueError):
+        color_histogram(image, mask[:-1])
+
+
+def test_weighted_kmeans_matches_the_pixel_objective(image):
+    colours, counts = color_histogram(image)
+    inertia, labels, centers, sizes = weighted_kmeans(colours, counts, 4, seed=0, attempts=5)
+    assert sizes.sum() == counts.sum()
+    # Centres are the count-weighted means of their bins.
+    for cluster in range(4):
+        members = labels == cluster
+        assert np.allclose(centers[cluster], counts[members] @ colours[members] / counts[members].sum(), atol=1.0)
+    # The weighted inertia is the inertia of the bin means repeated per pixel.
+    _, d2 = _assign(np.repeat(colours, counts, axis=0), centers)
+    assert np.isclose(inertia, d2.sum())
+    # And the centres find the four fabrics.
+    found = np.sort(centers, axis=0)
+    assert np.abs(found - np.sort(np.array(FABRICS, dtype=float), axis=0)).max() < 6
+
+
+def test_weighted_kmeans_is_seeded(image):
+    colours, counts = color_histogram(image)
+    first = weighted_kmeans(colours, counts, 4, seed=3)
+    second = weighted_kmeans(colours, counts, 4, seed=3)
+    assert first[0] == second[0] and np.array_equal(first[2], second[2])
+    with pytest.raises(ValueError):
+        weighted_kmeans(colours[:0], counts[:0], 4)
+
+
+def test_weighted_kmeans_with_fewer_points_than_clusters():
+    inertia, labels, centers, sizes = weighted_kmeans([[10, 10, 10]], [5], 3, seed=0)
+    assert inertia == 0 and sizes.sum() == 5
+
+
+@pytest.mark.parametrize("n_colours", [1, 2, 3, 4])
+def test_select_k_counts_fabrics(n_colours):
+    rng = np.random.default_rng(n_colours)
+    sample = _garment(rng, 100, 200, FABRICS[:n_colours])
+    colours, counts = color_histogram(sample)
+    k, centers, inertias = select_k(colours, counts, seed=0)
+    assert k == n_colours and len(centers) == k
+    assert len(inertias) in (k, k + 1)
@@ -0,0 +1,107 @@
+"""
+The incrementally edited custom palette index against a fresh computation
+from the stored swatches.
+"""
+
+import numpy as np
+import pytest
+
+from utils.custom_palettes import CustomPalettes, _rgb, normalise_swatches
+from utils.palette_index import to_ucs
+
+
+def _random_palette(rng, n):
+    return ["#%02X%02X%02X" % tuple(c) for c in rng.integers(0, 256, (n, 3))]
+
+
+def _fresh_distances(labels, colors):
+    ucs = to_ucs(_rgb(labels))
+    return np.sqrt(((to_ucs(colors)[:, None, :] - ucs[None]) ** 2).sum(axis=2))
+
+
+def _assert_matches_fresh(store, expected, colors):
+    assert {p["id"]: p["name"] for p in store.list()} == {i: name for i, (name, _) in expected.items()}
+    for palette_id, (name, labels) in expected.items():
+        assert store.get(palette_id) == {"id": palette_id, "name": name, "swatches": labels}
+        results = store.check(palette_id, colors)
+        if not labels:
+            assert all(r["nearest"] is None and not r["allowed"] for r in results)
+            continue
+        dists = _fresh_distances(labels, colors)
+        assert np.allclose([r["delta_e"] for r in results], dists.min(axis=1))
+        assert [r["nearest"] for r in results] == [labels[j] for j in dists.argmin(axis=1)]
+        assert [r["allowed"] for r in results] == list(dists.min(axis=1) < 40)
+        nearest = store.nearest(palette_id, colors, k=3)
+        assert np.allclose([[m["delta_e"] for m in row] for row in nearest], np.sort(dists, axis=1)[:, :3])
+
+
+def test_incremental_index_matches_a_fresh_build(tmp_path):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / "custom.sqlite3")
+    store = CustomPalettes(path)
+    colors = rng.integers(0, 256, (25, 3))
+    expected = {}
+    for i in range(30):
+        labels = _random_palette(rng, int(rng.integers(1, 12)))
+        expected[store.create(f"palette {i}", labels)] = (f"palette {i}", normalise_swatches(labels))
+
+    for step in range(200):
+        palette_id = list(expected)[rng.integers(len(expected))]
+        name, labels = expected[palette_id]
+        op = rng.integers(5)
+        if op == 0:
+            add = _random_palette(rng, 2) + labels[:1]
+            store.update(palette_id, add=add)
+            labels = labels + [h for h in dict.fromkeys(add) if h not in labels]
+        elif op == 1 and labels:
+            drop = list(rng.choice(labels, min(2, len(labels)), replace=False))
+            store.update(palette_id, remove=drop)
+            labels = [h for h in labels if h not in drop]
+        elif op == 2:
+            swatches = labels[::2] + _random_palette(rng, 3)
+            store.update(palette_id, swatches=swatches)
+            kept = set(swatches)
+            labels = [h for h in labels if h in kept] + [h for h in dict.fromkeys(swatches) if h not in labels]
+        elif op == 3:
+            name = f"renamed {step}"
+            store.update(palette_id, name=name)
+        else:
+            store.delete(palette_id)
+            del expected[palette_id]
+            labels = _random_palette(rng, 5)
+            name, palette_id = f"new {step}", store.create(f"new {step}", labels)
+        expected[palette_id] = (name, labels)
+
+    _assert_matches_fresh(store, expected, colors)
+    # Freed slab rows are reused rather than the slab growing with every edit.
+    live = sum(len(labels) for _, labels in expected.values())
+    assert store.index.slab.ucs.shape[0] < 4 * max(live, 1024)
+
+    _assert_matches_fresh(CustomPalettes(path), expected, colors)
+
+
+def test_swatches_are_normalised_and_deduplicated(tmp_path):
+    store = CustomPalettes(str(tmp_path / "custom.sqlite3"))
+    palette_id = store.create("mixed", ["#ff0000", [255, 0, 0], "00FF00", [0, 0, 255]])
+    assert store.get(palette_id)["swatches"] == ["#FF0000", "#00FF00", "#0000FF"]
+    store.update(palette_id, swatches=["#0000FF", "#123456"], add=["#FF0000"], remove=["#123456"])
+    assert store.get(palette_id)["swatches"] == ["#0000FF", "#FF0000"]
+
+
+def test_unknown_palette_and_bad_arguments(tmp_path):
+    store = CustomPalettes(str(tmp_path / "custom.sqlite3"))
+    for call in (store.get, store.delete, lambda i: store.check(i, [[1, 2, 3]]), lambda i: store.update(i, name="x")):
+        with pytest.raises(ValueError):
+            call("missing")
+    palette_id = store.create("one", ["#FFFFFF"])
+    with pytest.raises(ValueError):
+        store.nearest(palette_id, [[1, 2, 3]], k=0)
+    with pytest.raises(ValueError):
+        store.create("bad", ["not a colour"])
+
+
+def test_unwritable_database_path(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    with pytest.raises(ValueError, match="COLOR_AI_CUSTOM_PALETTES_DB"):
+        CustomPalettes(str(blocker / "custom.sqlite3"))
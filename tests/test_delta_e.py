@@ -0,0 +1,97 @@
+"""
+Colour-difference metrics against published reference values.
+"""
+
+import numpy as np
+import pytest
+from colorspacious import cspace_convert
+
+from utils.delta_e import METRICS, cie94, ciede2000, get_metric, srgb_to_lab
+
+# Sharma, Wu and Dalal (2005), Table 1: Lab pairs and their CIEDE2000 values.
+SHARMA_CIEDE2000 = [
+    ((50.0000, 2.6772, -79.7751), (50.0000, 0.0000, -82.7485), 2.0425),
+    ((50.0000, 3.1571, -77.2803), (50.0000, 0.0000, -82.7485), 2.8615),
+    ((50.0000, 2.8361, -74.0200), (50.0000, 0.0000, -82.7485), 3.4412),
+    ((50.0000, -1.3802, -84.2814), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, -1.1848, -84.8006), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, -0.9009, -85.5211), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, 0.0000, 0.0000), (50.0000, -1.0000, 2.0000), 2.3669),
+    ((50.0000, -1.0000, 2.0000), (50.0000, 0.0000, 0.0000), 2.3669),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0009), 7.1792),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0010), 7.1792),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0011), 7.2195),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0012), 7.2195),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0009, -2.4900), 4.8045),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0010, -2.4900), 4.8045),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0011, -2.4900), 4.7461),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 0.0000, -2.5000), 4.3065),
+    ((50.0000, 2.5000, 0.0000), (73.0000, 25.0000, -18.0000), 27.1492),
+    ((50.0000, 2.5000, 0.0000), (61.0000, -5.0000, 29.0000), 22.8977),
+    ((50.0000, 2.5000, 0.0000), (56.0000, -27.0000, -3.0000), 31.9030),
+    ((50.0000, 2.5000, 0.0000), (58.0000, 24.0000, 15.0000), 19.4535),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 3.1736, 0.5854), 1.0000),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 3.2972, 0.0000), 1.0000),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 1.8634, 0.5757), 1.0000),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 3.2592, 0.3350), 1.0000),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((63.0109, -31.0961, -5.8663), (62.8187, -29.7946, -4.0864), 1.2630),
+    ((61.2901, 3.7196, -5.3901), (61.4292, 2.2480, -4.9620), 1.8731),
+    ((35.0831, -44.1164, 3.7933), (35.0232, -40.0716, 1.5901), 1.8645),
+    ((22.7233, 20.0904, -46.6940), (23.0331, 14.9730, -42.5619), 2.0373),
+    ((36.4612, 47.8580, 18.3852), (36.2715, 50.5065, 21.2231), 1.4146),
+    ((90.8027, -2.0831, 1.4410), (91.1528, -1.6435, 0.0447), 1.4441),
+    ((90.9257, -0.5406, -0.9208), (88.6381, -0.8985, -0.7239), 1.5381),
+    ((6.7747, -0.2908, -2.4247), (5.8714, -0.0985, -2.2286), 0.6377),
+    ((2.0776, 0.0795, -1.1350), (0.9033, -0.0636, -0.5514), 0.9082),
+]
+
+
+def test_ciede2000_sharma_pairs():
+    lab1 = np.array([p[0] for p in SHARMA_CIEDE2000])
+    lab2 = np.array([p[1] for p in SHARMA_CIEDE2000])
+    expected = np.array([p[2] for p in SHARMA_CIEDE2000])
+    assert np.allclose(np.diag(ciede2000(lab1, lab2)), expected, rtol=0, atol=1e-4)
+    # CIEDE2000 is symmetric; the full matrix must agree with its transpose.
+    assert np.allclose(ciede2000(lab1, lab2), ciede2000(lab2, lab1).T, rtol=0, atol=1e-10)
+
+
+# CIE94 by hand for one pair: reference (50, 2.5, 0) vs (58, 24, 15).
+_C1, _C2 = 2.5, np.hypot(24, 15)
+_DH2 = (2.5 - 24) ** 2 + 15 ** 2 - (_C1 - _C2) ** 2
+
+
+@pytest.mark.parametrize("weights, k_l, k1, k2", [
+    ({}, 1, 0.045, 0.015),
+    ({"k_l": 2, "k1": 0.048, "k2": 0.014}, 2, 0.048, 0.014),  # textiles
+])
+def test_cie94_by_hand(weights, k_l, k1, k2):
+    by_hand = np.sqrt((8 / k_l) ** 2 + ((_C1 - _C2) / (1 + k1 * _C1)) ** 2 + _DH2 / (1 + k2 * _C1) ** 2)
+    assert np.isclose(cie94([[50, 2.5, 0]], [[58, 24, 15]], **weights)[0, 0], by_hand)
+    # The registry's blocked pairwise must pass the weights through.
+    assert np.isclose(METRICS["cie94"].pairwise(np.array([[50, 2.5, 0]]), np.array([[58, 24, 15]]), **weights)[0, 0],
+                      by_hand)
+
+
+def test_srgb_to_lab_matches_colorspacious():
+    rgb = np.random.default_rng(0).integers(0, 256, (20000, 3))
+    reference = cspace_convert(rgb / 255, "sRGB1", "CIELab")
+    assert np.abs(srgb_to_lab(rgb.astype(np.uint8)) - reference).max() < 1e-9
+
+
+@pytest.mark.parametrize("name", list(METRICS))
+def test_pairwise_blocks_agree(name, monkeypatch):
+    metric = get_metric(name)
+    rng = np.random.default_rng(1)
+    a = metric.convert(rng.integers(0, 256, (300, 3)))
+    b = metric.convert(rng.integers(0, 256, (7, 3)))
+    whole = metric.pairwise(a, b)
+    monkeypatch.setattr("utils.delta_e._CHUNK", 50)
+    blocked = metric.pairwise(a, b)
+    assert whole.shape == blocked.shape == (300, 7)
+    assert np.array_equal(whole, blocked)
+
+
+def test_unknown_metric():
+    with pytest.raises(ValueError):
+        get_metric("cie2001")
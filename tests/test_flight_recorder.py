@@ -0,0 +1,91 @@
+"""
+The flight recorder keeps slow requests and stores their uploads off the
+caller's thread.
+"""
+
+import hashlib
+import json
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from utils import flight_recorder
+from utils.flight_recorder import FlightRecorder, RequestRecord, describe_input, track_request
+
+
+def _png(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_slow_request_is_stored_by_the_writer(tmp_path):
+    recorder = FlightRecorder(threshold=0.0, dump_path=str(tmp_path / "slow.jsonl"), inputs_dir=str(tmp_path / "inputs"))
+    contents = _png(40, 30)
+    record = RequestRecord("check", contents)
+    record.latency = 1.0
+    entry = recorder.record(record).result()
+    assert entry["input"]["sha256"] == hashlib.sha256(contents).hexdigest()
+    assert (entry["input"]["width"], entry["input"]["height"], entry["input"]["format"]) == (40, 30, "PNG")
+    recorder.flush()
+    assert recorder.entries() == [entry]
+    assert (tmp_path / "inputs" / (entry["input"]["sha256"] + ".bin")).read_bytes() == contents
+    assert json.loads((tmp_path / "slow.jsonl").read_text())["input"] == entry["input"]
+
+
+def test_upload_is_not_described_on_the_caller_thread(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def blocking_describe(contents):
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return {"bytes": len(contents)}
+
+    monkeypatch.setattr(flight_recorder, "describe_input", blocking_describe)
+    recorder = FlightRecorder(threshold=0.0)
+    record = RequestRecord("check", b"upload")
+    record.latency = 1.0
+    future = recorder.record(record)
+    assert not future.done()
+    release.set()
+    assert future.result()["input"] == {"bytes": 6}
+    assert calls[0].startswith("flight-recorder")
+
+
+def test_fast_requests_are_not_kept():
+    recorder = FlightRecorder(threshold=1.0)
+    record = RequestRecord("check", b"")
+    record.latency = 0.5
+    assert recorder.record(record) is None
+    assert recorder.entries() == []
+
+
+def test_entries_are_newest_first_and_bounded():
+    recorder = FlightRecorder(threshold=0.0, capacity=3)
+    for i in range(5):
+        record = RequestRecord(f"endpoint {i}", None)
+        record.latency = 1.0
+        recorder.record(record)
+    recorder.flush()
+    assert [e["endpoint"] for e in recorder.entries()] == ["endpoint 4", "endpoint 3", "endpoint 2"]
+    assert len(recorder.entries(limit=1)) == 1
+
+
+def test_describe_input_of_a_non_image():
+    info = describe_input(b"not an image")
+    assert info["bytes"] == 12 and "error" in info
+
+
+def test_track_request_records_the_outcome(monkeypatch):
+    recorder = FlightRecorder(threshold=0.0)
+    monkeypatch.setattr(flight_recorder, "_recorder", recorder)
+    with pytest.raises(KeyError):
+        with track_request("check") as record:
+            record.engines["tier"] = "full"
+            raise KeyError("boom")
+    recorder.flush()
+    [entry] = recorder.entries()
+    assert entry["outcome"] == "KeyError" and entry["engines"] == {"tier": "full"}
@@ -0,0 +1,102 @@
+"""
+Garment palette coverage against an exact per-pixel check.
+"""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from utils import garment_palette
+from utils.color_difference import get_palette_index
+from utils.garment_palette import _nearest_swatch, palette_clusters, palette_coverage
+from utils.identify_clothing_color import foreground_mask
+from utils.palette_index import to_ucs
+
+SHIRT = Path(__file__).resolve().parents[1] / "test_environment" / "sample_inputs" / "shirt.jpg"
+SEASON = "True Winter"
+
+
+@pytest.fixture(scope="module")
+def shirt():
+    image = cv2.cvtColor(cv2.imread(str(SHIRT)), cv2.COLOR_BGR2RGB)
+    return cv2.resize(image, (320, 320), interpolation=cv2.INTER_AREA)
+
+
+@pytest.fixture
+def fresh_tables(monkeypatch):
+    monkeypatch.setattr(garment_palette, "_coverage_tables", {})
+
+
+def _exact(img, season, threshold):
+    fg = foreground_mask(img) > 0
+    nearest, dists = _nearest_swatch(to_ucs(img[fg]), get_palette_index().ucs[season])
+    return fg, nearest, dists < threshold
+
+
+@pytest.mark.parametrize("threshold", [10, 40])
+def test_coverage_matches_a_per_pixel_check(shirt, fresh_tables, threshold):
+    coverage = palette_coverage(shirt, SEASON, threshold=threshold)
+    fg, nearest, allowed = _exact(shirt, SEASON, threshold)
+    assert np.array_equal(coverage["allowed_mask"][fg], allowed)
+    assert not coverage["allowed_mask"][~fg].any()
+    assert np.array_equal(coverage["nearest"][fg], nearest)
+    assert (coverage["nearest"][~fg] == -1).all()
+    assert coverage["pixels"] == fg.sum()
+    assert coverage["coverage"] == pytest.approx(allowed.mean())
+    assert sum(s["share"] for s in coverage["swatches"]) == pytest.approx(1.0)
+
+
+def test_cached_tables_give_the_same_result(shirt, fresh_tables):
+    # A second image fills the table the first one left behind; both must
+    # match what a fresh table gives.
+    other = np.ascontiguousarray(shirt[:, ::-1] // 2 + 60)
+    first = palette_coverage(shirt, SEASON)
+    again = palette_coverage(shirt, SEASON)
+    second = palette_coverage(other, SEASON)
+    assert len(garment_palette._coverage_tables) == 1
+    for key in ("nearest", "allowed_mask"):
+        assert np.array_equal(first[key], again[key])
+    fg, nearest, allowed = _exact(other, SEASON, 40)
+    assert np.array_equal(second["nearest"][fg], nearest)
+    assert np.array_equal(second["allowed_mask"][fg], allowed)
+
+
+def test_many_distinct_colours_take_the_marking_path(shirt, fresh_tables, monkeypatch):
+    monkeypatch.setattr(garment_palette, "_UNIQUE_MAX", 16)
+    coverage = palette_coverage(shirt, SEASON)
+    fg, nearest, allowed = _exact(shirt, SEASON, 40)
+    assert np.array_equal(coverage["nearest"][fg], nearest)
+    assert np.array_equal(coverage["allowed_mask"][fg], allowed)
+
+
+def test_cache_keeps_a_bounded_number_of_tables(shirt, fresh_tables):
+    for threshold in range(garment_palette.COVERAGE_CACHE_SIZE + 2):
+        palette_coverage(shirt[:8, :8], SEASON, threshold=threshold)
+    assert len(garment_palette._coverage_tables) == garment_palette.COVERAGE_CACHE_SIZE
+
+
+@pytest.mark.parametrize("png", ["mask", "overlay"])
+def test_coverage_png(shirt, png):
+    encoded = palette_coverage(shirt, SEASON, png=png, png_max_side=100)["png"]
+    decoded = cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert max(decoded.shape[:2]) == 100
+
+
+def test_unknown_arguments(shirt):
+    with pytest.raises(ValueError):
+        palette_coverage(shirt, "Summer Solstice")
+    with pytest.raises(ValueError):
+        palette_coverage(shirt, SEASON, png="gif")
+    with pytest.raises(ValueError):
+        palette_clusters(shirt, "Summer Solstice")
+
+
+def test_clusters_fraction_matches_the_histogram_bins(shirt):
+    result = palette_clusters(shirt, SEASON)
+    assert result["allowed"] == (result["allowed_fraction"] >= garment_palette.DEFAULT_MIN_FRACTION)
+    assert sum(c["fraction"] for c in result["clusters"]) == pytest.approx(1.0)
+    assert result["pixels"] == (foreground_mask(shirt) > 0).sum()
+    with pytest.raises(ValueError):
+        palette_clusters(shirt, SEASON, mask=np.zeros(shirt.shape[:2], np.uint8))
@@ -0,0 +1,144 @@
+"""
+Garment colour helpers against the straightforward computations they replace.
+"""
+
+import numpy as np
+import pytest
+
+from utils.identify_clothing_color import (
+    AUTO_K_MAX,
+    _remove_white_background,
+    choose_k,
+    dominant_colors,
+    foreground_mask,
+    median_color,
+    parse_k,
+    process_image_with_combined_method,
+    remove_white_background_and_get_median,
+    sample_pixels,
+)
+
+
+def _np_median(img, white_threshold=250):
+    pixels = img[foreground_mask(img, white_threshold) == 255]
+    if len(pixels) == 0:
+        return (0, 0, 0)
+    return tuple(int(np.median(pixels[:, c])) for c in range(3))
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (1, 2), (2, 2), (7, 5), (64, 64), (301, 299)])
+def test_median_color_matches_np_median(shape):
+    # Odd and even foreground counts, with a share of background pixels.
+    rng = np.random.default_rng(shape[0] * 1000 + shape[1])
+    for _ in range(20):
+        img = rng.integers(0, 256, shape + (3,), dtype=np.uint8)
+        img[rng.random(shape) < 0.3] = 255
+        assert median_color(img, foreground_mask(img)) == _np_median(img)
+
+
+def test_median_color_of_an_empty_mask():
+    blank = np.full((8, 8, 3), 255, dtype=np.uint8)
+    assert median_color(blank, foreground_mask(blank)) == (0, 0, 0)
+
+
+def test_remove_white_background():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (40, 30, 3), dtype=np.uint8)
+    img[:10] = 255
+    result, median = remove_white_background_and_get_median(img)
+    assert median == _np_median(img)
+    assert (result[:10] == 0).all() and np.array_equal(result[10:], img[10:])
+    transparent, _ = remove_white_background_and_get_median(img, make_transparent=True)
+    assert transparent.shape == (40, 30, 4) and (transparent[:10, :, 3] == 0).all()
+    none, same, mask = _remove_white_background(img, with_result=False)
+    assert none is None and same == median and mask.sum() == 255 * 30 * 30
+
+
+FABRICS = [[40, 80, 160], [200, 190, 170], [150, 30, 40], [20, 120, 60], [230, 200, 40]]
+
+
+def _banded(colours, height=300, width=240, seed=0):
+    # Horizontal fabric bands with shading across the width and sensor noise,
+    # on a white border.
+    rng = np.random.default_rng(seed)
+    band = (np.arange(height) // (height // (6 * len(colours)))) % len(colours)
+    base = np.array(colours, dtype=np.float64)[band][:, None, :].repeat(width, axis=1)
+    base *= (0.85 + 0.15 * np.sin(np.arange(width) / width * np.pi))[None, :, None]
+    img = np.clip(base + rng.normal(0, 6, (height, width, 3)), 0, 240).astype(np.uint8)
+    img[:, :20] = 255
+    return img
+
+
+@pytest.mark.parametrize("n_colours", [1, 2, 3, 4, 5])
+def test_choose_k_counts_fabrics_on_a_sample(n_colours):
+    img = _banded(FABRICS[:n_colours])
+    k, inertias = choose_k(img, foreground_mask(img), sample_size=5000, seed=0)
+    assert k == n_colours
+    assert inertias[0] > 0 and len(inertias) <= AUTO_K_MAX
+
+
+def test_choose_k_on_an_empty_mask():
+    blank = np.full((8, 8, 3), 255, dtype=np.uint8)
+    assert choose_k(blank, foreground_mask(blank), seed=0) == (1, [])
+
+
+def test_auto_k_through_the_garment_helpers():
+    img = _banded(FABRICS[:3])
+    colours = dominant_colors(img, k="auto", seed=0)
+    assert len(colours) == 3
+    assert sum(share for _, share in colours) == pytest.approx(1.0)
+    found = np.array(sorted(rgb for rgb, _ in colours), dtype=float)
+    assert np.abs(found - np.array(sorted(FABRICS[:3]))).max() < 25
+    colour = process_image_with_combined_method(img, k="auto", foreground_only=True, seed=0)
+    assert min(np.abs(np.array(colour) - rgb).max() for rgb, _ in colours) <= 1
+
+
+def test_parse_k():
+    assert parse_k("auto") == "auto" and parse_k("3") == 3
+    for value in ("0", "-2", "four"):
+        with pytest.raises(ValueError):
+            parse_k(value)
+
+
+@pytest.mark.parametrize("sampling", ["random", "grid"])
+def test_sample_pixels_draws_only_masked_pixels(sampling):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 200, (300, 400, 3), dtype=np.uint8)
+    mask = np.zeros(img.shape[:2], dtype=np.uint8)
+    mask[50:150, 100:300] = 255
+    img[mask == 0] = 255
+    pixels = sample_pixels(img, mask, 2000, sampling, seed=1)
+    assert pixels.dtype == np.float32 and 0 < len(pixels) <= 2000
+    assert (pixels < 255).all()
+    assert np.array_equal(pixels, sample_pixels(img, mask, 2000, sampling, seed=1))
+
+
+def test_sample_pixels_without_sampling():
+    img = np.arange(60, dtype=np.uint8).reshape(4, 5, 3)
+    mask = np.zeros((4, 5), dtype=np.uint8)
+    mask[1, 2] = 1
+    assert np.array_equal(sample_pixels(img), img.reshape(-1, 3))
+    assert np.array_equal(sample_pixels(img, mask, 10), img[1:2, 2])
+    assert sample_pixels(img, np.zeros_like(mask), 10).shape == (0, 3)
+    with pytest.raises(ValueError):
+        sample_pixels(img, sample_size=5, sampling="stratified")
+
+
+def test_sample_pixels_on_a_sparse_mask():
+    # A tiny foreground must not need candidates in proportion to the image.
+    img = np.zeros((2000, 2000, 3), dtype=np.uint8)
+    mask = np.zeros(img.shape[:2], dtype=np.uint8)
+    mask[:5, :5] = 255
+    img[:5, :5] = 100
+    pixels = sample_pixels(img, mask, 20, "random", seed=0)
+    assert len(pixels) == 20 and (pixels == 100).all()
+
+
+def test_sampled_kmeans_stays_close_to_the_full_image():
+    img = _banded(FABRICS[:2], height=600, width=500)
+    full = process_image_with_combined_method(img, foreground_only=True, seed=0)
+    for sampling in ("random", "grid"):
+        sampled = process_image_with_combined_method(
+            img, foreground_only=True, sample_size=5000, sampling=sampling, seed=0
+        )
+        assert np.abs(np.array(sampled) - full).max() <= 4
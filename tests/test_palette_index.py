@@ -0,0 +1,75 @@
+"""
+PaletteIndex against the original per-swatch colorspacious loop, and its
+KD-tree queries against a brute-force scan.
+"""
+
+import numpy as np
+import pytest
+from colorspacious import cspace_convert
+from scipy.spatial import distance
+
+from utils.color_difference import get_palette_index, hex_to_rgb
+from utils.palette_index import to_ucs
+
+
+@pytest.fixture(scope="module")
+def index():
+    return get_palette_index()
+
+
+@pytest.fixture(scope="module")
+def loop_is_allowed(index):
+    """
+    The original color_is_allowed: colorspacious per colour and
+    distance.euclidean per swatch, independent of utils.cam02ucs. Swatch
+    conversions are memoised, which does not change their values.
+    """
+    swatches = {
+        season: [cspace_convert(hex_to_rgb(h), "sRGB1", "CAM02-UCS") for h in index.hex[season]]
+        for season in index.seasons
+    }
+
+    def is_allowed(color, season, threshold=40):
+        color_ucs = cspace_convert(color, "sRGB1", "CAM02-UCS")
+        return any(distance.euclidean(color_ucs, swatch) < threshold for swatch in swatches[season])
+
+    is_allowed.swatches = swatches
+    return is_allowed
+
+
+@pytest.fixture(scope="module")
+def queries():
+    rng = np.random.default_rng(0)
+    return [tuple(int(v) for v in c) for c in rng.integers(0, 256, (200, 3))]
+
+
+@pytest.mark.parametrize("threshold", [5, 20, 40, 80])
+def test_is_allowed_matches_loop(index, loop_is_allowed, queries, threshold):
+    for season in index.seasons:
+        for q in queries:
+            assert index.is_allowed(q, season, threshold) == loop_is_allowed(q, season, threshold)
+
+
+def test_threshold_at_a_swatch_distance(index, loop_is_allowed, queries):
+    """Where only the exact colorspacious re-check decides the verdict."""
+    for q in queries[:20]:
+        reference = cspace_convert(q, "sRGB1", "CAM02-UCS")
+        for season in index.seasons:
+            for swatch in loop_is_allowed.swatches[season][:5]:
+                threshold = distance.euclidean(reference, swatch)
+                for t in (threshold, np.nextafter(threshold, np.inf)):
+                    assert index.is_allowed(q, season, t) == loop_is_allowed(q, season, t)
+
+
+def test_seasons_for_color_matches_is_allowed(index, queries):
+    for q in queries[:50]:
+        for result in index.seasons_for_color(q, 20):
+            assert result["allowed"] == index.is_allowed(q, result["season"], 20)
+
+
+def test_nearest_matches_brute_force(index):
+    colors = np.random.default_rng(1).integers(0, 256, (500, 3))
+    diff = to_ucs(colors)[:, None, :] - index.all_ucs[None, :, :]
+    expected = np.argsort(np.sqrt(np.sum(diff * diff, axis=2)), axis=1, kind="stable")[:, :5]
+    for row, swatches in zip(expected, index.nearest(colors, k=5)):
+        assert [sw["hex"] for sw in swatches] == [index.all_hex[i] for i in row]
@@ -0,0 +1,81 @@
+"""
+The compiled palette artifact against palettes.json, and the store's
+reload behaviour.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from utils.palette_index import PaletteIndex
+from utils.palette_store import PALETTES_PATH, PaletteStore, compile_palettes, palettes_version, read_artifact
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "palettes.json"
+    shutil.copy(PALETTES_PATH, path)
+    return str(path)
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_artifact_round_trips_the_source(source, tmp_path):
+    target = str(tmp_path / "palettes.bin")
+    compiled = compile_palettes(source, target)
+    index, built_from = read_artifact(target)
+    fresh = PaletteIndex(_load(source))
+    assert built_from == palettes_version(source)
+    assert index.hex == compiled.hex == _load(source)
+    assert index.seasons == fresh.seasons and index.all_hex == fresh.all_hex
+    assert np.array_equal(index.offsets, fresh.offsets)
+    assert np.array_equal(index.all_ucs, fresh.all_ucs) and np.array_equal(index.all_rgb, fresh.all_rgb)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_read_artifact_rejects_other_files(tmp_path, source):
+    path = tmp_path / "palettes.bin"
+    path.write_bytes(b"not an artifact")
+    with pytest.raises(ValueError):
+        read_artifact(str(path))
+    compile_palettes(source, str(path))
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        read_artifact(str(path))
+
+
+def test_store_compiles_a_missing_artifact_and_reloads_changes(source, tmp_path):
+    target = str(tmp_path / "palettes.bin")
+    store = PaletteStore(source, target, reload_interval=0)
+    first = store.current()
+    assert os.path.exists(target) and store.current() is first
+
+    palettes = _load(source)
+    season = next(iter(palettes))
+    palettes[season] = palettes[season][:3]
+    with open(source, "w") as f:
+        json.dump(palettes, f)
+    updated = store.current()
+    assert updated is not first and updated.hex[season] == palettes[season]
+    assert read_artifact(target)[1] == palettes_version(source)
+
+
+def test_store_rebuilds_a_corrupt_artifact(source, tmp_path):
+    target = tmp_path / "palettes.bin"
+    target.write_bytes(b"garbage")
+    index = PaletteStore(source, str(target), reload_interval=0).current()
+    assert index.hex == _load(source)
+    assert read_artifact(str(target))[1] == palettes_version(source)
+
+
+def test_store_falls_back_to_memory_when_it_cannot_write(source, tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    index = PaletteStore(source, str(blocker / "palettes.bin"), reload_interval=0).current()
+    assert index.hex == _load(source)
@@ -0,0 +1,72 @@
+"""
+SeasonOverlap against a brute-force comparison of every pair of palettes.
+"""
+
+import numpy as np
+import pytest
+
+from utils.color_difference import get_palette_index
+from utils.season_overlap import SeasonOverlap, get_season_overlap
+
+
+@pytest.fixture(scope="module")
+def index():
+    return get_palette_index()
+
+
+@pytest.fixture(scope="module")
+def overlap(index):
+    return SeasonOverlap(index)
+
+
+def _brute_nearest(index, season_a, season_b):
+    ucs_a, ucs_b = index.ucs[season_a], index.ucs[season_b]
+    return np.sqrt(((ucs_a[:, None] - ucs_b[None]) ** 2).sum(axis=2)).min(axis=1)
+
+
+def test_nearest_distances_match_brute_force(index, overlap):
+    for a, season_a in enumerate(overlap.seasons):
+        for b, season_b in enumerate(overlap.seasons):
+            got = overlap.nearest_dist[index.offsets[a]:index.offsets[a + 1], b]
+            assert np.allclose(got, _brute_nearest(index, season_a, season_b), atol=1e-4)
+
+
+@pytest.mark.parametrize("delta_e", [2.0, 5.0, 15.0])
+def test_similarity_and_chamfer_match_brute_force(index, overlap, delta_e):
+    seasons = overlap.seasons
+    one_way = np.array([[np.mean(_brute_nearest(index, a, b) < delta_e) for b in seasons] for a in seasons])
+    assert np.allclose(overlap.similarity(delta_e), (one_way + one_way.T) / 2)
+    mean = np.array([[_brute_nearest(index, a, b).mean() for b in seasons] for a in seasons])
+    assert np.allclose(overlap.chamfer, (mean + mean.T) / 2, atol=1e-4)
+    assert np.allclose(np.diag(overlap.similarity(delta_e)), 1.0)
+
+
+def test_similarity_is_cached(overlap):
+    assert overlap.similarity(5) is overlap.similarity(5.0)
+
+
+def test_pair_lists_shared_swatches(index, overlap):
+    season_a, season_b = overlap.seasons[:2]
+    pair = overlap.pair(season_a, season_b, 10.0)
+    dists = _brute_nearest(index, season_a, season_b)
+    assert len(pair["shared"]) == int(np.sum(dists < 10.0))
+    assert [s["delta_e"] for s in pair["shared"]] == sorted(s["delta_e"] for s in pair["shared"])
+
+
+def test_neighbours_exclude_the_season_and_rank_by_similarity(overlap):
+    season = overlap.seasons[0]
+    neighbours = overlap.neighbours(season)
+    assert season not in [n["season"] for n in neighbours]
+    assert len(neighbours) == len(overlap.seasons) - 1
+    scores = [n["similarity"] for n in neighbours]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_unknown_season(overlap):
+    with pytest.raises(ValueError):
+        overlap.pair("Summer Solstice", overlap.seasons[0])
+
+
+def test_get_season_overlap_follows_the_index(index):
+    assert get_season_overlap() is get_season_overlap()
+    assert get_season_overlap().index is index
@@ -0,0 +1,73 @@
+"""
+The shared endpoint plumbing: image decoding, deadlines, rejections and the
+ops routes.
+"""
+
+import json
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from utils.executor import ExecutorSaturated, ExecutorUnavailable
+from utils.server import DEADLINE_HEADER, decode_image, ops_router, rejection_response, request_deadline
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(ops_router)
+
+    @app.post("/decode")
+    async def decode(request: Request):
+        return {"shape": list(decode_image(await request.body()).shape)}
+
+    @app.get("/deadline")
+    async def deadline(request: Request):
+        return {"timeout": request_deadline(request).timeout}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _png(mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, (8, 6)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_decode_image_gives_rgb():
+    assert decode_image(_png()).shape == (6, 8, 3)
+    assert decode_image(_png("L")).shape == (6, 8, 3)
+    with pytest.raises(Exception):
+        decode_image(b"not an image")
+
+
+def test_health_and_metrics_render_after_a_request(client):
+    # /api/health must stay JSON-serialisable once requests have recorded spans.
+    assert client.post("/decode", content=_png()).json() == {"shape": [6, 8, 3]}
+    response = client.get("/api/health")
+    assert response.status_code == 200, response.text
+    body = response.json()
+    json.dumps(body, allow_nan=False)
+    buckets = body["metrics"]["color_ai_stage_duration_seconds"][0]["value"]["buckets"]
+    assert list(buckets)[-1] == "+Inf" and buckets["+Inf"] >= 1
+    assert 'le="+Inf"' in client.get("/metrics").text
+
+
+def test_request_deadline_header(client):
+    assert client.get("/deadline", headers={DEADLINE_HEADER: "250"}).json() == {"timeout": 0.25}
+    assert client.get("/deadline", headers={DEADLINE_HEADER: "-5"}).json() == {"timeout": 0.0}
+    with pytest.raises(ValueError):
+        client.get("/deadline", headers={DEADLINE_HEADER: "soon"})
+
+
+@pytest.mark.parametrize("exc, status", [(ExecutorSaturated("busy", retry_after=2), 429),
+                                         (ExecutorUnavailable("down"), 503)])
+def test_rejection_response(exc, status):
+    response = rejection_response(exc)
+    assert response.status_code == status
+    assert response.headers["Retry-After"] == str(exc.retry_after)
+    assert json.loads(response.body) == {"error": str(exc)}
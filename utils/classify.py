@@ -8,9 +8,19 @@ This script classifies a person into a color season based on:
 - Tone: "warm", "light warm", "neutral", "light cool", "cool"
 
 Includes all seasons and sub-seasons.
+
+classify_season_batch classifies many people at once against SEASONS
+compiled into NumPy arrays (SeasonTable), with the same result as calling
+classify_season on each of them.
 """
 
-import math
+import logging
+
+import numpy as np
+
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
 
 # TODO: We're assuming convexity in this space which is a big assumption. 
 # Likely untrue, should define more complex boundaries
@@ -201,67 +211,164 @@ SEASONS = [
     },
 ]
 
-def in_range(color, cmin, cmax):
+def classify_season(skin_rgb, hair_rgb, eye_rgb, tone):
     """
-    Check if a color (RGB tuple) falls within the specified range.
+    Classify a person into a color season based on skin, hair, and eye RGB values,
+    along with their undertone. If no exact match, find the closest match.
     """
-    return all(cmin[i] <= color[i] <= cmax[i] for i in range(3))
+    return score_seasons(skin_rgb, hair_rgb, eye_rgb, tone)["season"]
 
-def calculate_centroid(cmin, cmax):
+def score_seasons(skin_rgb, hair_rgb, eye_rgb, tone):
     """
-    Calculate the centroid (average RGB value) of a range.
+    Every season open to the undertone, scored, from the same pass as
+    classify_season_batch.
+
+    Returns {"season": classify_season's label, "palette": the season that
+    label names (without the "(multiple matches?)" flag), "margin",
+    "scores": [...]},
+    where each score is {"season", "in_range": {feature: bool}, "match":
+    all three in range, "distance": summed centroid distance}. Scores are
+    in the order the label is decided: in-range matches first in SEASONS
+    order, then the rest by distance, so the first score is always the
+    labelled season.
+
+    margin is the runner-up's distance minus the labelled season's when the
+    label came from the nearest-centroid fallback. It is None when the label
+    came from the in-range rule, which does not compare distances, and when
+    there is a single candidate.
     """
-    return tuple((cmin[i] + cmax[i]) // 2 for i in range(3))
+    logger.debug("score_seasons: skin=%s hair=%s eye=%s tone=%s", skin_rgb, hair_rgb, eye_rgb, tone)
+    with span("classify"):
+        colors = _as_colors([skin_rgb], [hair_rgb], [eye_rgb])
+        in_range, distance, compatible = _table.evaluate(colors, [tone])
+        matches, chosen, label = _decide(in_range, distance, compatible)
+        candidates = np.flatnonzero(compatible[0])
+        in_range_rule = bool(matches[0].any())
+        # Matches keep SEASONS order (the first one is the label); the rest
+        # are by distance, first on ties, as the fallback picks them.
+        ranked = sorted(candidates, key=lambda i: (not matches[0, i], 0.0 if matches[0, i] else distance[0, i], i))
+    logger.debug("classified as %s", label[0])
+    margin = None
+    if not in_range_rule and len(ranked) > 1:
+        margin = float(distance[0, ranked[1]] - distance[0, ranked[0]])
+    return {
+        "season": label[0],
+        "palette": _table.names[chosen[0]],
+        "margin": margin,
+        "scores": [
+            {
+                "season": _table.names[i],
+                "in_range": dict(zip(FEATURES, in_range[0, i].tolist())),
+                "match": bool(matches[0, i]),
+                "distance": float(distance[0, i]),
+            }
+            for i in ranked
+        ],
+    }
+
+FEATURES = ("skin", "hair", "eye")
+BATCH_CHUNK = 65536
 
-def euclidean_distance(color1, color2):
+
+class SeasonTable:
     """
-    Calculate the Euclidean distance between two RGB tuples.
+    SEASONS compiled into arrays, one row per season:
+
+        mins, maxs   (seasons, features, 3) int64 range bounds, inclusive
+        centroids    (seasons, features, 3) int64 range midpoints, rounded down
+        tone_masks   undertone -> (seasons,) bool, seasons open to that undertone
+
+    with features in FEATURES order.
     """
-    return math.sqrt(sum((color1[i] - color2[i]) ** 2 for i in range(3)))
 
-def classify_season(skin_rgb, hair_rgb, eye_rgb, tone):
+    def __init__(self, seasons):
+        self.names = [season["name"] for season in seasons]
+        self.mins = np.array([[season[f"{f}_min"] for f in FEATURES] for season in seasons], dtype=np.int64)
+        self.maxs = np.array([[season[f"{f}_max"] for f in FEATURES] for season in seasons], dtype=np.int64)
+        self.centroids = (self.mins + self.maxs) // 2
+        tones = {tone for season in seasons for tone in season["undertones"]}
+        self.tone_masks = {
+            tone: np.array([tone in season["undertones"] for season in seasons]) for tone in sorted(tones)
+        }
+
+    def compatible(self, tones):
+        """(people, seasons) bool: which seasons each undertone may be classified into."""
+        if len(tones) == 1 and tones[0] in self.tone_masks:
+            return self.tone_masks[tones[0]][None]
+        unique, inverse = np.unique(np.asarray(tones, dtype=str), return_inverse=True)
+        unmatched = [tone for tone in unique if tone not in self.tone_masks]
+        if unmatched:
+            raise ValueError(f"No season for undertone: {unmatched[0]}")
+        return np.stack([self.tone_masks[tone] for tone in unique])[inverse.reshape(-1)]
+
+    def evaluate(self, colors, tones):
+        """
+        In-range flags and centroid distances for a chunk of people.
+
+        colors is (people, features, 3). Returns in_range (people, seasons,
+        features) bool, distance (people, seasons) float64 and compatible
+        (people, seasons) bool. Each distance is the sum over features of the
+        Euclidean RGB distance to the season's centroid, added in FEATURES
+        order.
+        """
+        compatible = self.compatible(tones)
+        x = colors[:, None]
+        in_range = ((x >= self.mins) & (x <= self.maxs)).all(axis=3)
+        diff = x - self.centroids
+        sq = diff * diff
+        per_feature = np.sqrt(sq[..., 0] + sq[..., 1] + sq[..., 2])
+        distance = per_feature[..., 0] + per_feature[..., 1] + per_feature[..., 2]
+        return in_range, distance, compatible
+
+
+_table = SeasonTable(SEASONS)
+
+
+def _as_colors(skin, hair, eye):
+    colors = np.stack([np.asarray(skin), np.asarray(hair), np.asarray(eye)], axis=1)
+    if colors.ndim != 3 or colors.shape[2] != 3:
+        raise ValueError(f"Expected (people, 3) RGB arrays, got {colors.shape[0::2]}")
+    return colors.astype(np.int64 if colors.dtype.kind in "iub" else np.float64)
+
+
+def _decide(in_range, distance, compatible):
     """
-    Classify a person into a color season based on skin, hair, and eye RGB values,
-    along with their undertone. If no exact match, find the closest match.
+    classify_season's rule over SeasonTable.evaluate output: the first
+    in-range season in SEASONS order, flagged when more than one matches,
+    else the closest (first on ties). Returns the (people, seasons) match
+    flags, the chosen season per person and the list of labels.
+    """
+    matches = in_range.all(axis=2) & compatible
+    first = matches.argmax(axis=1)
+    closest = np.where(compatible, distance, np.inf).argmin(axis=1)
+    counts = matches.sum(axis=1)
+    names = np.array(_table.names, dtype=object)
+    multiple = np.array([name + " (multiple matches?)" for name in _table.names], dtype=object)
+    chosen = np.where(counts > 0, first, closest)
+    labels = np.where(counts > 1, multiple[chosen], names[chosen])
+    return matches, chosen, labels.tolist()
+
+
+def classify_season_batch(skin, hair, eye, tones, chunk_size=BATCH_CHUNK):
     """
-    print("classify_season triggered with following input")
-    print("skin_color:", skin_rgb)
-    print("eye color:", eye_rgb)
-    print("hair color", hair_rgb)
-    print("tone", tone)
-
-    possible_matches = []
-    distances = []
-
-    for season in SEASONS:
-        
-        if tone not in season["undertones"]:
-            continue
-        if (
-            in_range(skin_rgb, season["skin_min"], season["skin_max"]) and
-            in_range(hair_rgb, season["hair_min"], season["hair_max"]) and
-            in_range(eye_rgb, season["eye_min"], season["eye_max"])
-        ):
-            possible_matches.append(season["name"])
-
-        # Calculate distances for potential fallback
-        skin_centroid = calculate_centroid(season["skin_min"], season["skin_max"])
-        hair_centroid = calculate_centroid(season["hair_min"], season["hair_max"])
-        eye_centroid = calculate_centroid(season["eye_min"], season["eye_max"])
-
-        skin_distance = euclidean_distance(skin_rgb, skin_centroid)
-        hair_distance = euclidean_distance(hair_rgb, hair_centroid)
-        eye_distance = euclidean_distance(eye_rgb, eye_centroid)
-
-        total_distance = skin_distance + hair_distance + eye_distance
-        distances.append((season["name"], total_distance))
-    print(possible_matches)
-    if possible_matches:
-        return possible_matches[0] if len(possible_matches) == 1 else possible_matches[0] + " (multiple matches?)"
-    
-    # If no exact match, return the closest match
-    closest_match = min(distances, key=lambda x: x[1])
-    return f"{closest_match[0]}"
+    classify_season for many people at once.
+
+    skin, hair and eye are (people, 3) RGB arrays and tones a sequence of
+    undertones. Returns the list of season names classify_season would give
+    each person. People are processed chunk_size at a time to bound memory.
+    """
+    colors = _as_colors(skin, hair, eye)
+    tones = np.asarray(tones, dtype=str)
+    if len(tones) != len(colors):
+        raise ValueError(f"Got {len(colors)} colours but {len(tones)} undertones")
+    results = []
+    with span("classify"):
+        for start in range(0, len(colors), chunk_size):
+            stop = start + chunk_size
+            in_range, distance, compatible = _table.evaluate(colors[start:stop], tones[start:stop])
+            results.extend(_decide(in_range, distance, compatible)[2])
+    return results
+
 
 # Example Usage
 if __name__ == "__main__":
@@ -282,3 +389,4 @@ if __name__ == "__main__":
 
     result2 = classify_season(skin2, hair2, eyes2, tone2)
     print("Result 2:", result2)
+    print(score_seasons(skin, hair, eyes, tone))
@@ -1,136 +1,112 @@
-import json
-from colorspacious import cspace_convert
+from collections.abc import Mapping
+
 from scipy.spatial import distance
+from utils.cam02ucs import srgb_to_cam02ucs
+from utils.delta_e import DEFAULT_METRIC
+from utils.metrics import span
+from utils.palette_store import get_palette_store
+
+class _PaletteView(Mapping):
+    """
+    Read-only season -> hex list mapping over the current compiled palettes
+    (see utils.palette_store), so it follows hot reloads of palettes.json.
+    """
+
+    def __getitem__(self, season):
+        return get_palette_index().hex[season]
+
+    def __iter__(self):
+        return iter(get_palette_index().seasons)
 
-color_palettes = {
-    "Cool Winter": [
-      "#017584", "#017073", "#00A5AD", "#009DC0", "#018FAC", "#0484B1", "#006E9B", "#5477B6", "#1259A5", "#1C55A7",
-      "#004FA2", "#0341A0", "#072280", "#1F1E57", "#3B2E74", "#44366B", "#5847AD", "#654E8F", "#622D7D", "#62366B",
-      "#793177", "#77095D", "#97113B", "#B00104", "#C5003E", "#C40429", "#B72663", "#C83963", "#D83B68", "#F888AC",
-      "#F9BEC6", "#FDF5E9", "#373D55", "#0B0B07", "#494947", "#ADA69E", "#F1ECDF"
-    ],
-    "Bright Winter": [
-      "#4E1556", "#421774", "#492458", "#50377B", "#024E42", "#005442", "#07754C", "#047D58", "#028260", "#07774B",
-      "#01368A", "#002F7C", "#005092", "#016A94", "#00709E", "#006FAF", "#005EA8", "#026EB3", "#830000", "#A20000",
-      "#A60201", "#C00332", "#BD0144", "#BE0C5D", "#C61450", "#D8285B", "#F7EF2D", "#F5F461", "#F0E99D", "#D8B9BE",
-      "#ECC6BD", "#F7F4E3", "#010101", "#010005"
-    ],
-    "Deep Winter": [
-      "#0D2B2A", "#085A4D", "#02685A", "#006C69", "#065E6C", "#017C9D", "#015E8A", "#265F7B", "#344486", "#18407B",
-      "#07479B", "#0161AA", "#422D4E", "#3E3369", "#3D1A6A", "#4F1C71", "#612E60", "#841252", "#78201F", "#720A12",
-      "#A31532", "#9E0911", "#A22058", "#AD1A4A", "#B51651", "#F8ED81", "#E8D8A8", "#F4D8D1", "#3A392D", "#393A34",
-      "#314061", "#F4EFE2"
-    ],
-    "True Winter": [
-      "#3F6B5E", "#105962", "#106650", "#0B7287", "#104F88", "#086B99", "#0089D4", "#263268", "#313A89", "#333D8D",
-      "#193E96", "#2554BF", "#49206F", "#4E3475", "#573397", "#6836A4", "#64253F", "#9F103A", "#B41B3B", "#BB122C",
-      "#AD2054", "#BB144D", "#DC255C", "#FF4D83", "#FC7BA2", "#FAD4CD", "#EDD8D0", "#FEFF55", "#33364A", "#272822",
-      "#40413D", "#96978A", "#CFC8B8", "#FCFDFE"
-    ],
-    "Deep Autumn": [
-      "#38382C", "#253C3C", "#1E323B", "#1C3230", "#163E31", "#2A402C", "#154E46", "#25464E", "#125E79", "#125774",
-      "#1E4C6C", "#1F2D4A", "#3E1F27", "#422231", "#4E2E4E", "#602740", "#521616", "#6D1217", "#862828", "#981326",
-      "#A4131A", "#FCCB0C", "#F1CA4D", "#933922", "#CA2E1B", "#CA3325", "#BD4342", "#D16617", "#252837", "#332E2B",
-      "#1D1D19", "#B9905A", "#D1B083"
-    ],
-    "Warm Autumn": [
-      "#004303", "#0D5704", "#395814", "#3C6329", "#3A5A04", "#4D7228", "#86A359", "#003156", "#046B83", "#024A7C",
-      "#32214F", "#331134", "#96000E", "#9E0000", "#C10102", "#AD0900", "#B8020A", "#B1201C", "#CE1B1F", "#D63414",
-      "#D25102", "#CD3E2F", "#F86247", "#F78F43", "#F1A06A", "#DC9003", "#F9BF02", "#EFBB34", "#3D1701", "#663F14",
-      "#580E02", "#663202", "#770700", "#7D3C21", "#854A00", "#8E643C", "#AF9B71", "#E2D5B6"
-    ],
-    "Soft Autumn": [
-      "#8EA57A", "#8AA78A", "#868C5E", "#8B9058", "#5D8862", "#5B764C", "#36797E", "#326D8A", "#296A80", "#186081",
-      "#285363", "#016254", "#03575D", "#22041C", "#654453", "#5F2A4F", "#4A0926", "#71161C", "#882D37", "#940E0C",
-      "#B20000", "#CE715C", "#D67A5C", "#F47B71", "#F2825B", "#F69E6A", "#FCB679", "#FDE299", "#958F82", "#020A2C",
-      "#5A2B06", "#814A1C", "#984A2C", "#F9F8E3"
-    ],
-    "True Autumn": [
-      "#8C8841", "#6E6D49", "#647950", "#476E1E", "#416413", "#1F391B", "#094D20", "#0E4E45", "#036470", "#005888",
-      "#2D5169", "#0E2351", "#47191B", "#330607", "#630510", "#6F0606", "#AD161A", "#B90105", "#C2030B", "#DE4641",
-      "#F18462", "#FF5804", "#DFAD03", "#F1B805", "#710901", "#912303", "#A31C00", "#A7441D", "#792904", "#55372A",
-      "#5E300C", "#976930", "#AA8E50", "#F1EAD0"
-    ],
-    "Soft Summer": [
-        "#66AF7F", "#5CA591", "#419170", "#086C67", "#065E6C", "#007A96", "#328C90", "#065C99", "#05597F", "#2B7690",
-        "#6E628A", "#4C2963", "#400029", "#5C0100", "#801D33", "#900918", "#C01341", "#C64C5D", "#D08488", "#D8A19A",
-        "#113C5C", "#090C27", "#4D300E", "#6A3A24", "#B49B72", "#CED4B8"
-    ],
-    "Cool Summer": [
-        "#148172", "#168185", "#1983A3", "#149BB8", "#17A4BC", "#1B77AA", "#5F7FBA", "#2D5DA3", "#286BA2", "#1A57B0",
-        "#4F3766", "#6E3C71", "#714F8D", "#755CA8", "#8969A1", "#9D7AB7", "#762636", "#903568", "#923746", "#BD1739",
-        "#C6194D", "#DC2D52", "#D9376E", "#C33A6F", "#E57BAA", "#FB8CAD", "#FDC8C7", "#614D42", "#3E465C", "#6C686D",
-        "#C0B9B3", "#FEF8E8"
-    ],
-    "Light Summer": [
-        "#00A7B6", "#3FC9BC", "#34AEA2", "#14BAB7", "#00A699", "#0E7E6E", "#039DA0", "#0A5EB0", "#2975BB", "#2172B8",
-        "#6094D0", "#69B4DE", "#86B7DA", "#AED6E9", "#AD9EC5", "#A78CBC", "#9477AF", "#8668AB", "#7D458B", "#6C488C",
-        "#C00715", "#CE2F4F", "#DC495C", "#E45B79", "#F099A5", "#F6A9A6", "#FDCDCD", "#FFE9AC", "#111C51", "#446887",
-        "#979998", "#C3C7BC", "#A4836C", "#CBBCA8", "#F5F4E2"
-    ],
-    "True Summer": [
-        "#248E84", "#0191AB", "#079AA2", "#018095", "#087E87", "#9A0937", "#910A29", "#900B1E", "#700E1E", "#903963",
-        "#7C5473", "#724F7E", "#541748", "#23437E", "#3F5E9F", "#406199", "#587BB3", "#568CBD", "#739FCB", "#98BBE1",
-        "#CA1E54", "#E75377", "#EA92A0", "#F5A3A5", "#FBCDD5", "#325775", "#384453", "#848283", "#644632", "#886C55",
-        "#F7ECE3"
-    ],
-    "Bright Spring": [
-        "#00503B", "#004E2A", "#00735B", "#02984A", "#54C641", "#94B907", "#04A7C4", "#0192C1", "#0382C8", "#0076A6",
-        "#0163A0", "#0840A5", "#071A7D", "#020859", "#390B61", "#440A7B", "#AD2188", "#C50121", "#D30014", "#DC324B",
-        "#D81051", "#E7355B", "#F03676", "#E42B4E", "#FF5B5C", "#FAFF42", "#FDFB6A", "#1D1711", "#15336C", "#3F3E3C",
-        "#C0C0B3", "#F9F3DF"
-      ],
-      "Warm Spring": [
-        "#1A5C2B", "#1C661F", "#178362", "#157D4D", "#468943", "#6B8B38", "#89A436", "#9DB956", "#1198C0", "#177AA3",
-        "#17779A", "#166892", "#7F3C7A", "#AA5291", "#9C1718", "#C5211A", "#DD100E", "#F26307", "#EF7E64", "#FBB474",
-        "#FBB702", "#F8B802", "#FED204", "#FBD264", "#DB525A", "#E17065", "#74482A", "#8F411C", "#834C15", "#A07F5A",
-        "#CBBD98", "#EAE2CE"
-      ],
-      "Light Spring": [
-        "#028262", "#019594", "#04A39B", "#08C0A2", "#47C5B9", "#6AD6DA", "#39C2C9", "#04B5BD", "#086AB8", "#2E80C0",
-        "#02A0C5", "#00B5CF", "#2BB6D1", "#39ADCB", "#5EB4D9", "#CEB5D1", "#BA82C0", "#9462B3", "#BD0C29", "#E4586E",
-        "#F88C8B", "#F29990", "#F4B4AC", "#FFD3BB", "#FBE5B3", "#FBEEBF", "#132057", "#C49563", "#C4AA7C", "#CFB596",
-        "#E7CFB3", "#F7EFDC"
-      ],
-      "True Spring": [
-        "#9B529A", "#BC529D", "#BB82C6", "#069269", "#2A9C3D", "#00AF5A", "#86B55A", "#D2E67F", "#DEFDBD", "#FAFAA0",
-        "#71E9E7", "#04BCDB", "#049FBF", "#00A2D9", "#0CAAD2", "#4AC0E4", "#5FB7EC", "#E2282E", "#E6264B", "#FD6E86",
-        "#FE9D96", "#FBC3C2", "#FFAB93", "#FDBB6D", "#FFCA95", "#FAEF67", "#FDFA94", "#D4CFC3", "#192261", "#815427",
-        "#B39071", "#D9C3A2"
-      ]
-  }
+    def __len__(self):
+        return len(get_palette_index().seasons)
+
+color_palettes = _PaletteView()
 
 def hex_to_rgb(hex_color):
     """Convert a hex color to an RGB tuple."""
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
+def parse_color(color):
+    """
+    Parse a colour given as a hex string ("#RRGGBB") or an [R, G, B] list
+    into an RGB tuple of ints.
+    """
+    if isinstance(color, str):
+        if len(color.lstrip('#')) != 6:
+            raise ValueError(f"Invalid hex color: {color}")
+        return hex_to_rgb(color)
+    if len(color) != 3 or not all(0 <= c <= 255 for c in color):
+        raise ValueError(f"Invalid RGB color: {color}")
+    return tuple(int(c) for c in color)
+
 def rgb_to_lch(rgb_color):
     """Convert an RGB color to LCH."""
-    return cspace_convert(rgb_color, "sRGB1", "CAM02-UCS")
+    return srgb_to_cam02ucs(rgb_color)
 
 def color_difference_cie2000(lch1, lch2):
     """Calculate the CIE2000 color difference between two LCH colors."""
     return distance.euclidean(lch1, lch2)
 
-def color_is_allowed(color, color_palette, threshold=40):
-    # Load the JSON color palettes
-    try:
-        
-        allowed_colors = color_palettes[color_palette]
-        color_lch = rgb_to_lch(color)
-
-
-        for allowed_color in allowed_colors:
-            
-            allowed_color_lch = rgb_to_lch(hex_to_rgb(allowed_color))
-            print(allowed_color_lch)
-            if color_difference_cie2000(color_lch, allowed_color_lch) < threshold:
-                return True
-        return False
-    except Exception as e:
-        raise ValueError(f"Error loading color palettes: {e}")
+def get_palette_index():
+    """The PaletteIndex for the current palettes, from the compiled artifact."""
+    return get_palette_store().current()
 
+def seasons_for_color(color, threshold=40, metric=DEFAULT_METRIC):
+    """
+    Every season's minimum distance to color, nearest swatch and whether the
+    colour is allowed at threshold, from one pass over all palettes.
+    """
+    with span("palette_match"):
+        return get_palette_index().seasons_for_color(color, threshold, metric)
 
+def nearest_swatches(colors, k=5, season=None, radius=None):
+    """
+    Closest palette swatches for each colour: the k nearest, or all within
+    radius when one is given. Optionally limited to one season.
+    """
+    if radius is not None and not radius > 0:
+        raise ValueError(f"radius must be positive, got {radius}")
+    if radius is None and k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+    if not len(colors):
+        return []
+    with span("nearest_swatches"):
+        index = get_palette_index()
+        if radius is not None:
+            return index.within(colors, radius, season)
+        return index.nearest(colors, k, season)
 
+def match_colors(colors, seasons=None, threshold=40, metric=DEFAULT_METRIC):
+    """
+    Check many colours against one or more seasons in one vectorised pass.
+    Returns one dict per colour mapping each season to its minimum distance,
+    nearest swatch and whether the colour is allowed.
+    """
+    with span("palette_match"):
+        index = get_palette_index()
+        seasons = index.seasons if seasons is None else list(seasons)
+        minima, nearest, allowed = index.match_colors(colors, seasons, threshold, metric)
+        return [
+            {
+                season: {
+                    "delta_e": float(minima[i, j]),
+                    "nearest": index.all_hex[nearest[i, j]],
+                    "allowed": bool(allowed[i, j]),
+                }
+                for j, season in enumerate(seasons)
+            }
+            for i in range(len(minima))
+        ]
 
+def color_is_allowed(color, color_palette, threshold=40, metric=DEFAULT_METRIC):
+    """
+    True if color (RGB tuple) is within threshold of any swatch in the named
+    season's palette, measured with the named metric from utils.delta_e.
+    """
+    try:
+        with span("palette_match"):
+            return get_palette_index().is_allowed(color, color_palette, threshold, metric)
+    except Exception as e:
+        raise ValueError(f"Error loading color palettes: {e}")
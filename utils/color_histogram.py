@@ -0,0 +1,206 @@
+"""
+Quantised colour histograms and weighted k-means over them.
+
+A garment photo has millions of pixels but usually only a few thousand
+distinct colours once the low bits are dropped. color_histogram() counts the
+pixels in each occupied bin of a bits-per-channel grid with np.bincount and
+keeps each bin's mean colour, so nothing is lost beyond the quantisation
+step within a bin. weighted_kmeans() then clusters the bins with their
+pixel counts as weights (k-means++ seeding, Lloyd iterations), which gives
+the same objective as clustering every pixel at the bins' mean colours, at
+a cost that depends on the number of distinct colours, not the image size.
+select_k() picks the number of clusters the same way, growing k one centre
+at a time from the previous solution.
+
+    python -m benchmarks.run color_histogram   # benchmark against cv2.kmeans
+"""
+
+import numpy as np
+
+DEFAULT_BITS = 5
+DEFAULT_MIN_GAIN = 0.3
+DEFAULT_MIN_SEPARATION = 30.0
+
+
+def quantize(pixels, bits=DEFAULT_BITS):
+    """
+    Histogram bin of every pixel: the top bits of R, G and B packed into one
+    index in [0, 2 ** (3 * bits)), as a flat intp array.
+    """
+    if not 1 <= bits <= 8:
+        raise ValueError("bits must be between 1 and 8")
+    pixels = np.asarray(pixels)
+    if pixels.dtype != np.uint8 or pixels.shape[-1:] != (3,):
+        raise ValueError("pixels must be a uint8 array of shape (..., 3)")
+    flat = pixels.reshape(-1, 3)
+    # Build the index in uint16 (15 bits at bits=5), then widen once:
+    # np.bincount casts anything narrower than intp on every call.
+    quantised = flat >> (8 - bits)
+    wide = np.uint16 if 3 * bits <= 16 else np.int32
+    bins = quantised[:, 0].astype(wide) << (2 * bits)
+    bins |= quantised[:, 1].astype(wide) << bits
+    bins |= quantised[:, 2]
+    return bins.astype(np.intp)
+
+
+def color_histogram(pixels, mask=None, bits=DEFAULT_BITS):
+    """
+    Quantised colour histogram of uint8 RGB pixels.
+
+    Args:
+        pixels (np.ndarray): uint8 array of shape (..., 3), e.g. an image.
+        mask (np.ndarray, optional): Array of shape pixels.shape[:-1]; only
+            pixels where it is non-zero are counted. Masked-out pixels go
+            to a spare bin instead of being copied out.
+        bits (int): Bits kept per channel (1-8); 5 gives 32,768 bins.
+
+    Returns:
+        tuple: (colours, counts) for the occupied bins only: float64 (M, 3)
+        mean colour of the pixels in each bin and int64 (M,) pixel counts.
+    """
+    bins = quantize(pixels, bits)
+    flat = np.asarray(pixels).reshape(-1, 3)
+    n_bins = 1 << (3 * bits)
+    if mask is not None:
+        mask = np.asarray(mask).reshape(-1)
+        if len(mask) != len(flat):
+            raise ValueError("mask must match the pixel grid")
+        bins[mask == 0] = n_bins
+
+    counts = np.bincount(bins, minlength=n_bins + 1)[:n_bins]
+    occupied = np.flatnonzero(counts)
+    colours = np.empty((len(occupied), 3))
+    for channel in range(3):
+        sums = np.bincount(bins, weights=flat[:, channel], minlength=n_bins + 1)
+        colours[:, channel] = sums[occupied] / counts[occupied]
+    return colours, counts[occupied]
+
+
+def _assign(points, centers):
+    """Index of the nearest centre for every point, and its squared distance."""
+    d2 = (points * points).sum(axis=1)[:, None] - 2 * points @ centers.T + (centers * centers).sum(axis=1)
+    labels = d2.argmin(axis=1)
+    return labels, np.maximum(d2[np.arange(len(points)), labels], 0)
+
+
+def _kmeans_pp(points, weights, k, rng):
+    """k-means++ seeding with each point's probability scaled by its weight."""
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.choice(len(points), p=weights / weights.sum())]
+    d2 = ((points - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        p = weights * d2
+        total = p.sum()
+        if total <= 0:
+            # Fewer distinct points than clusters: duplicate a centre.
+            centers[i:] = centers[0]
+            break
+        centers[i] = points[rng.choice(len(points), p=p / total)]
+        d2 = np.minimum(d2, ((points - centers[i]) ** 2).sum(axis=1))
+    return centers
+
+
+def weighted_kmeans(points, weights, k, seed=None, attempts=1, max_iter=20, eps=1.0, init=None):
+    """
+    k-means on weighted points (e.g. histogram bins weighted by pixel count).
+
+    Args:
+        points (np.ndarray): (M, D) points.
+        weights (np.ndarray): (M,) non-negative weights.
+        k (int): Number of clusters.
+        seed (int, optional): Seed for k-means++ seeding; equal seeds give
+            equal results.
+        attempts (int): Independent k-means++ restarts; the one with the
+            lowest weighted inertia is kept. Ignored when init is given.
+        max_iter (int): Lloyd iterations per attempt.
+        eps (float): Stop once no centre moves more than this.
+        init (np.ndarray, optional): (k, D) starting centres instead of
+            k-means++ seeding.
+
+    Returns:
+        tuple: (inertia, labels, centers, sizes): total weighted squared
+        distance, (M,) cluster of each point, (k, D) centres and (k,) total
+        weight per cluster. A cluster that ends up empty keeps its last
+        centre with size 0.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(points) == 0:
+        raise ValueError("weighted_kmeans needs at least one point")
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(1 if init is not None else max(1, attempts)):
+        centers = np.array(init, dtype=np.float64) if init is not None else _kmeans_pp(points, weights, k, rng)
+        for _ in range(max_iter):
+            labels, _ = _assign(points, centers)
+            sizes = np.bincount(labels, weights=weights, minlength=k)
+            sums = np.stack(
+                [np.bincount(labels, weights=weights * points[:, d], minlength=k) for d in range(points.shape[1])],
+                axis=1,
+            )
+            moved = np.where(sizes[:, None] > 0, sums / np.maximum(sizes, 1e-12)[:, None], centers)
+            shift = np.abs(moved - centers).max()
+            centers = moved
+            if shift <= eps:
+                break
+        labels, d2 = _assign(points, centers)
+        inertia = float((weights * d2).sum())
+        if best is None or inertia < best[0]:
+            best = (inertia, labels, centers, np.bincount(labels, weights=weights, minlength=k))
+    return best
+
+
+def select_k(points, weights, k_max=8, min_gain=DEFAULT_MIN_GAIN, min_separation=DEFAULT_MIN_SEPARATION,
+             seed=None, candidates=4, max_iter=20, eps=1.0):
+    """
+    Choose the number of clusters for weighted points by the inertia elbow.
+
+    k grows from 1. Each step warm-starts from the previous centres plus
+    one new centre: the best of a few k-means++ (D^2-weighted) candidates,
+    judged by how much inertia it removes before any iteration. Lloyd
+    iterations then refine the result. Growth stops, keeping k - 1, at the
+    first k where either of these holds:
+
+    - inertia is not at least min_gain below that of k - 1. One Gaussian
+      blob split in two only loses about 20% of its inertia in three
+      dimensions, so 0.3 keeps noise in one cluster.
+    - two centres end up closer than min_separation, in the points' units
+      (RGB levels for colours). Shading on a plain garment can pass the
+      gain test, but its halves are only a few levels apart.
+
+    Args:
+        points, weights: As for weighted_kmeans.
+        k_max (int): Largest k considered.
+        min_gain (float): Relative inertia drop required to add a cluster.
+        min_separation (float): Smallest distance allowed between centres.
+        seed (int, optional): Seed for the candidate centres.
+        candidates (int): k-means++ candidates tried per new centre.
+        max_iter, eps: As for weighted_kmeans.
+
+    Returns:
+        tuple: (k, centers, inertias) with the chosen k, its (k, D) centres
+        and the inertia of every k evaluated, starting at k = 1.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(points) == 0:
+        raise ValueError("select_k needs at least one point")
+    rng = np.random.default_rng(seed)
+    centers = (weights @ points / weights.sum())[None]
+    _, d2 = _assign(points, centers)
+    inertias = [float((weights * d2).sum())]
+    for k in range(2, min(k_max, len(points)) + 1):
+        p = weights * d2
+        if p.sum() <= 0:
+            break
+        picks = rng.choice(len(points), size=candidates, p=p / p.sum())
+        gains = [(weights * np.minimum(d2, ((points - points[i]) ** 2).sum(axis=1))).sum() for i in picks]
+        init = np.vstack([centers, points[picks[int(np.argmin(gains))]]])
+        inertia, _, grown, _ = weighted_kmeans(points, weights, k, init=init, max_iter=max_iter, eps=eps)
+        inertias.append(inertia)
+        gaps = np.sqrt(((grown[:, None, :] - grown[None, :, :]) ** 2).sum(axis=2))[np.triu_indices(k, 1)]
+        if inertia > (1 - min_gain) * inertias[-2] or gaps.min() < min_separation:
+            break
+        centers = grown
+        _, d2 = _assign(points, centers)
+    return len(centers), centers, inertias
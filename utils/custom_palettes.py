@@ -0,0 +1,341 @@
+"""
+User-defined custom palettes.
+
+Stylists can define their own palettes alongside the seasons in
+Color-AI/palettes.json. Palettes are persisted in a local SQLite database and
+mirrored in memory by CustomPaletteIndex, which keeps every swatch of every
+palette in one growable slab of CAM02-UCS rows:
+
+- inserting a swatch appends a row (or reuses a freed one), deleting one
+  frees its row, so an edit costs O(swatches changed), never a rebuild;
+- each palette keeps the array of its slab rows, so membership and nearest
+  queries scoped to one palette touch only that palette's swatches.
+
+Distances are the same CAM02-UCS Euclidean distances as color_is_allowed,
+so the default threshold of 40 means the same thing.
+
+Configuration (environment variables):
+    COLOR_AI_CUSTOM_PALETTES_DB   SQLite file (default: res/custom_palettes.sqlite3)
+
+The default path is inside the deployed tree and only suits local
+development. In production COLOR_AI_CUSTOM_PALETTES_DB must point to a
+writable location that outlives the instance and is shared by every
+instance serving the API: on a serverless deploy (see Vercel.json) the code
+directory is read-only and each instance would otherwise get its own copy.
+Opening the registry fails with an error naming the variable when the path
+is not writable.
+
+Benchmark at 10k palettes x 40 swatches:
+    python -m benchmarks.run custom_palettes
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from utils.color_difference import parse_color
+from utils.palette_index import to_ucs
+from utils.palette_store import REPO_ROOT
+
+DB_PATH = os.environ.get("COLOR_AI_CUSTOM_PALETTES_DB", os.path.join(REPO_ROOT, "res", "custom_palettes.sqlite3"))
+
+
+def normalise_swatches(swatches):
+    """Parse hex or [R, G, B] swatches into unique "#RRGGBB" labels, in order."""
+    labels = ["#%02X%02X%02X" % parse_color(s) for s in swatches]
+    return list(dict.fromkeys(labels))
+
+
+def _rgb(labels):
+    """uint8 RGB rows for normalised "#RRGGBB" labels."""
+    return np.frombuffer(bytes.fromhex("".join(h[1:] for h in labels)), dtype=np.uint8).reshape(-1, 3)
+
+
+def _merge(current, keep, add):
+    """Swatch order after an edit: surviving swatches first, then new ones."""
+    keep = set(keep)
+    merged = [h for h in current if h in keep]
+    seen = set(merged)
+    return merged + [h for h in dict.fromkeys(add) if h not in seen]
+
+
+class SwatchSlab:
+    """
+    Growable arrays of swatch rows with a free list. Rows are never moved,
+    so row numbers held by palettes stay valid across inserts and deletes.
+    """
+
+    def __init__(self, capacity=1024):
+        self.ucs = np.empty((capacity, 3))
+        self.rgb = np.empty((capacity, 3), dtype=np.uint8)
+        self.live = np.zeros(capacity, dtype=bool)
+        self._end = 0
+        self._free = []
+
+    def __len__(self):
+        return self._end - len(self._free)
+
+    def _grow(self, needed):
+        capacity = len(self.live)
+        while capacity < needed:
+            capacity *= 2
+        if capacity != len(self.live):
+            for name in ("ucs", "rgb", "live"):
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+
+    def insert(self, rgb, ucs):
+        """Store rows and return their row numbers."""
+        count = len(rgb)
+        reused = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        fresh = count - len(reused)
+        self._grow(self._end + fresh)
+        rows = np.array(reused + list(range(self._end, self._end + fresh)), dtype=np.intp)
+        self._end += fresh
+        self.ucs[rows] = ucs
+        self.rgb[rows] = rgb
+        self.live[rows] = True
+        return rows
+
+    def delete(self, rows):
+        self.live[rows] = False
+        self._free.extend(int(r) for r in rows)
+
+
+class CustomPaletteIndex:
+    """In-memory index over custom palettes, updated incrementally."""
+
+    def __init__(self):
+        self.slab = SwatchSlab()
+        self._rows = {}
+        self._hex = {}
+
+    def __contains__(self, palette_id):
+        return palette_id in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def hex(self, palette_id):
+        return list(self._hex[palette_id])
+
+    def load(self, palettes):
+        """Bulk-insert palettes (id -> labels) with one conversion for all swatches."""
+        palettes = {palette_id: list(dict.fromkeys(labels)) for palette_id, labels in palettes.items()}
+        flat = [h for labels in palettes.values() for h in labels]
+        rgb = _rgb(flat)
+        rows = self.slab.insert(rgb, to_ucs(rgb))
+        start = 0
+        for palette_id, labels in palettes.items():
+            self._rows[palette_id] = rows[start:start + len(labels)]
+            self._hex[palette_id] = labels
+            start += len(labels)
+
+    def add_swatches(self, palette_id, labels):
+        """Add swatches ("#RRGGBB") to a palette, creating it if needed."""
+        current = self._hex.setdefault(palette_id, [])
+        existing = set(current)
+        labels = [h for h in labels if h not in existing]
+        rows = self._rows.get(palette_id, np.empty(0, dtype=np.intp))
+        if labels:
+            rgb = _rgb(labels)
+            rows = np.concatenate([rows, self.slab.insert(rgb, to_ucs(rgb))])
+            current.extend(labels)
+        self._rows[palette_id] = rows
+
+    def remove_swatches(self, palette_id, labels):
+        """Remove swatches from a palette."""
+        drop = set(labels)
+        keep = np.array([h not in drop for h in self._hex[palette_id]], dtype=bool)
+        rows = self._rows[palette_id]
+        self.slab.delete(rows[~keep])
+        self._rows[palette_id] = rows[keep]
+        self._hex[palette_id] = [h for h, k in zip(self._hex[palette_id], keep) if k]
+
+    def set_swatches(self, palette_id, labels):
+        """
+        Make a palette hold exactly labels, in that order, converting only
+        the swatches it did not already have.
+        """
+        current = set(self._hex.get(palette_id, ()))
+        if palette_id in self._rows:
+            self.remove_swatches(palette_id, current - set(labels))
+        self.add_swatches(palette_id, [h for h in labels if h not in current])
+        position = {h: i for i, h in enumerate(self._hex[palette_id])}
+        order = np.array([position[h] for h in dict.fromkeys(labels)], dtype=np.intp)
+        self._rows[palette_id] = self._rows[palette_id][order]
+        self._hex[palette_id] = [self._hex[palette_id][i] for i in order]
+
+    def remove(self, palette_id):
+        """Drop a palette and free its rows."""
+        self.slab.delete(self._rows.pop(palette_id))
+        del self._hex[palette_id]
+
+    def distances(self, palette_id, colors):
+        """(N, swatches) CAM02-UCS distances from colours to a palette."""
+        rows = self._rows[palette_id]
+        ucs = to_ucs(np.asarray(colors).reshape(-1, 3))
+        diff = ucs[:, None, :] - self.slab.ucs[rows][None, :, :]
+        return np.sqrt(np.sum(diff * diff, axis=2))
+
+    def check(self, palette_id, colors, threshold=40):
+        """
+        Per colour: minimum distance to the palette, the nearest swatch and
+        whether the colour is allowed at threshold.
+        """
+        labels = self._hex[palette_id]
+        dists = self.distances(palette_id, colors)
+        if not labels:
+            return [{"delta_e": None, "nearest": None, "allowed": False} for _ in range(len(dists))]
+        nearest = dists.argmin(axis=1)
+        minima = dists[np.arange(len(dists)), nearest]
+        return [
+            {"delta_e": float(d), "nearest": labels[j], "allowed": bool(d < threshold)}
+            for d, j in zip(minima, nearest)
+        ]
+
+    def nearest(self, palette_id, colors, k=5):
+        """Per colour, the k nearest swatches of the palette, nearest first."""
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        labels = self._hex[palette_id]
+        dists = self.distances(palette_id, colors)
+        order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+        return [
+            [{"hex": labels[j], "delta_e": float(dists[i, j])} for j in row]
+            for i, row in enumerate(order)
+        ]
+
+
+def _require_writable(db_path):
+    """Raise ValueError unless db_path can be created or written."""
+    directory = os.path.dirname(db_path) or "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        raise ValueError(
+            f"Cannot create {directory} for the custom palette database ({e.strerror}); "
+            "set COLOR_AI_CUSTOM_PALETTES_DB to a writable path."
+        )
+    target = db_path if os.path.exists(db_path) else directory
+    if not os.access(target, os.W_OK) or not os.access(directory, os.W_OK):
+        raise ValueError(
+            f"Custom palette database {db_path} is not writable; "
+            "set COLOR_AI_CUSTOM_PALETTES_DB to a writable path."
+        )
+
+
+class CustomPalettes:
+    """
+    Custom palette registry: SQLite for persistence, CustomPaletteIndex for
+    queries. Every change is written to the database first and then applied
+    to the index.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        if db_path != ":memory:":
+            _require_writable(db_path)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS palettes ("
+            "id TEXT PRIMARY KEY, name TEXT NOT NULL, swatches TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.RLock()
+        self._names = {}
+        self.index = CustomPaletteIndex()
+        stored = {}
+        for palette_id, name, swatches in self._db.execute("SELECT id, name, swatches FROM palettes"):
+            self._names[palette_id] = name
+            stored[palette_id] = json.loads(swatches)
+        self.index.load(stored)
+
+    def _require(self, palette_id):
+        if palette_id not in self._names:
+            raise ValueError(f"Unknown palette: {palette_id}")
+
+    def _save(self, palette_id, name, labels):
+        self._db.execute(
+            "INSERT OR REPLACE INTO palettes (id, name, swatches, updated_at) VALUES (?, ?, ?, ?)",
+            (palette_id, name, json.dumps(labels), time.time()),
+        )
+        self._db.commit()
+
+    def create(self, name, swatches):
+        """Register a palette; returns its id."""
+        labels = normalise_swatches(swatches)
+        with self._lock:
+            palette_id = uuid.uuid4().hex
+            self._save(palette_id, name, labels)
+            self._names[palette_id] = name
+            self.index.add_swatches(palette_id, labels)
+        return palette_id
+
+    def update(self, palette_id, name=None, swatches=None, add=(), remove=()):
+        """
+        Rename a palette and/or change its swatches: replace them all
+        (swatches), or add and remove individual ones.
+        """
+        with self._lock:
+            self._require(palette_id)
+            name = self._names[palette_id] if name is None else name
+            labels = self.index.hex(palette_id)
+            if swatches is not None:
+                wanted = normalise_swatches(swatches)
+                labels = _merge(labels, wanted, wanted)
+            drop = set(normalise_swatches(remove))
+            labels = _merge(labels, [h for h in labels if h not in drop], normalise_swatches(add))
+
+            self._save(palette_id, name, labels)
+            self._names[palette_id] = name
+            self.index.set_swatches(palette_id, labels)
+
+    def delete(self, palette_id):
+        with self._lock:
+            self._require(palette_id)
+            self._db.execute("DELETE FROM palettes WHERE id = ?", (palette_id,))
+            self._db.commit()
+            del self._names[palette_id]
+            self.index.remove(palette_id)
+
+    def get(self, palette_id):
+        with self._lock:
+            self._require(palette_id)
+            return {"id": palette_id, "name": self._names[palette_id], "swatches": self.index.hex(palette_id)}
+
+    def list(self):
+        with self._lock:
+            return [{"id": palette_id, "name": name} for palette_id, name in self._names.items()]
+
+    def check(self, palette_id, colors, threshold=40):
+        with self._lock:
+            self._require(palette_id)
+            return self.index.check(palette_id, colors, threshold)
+
+    def nearest(self, palette_id, colors, k=5):
+        with self._lock:
+            self._require(palette_id)
+            return self.index.nearest(palette_id, colors, k)
+
+
+_custom_palettes = None
+_custom_palettes_lock = threading.Lock()
+
+
+def get_custom_palettes():
+    """Return the process-wide CustomPalettes, opened from COLOR_AI_CUSTOM_PALETTES_DB."""
+    global _custom_palettes
+    if _custom_palettes is None:
+        with _custom_palettes_lock:
+            if _custom_palettes is None:
+                _custom_palettes = CustomPalettes()
+    return _custom_palettes
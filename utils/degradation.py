@@ -0,0 +1,243 @@
+"""
+Load-shedding controller for season classification.
+
+When the inference queue backs up it is better to answer with a slightly less
+precise season quickly than to time out. The controller watches queue depth
+and request latency and steps extract_features down through cheaper tiers,
+then steps back up once load has stayed low for a while (hysteresis, so it
+does not flap between tiers). Timed-out requests and requests turned away at
+admission count as load too, and an instance that goes idle while degraded
+recovers without waiting for new traffic.
+
+Configuration (environment variables):
+    COLOR_AI_LATENCY_SLO_MS   p95 latency target (default: 2000)
+    COLOR_AI_QUEUE_HIGH       in-flight requests that trigger a step down
+                              (default: half of COLOR_AI_MAX_IN_FLIGHT)
+    COLOR_AI_QUEUE_LOW        in-flight requests considered idle (default: 1)
+    COLOR_AI_DEGRADE_COOLDOWN_S
+                              seconds of low load before stepping up (default: 10)
+"""
+
+import contextlib
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from utils.executor import DeadlineExceeded, get_executor
+from utils.metrics import counter, gauge, register_collector
+
+tier_gauge = gauge(
+    "color_ai_degradation_tier",
+    "Index of the inference tier currently in use (0 is full quality).",
+)
+tier_seconds = counter(
+    "color_ai_degradation_tier_seconds_total",
+    "Seconds spent in each inference tier.",
+    ("tier",),
+)
+tier_transitions = counter(
+    "color_ai_degradation_transitions_total",
+    "Inference tier changes.",
+    ("direction",),
+)
+
+
+class InferenceTier(namedtuple("InferenceTier", "name input_size aux masked_pixels_only reduced_precision")):
+    """One extract_features configuration, from most to least expensive."""
+
+    __slots__ = ()
+
+    def parse_options(self):
+        """Keyword arguments for utils.getData.parse_face."""
+        return {
+            "input_size": self.input_size,
+            "aux": self.aux,
+            "reduced_precision": self.reduced_precision,
+        }
+
+    def feature_options(self):
+        """Keyword arguments for utils.getData.features_from_parsing."""
+        return {"masked_pixels_only": self.masked_pixels_only}
+
+
+TIERS = (
+    InferenceTier("full", 512, aux=True, masked_pixels_only=False, reduced_precision=False),
+    # Skips BiSeNet's training-only heads and the full-image undertone pass.
+    InferenceTier("lean", 512, aux=False, masked_pixels_only=True, reduced_precision=False),
+    InferenceTier("reduced", 384, aux=False, masked_pixels_only=True, reduced_precision=False),
+    InferenceTier("minimal", 256, aux=False, masked_pixels_only=True, reduced_precision=True),
+)
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, "") else float(value)
+
+
+class DegradationController:
+    """
+    Picks the inference tier from recent queue depth and latency.
+
+    Steps down one tier when the queue depth reaches queue_high or the p95
+    latency over the last window requests exceeds latency_slo, at most once per
+    step_interval seconds. Steps up one tier once the queue has been at or
+    below queue_low and p95 latency under recover_ratio * latency_slo for
+    cooldown seconds, or once no request has finished for cooldown seconds
+    while the queue is low.
+
+    queue_depth is a callable returning the current queue depth, used to
+    decide recovery between requests (default: the executor's in-flight
+    count).
+    """
+
+    def __init__(self, latency_slo, queue_high, queue_low=1, tiers=TIERS,
+                 window=50, cooldown=10.0, step_interval=1.0, recover_ratio=0.6, queue_depth=None):
+        self.latency_slo = latency_slo
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.tiers = tiers
+        self.cooldown = cooldown
+        self.step_interval = step_interval
+        self.recover_ratio = recover_ratio
+        self._queue_depth = queue_depth or (lambda: get_executor().in_flight)
+
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._level = 0
+        self._changed_at = time.monotonic()
+        self._calm_since = None
+        self._observed_at = self._changed_at
+        self._accounted_at = self._changed_at
+        tier_gauge.set(0)
+
+    def current(self):
+        """The tier new requests should use."""
+        with self._lock:
+            self._recover_idle(time.monotonic())
+            return self.tiers[self._level]
+
+    def _p95(self):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def _account(self, now):
+        tier_seconds.inc(now - self._accounted_at, tier=self.tiers[self._level].name)
+        self._accounted_at = now
+
+    def _move(self, step, now):
+        self._account(now)
+        self._level += step
+        self._changed_at = now
+        self._calm_since = None
+        tier_gauge.set(self._level)
+        tier_transitions.inc(direction="down" if step > 0 else "up")
+
+    def _step(self, now, overloaded, calm):
+        """Apply one load observation. Caller holds the lock."""
+        self._observed_at = now
+        if overloaded:
+            self._calm_since = None
+            if self._level < len(self.tiers) - 1 and now - self._changed_at >= self.step_interval:
+                self._move(1, now)
+        elif calm and self._level > 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.cooldown:
+                self._move(-1, now)
+                # The window still holds latencies from the degraded period.
+                self._latencies.clear()
+        else:
+            self._calm_since = None
+
+    def _recover_idle(self, now):
+        """
+        Step up once the load has been low for cooldown seconds without a
+        request finishing to notice it. Caller holds the lock.
+        """
+        if self._level == 0:
+            return
+        if self._calm_since is not None:
+            quiet_since = self._calm_since
+        else:
+            quiet_since = max(self._observed_at, self._changed_at)
+        if now - quiet_since < self.cooldown or self._queue_depth() > self.queue_low:
+            return
+        self._move(-1, now)
+        self._latencies.clear()
+
+    def observe(self, latency, queue_depth):
+        """
+        Record one finished request (latency in seconds) and the queue depth
+        seen when it finished, stepping tiers if needed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._latencies.append(latency)
+            p95 = self._p95()
+            self._account(now)
+            overloaded = queue_depth >= self.queue_high or p95 > self.latency_slo
+            calm = queue_depth <= self.queue_low and p95 < self.recover_ratio * self.latency_slo
+            self._step(now, overloaded, calm)
+
+    def observe_rejection(self):
+        """Record a request turned away because the executor was saturated."""
+        now = time.monotonic()
+        with self._lock:
+            self._account(now)
+            self._step(now, overloaded=True, calm=False)
+
+    @contextlib.asynccontextmanager
+    async def observing(self, deadline=None):
+        """
+        Observe the request run in the body however it ends: completed,
+        failed, cancelled or timed out. A request that ran out of time counts
+        at its full deadline budget, so timeouts push the tier down instead of
+        going unnoticed.
+        """
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            yield
+        except DeadlineExceeded:
+            timed_out = True
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            if timed_out and deadline is not None and deadline.timeout is not None:
+                latency = max(latency, deadline.timeout)
+            self.observe(latency, self._queue_depth())
+
+    def collect(self):
+        """Bring tier residency up to date, so idle periods are counted too."""
+        with self._lock:
+            now = time.monotonic()
+            self._recover_idle(now)
+            self._account(now)
+
+    def stats(self):
+        with self._lock:
+            return {"tier": self.tiers[self._level].name, "level": self._level, "p95_latency": self._p95()}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_degradation_controller():
+    """Return the process-wide DegradationController, configured from the environment."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                max_in_flight = get_executor().max_in_flight
+                _controller = DegradationController(
+                    latency_slo=_env_float("COLOR_AI_LATENCY_SLO_MS", 2000) / 1000,
+                    queue_high=_env_float("COLOR_AI_QUEUE_HIGH", max(1, max_in_flight // 2)),
+                    queue_low=_env_float("COLOR_AI_QUEUE_LOW", 1),
+                    cooldown=_env_float("COLOR_AI_DEGRADE_COOLDOWN_S", 10),
+                )
+                register_collector(_controller.collect)
+    return _controller
@@ -0,0 +1,166 @@
+"""
+Colour-difference metrics.
+
+Each metric is a colour space plus a pairwise kernel: ``convert`` maps RGB
+(0-255, shape (..., 3)) into the space and ``pairwise(a, b)`` takes (N, 3)
+and (M, 3) arrays of coordinates and returns the (N, M) distance matrix,
+fully vectorised.
+
+    cam02ucs    Euclidean distance in CAM02-UCS. This is what
+                color_difference_cie2000 has always computed, on the
+                repo's 0-255-as-sRGB1 scale, and it stays the default.
+    cie76       Euclidean distance in CIELab.
+    cie94       CIE94 (graphic arts weights); the first argument is the
+                reference colour.
+    ciede2000   CIEDE2000 (Sharma, Wu and Dalal 2005).
+
+The CIELab metrics use the standard sRGB scale (rgb / 255, D65), so their
+values are the usual delta E units; a threshold tuned for one metric does
+not carry over to another.
+
+Reference values are checked in tests/test_delta_e.py; throughput with
+python -m benchmarks.run delta_e.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from utils.cam02ucs import D65_WHITE, SRGB_TO_XYZ100, linearise, srgb_to_cam02ucs
+
+_CHUNK = 1 << 20  # pairs per block in the pairwise kernels
+
+_GAMMA_LUT = linearise(np.arange(256) / 255)
+
+
+def _f(t):
+    delta = 6 / 29
+    return np.where(t > delta ** 3, np.cbrt(t), t / (3 * delta ** 2) + 4 / 29)
+
+
+def srgb_to_lab(rgb):
+    """Convert sRGB colours (0-255, shape (..., 3)) to CIELab under D65."""
+    rgb = np.asarray(rgb)
+    if rgb.shape[-1:] != (3,):
+        raise ValueError("rgb shape must be (..., 3)")
+    if rgb.dtype.kind in "ui" and rgb.size and rgb.min() >= 0 and rgb.max() <= 255:
+        linear = _GAMMA_LUT[rgb]
+    else:
+        linear = linearise(rgb.astype(np.float64) / 255)
+    f = _f((linear @ SRGB_TO_XYZ100.T) / D65_WHITE)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def _blocks(a, b):
+    """Split a into row blocks so each block x b stays around _CHUNK pairs."""
+    rows = max(1, _CHUNK // max(1, len(b)))
+    for start in range(0, len(a), rows):
+        yield start, a[start:start + rows]
+
+
+def _pairwise(kernel):
+    """
+    Wrap an elementwise kernel over broadcast (N, 1) x (1, M) coordinates.
+    Keyword arguments (the CIE94 and CIEDE2000 weights) go to the kernel.
+    """
+    def pairwise(a, b, **kwargs):
+        a = np.asarray(a, dtype=np.float64).reshape(-1, 3)
+        b = np.asarray(b, dtype=np.float64).reshape(-1, 3)
+        out = np.empty((len(a), len(b)))
+        for start, block in _blocks(a, b):
+            out[start:start + len(block)] = kernel(block[:, None, :], b[None, :, :], **kwargs)
+        return out
+    pairwise.__doc__ = kernel.__doc__
+    return pairwise
+
+
+@_pairwise
+def euclidean(a, b):
+    """Euclidean distance (CIE76 in CIELab)."""
+    d0 = a[..., 0] - b[..., 0]
+    d1 = a[..., 1] - b[..., 1]
+    d2 = a[..., 2] - b[..., 2]
+    return np.sqrt(d0 * d0 + d1 * d1 + d2 * d2)
+
+
+@_pairwise
+def cie94(a, b, k_l=1.0, k1=0.045, k2=0.015):
+    """CIE94 with a as the reference colour."""
+    L1, a1, b1 = a[..., 0], a[..., 1], a[..., 2]
+    L2, a2, b2 = b[..., 0], b[..., 1], b[..., 2]
+    c1 = np.hypot(a1, b1)
+    dL = L1 - L2
+    dC = c1 - np.hypot(a2, b2)
+    dH2 = np.maximum((a1 - a2) ** 2 + (b1 - b2) ** 2 - dC ** 2, 0)
+    return np.sqrt((dL / k_l) ** 2 + (dC / (1 + k1 * c1)) ** 2 + dH2 / (1 + k2 * c1) ** 2)
+
+
+@_pairwise
+def ciede2000(lab1, lab2, k_l=1.0, k_c=1.0, k_h=1.0):
+    """CIEDE2000, following the implementation notes of Sharma et al. (2005)."""
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    c_bar7 = c_bar ** 7
+    g = 0.5 * (1 - np.sqrt(c_bar7 / (c_bar7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    dLp = L2 - L1
+    dCp = c2p - c1p
+    chroma_zero = (c1p * c2p) == 0
+    dh = h2p - h1p
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh = np.where(chroma_zero, 0, dh)
+    dHp = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dh) / 2)
+
+    Lp_bar = (L1 + L2) / 2
+    Cp_bar = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    hp_bar = np.where(
+        chroma_zero, h_sum,
+        np.where(np.abs(h1p - h2p) <= 180, h_sum / 2,
+                 np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2)),
+    )
+
+    t = (1 - 0.17 * np.cos(np.radians(hp_bar - 30))
+         + 0.24 * np.cos(np.radians(2 * hp_bar))
+         + 0.32 * np.cos(np.radians(3 * hp_bar + 6))
+         - 0.20 * np.cos(np.radians(4 * hp_bar - 63)))
+    d_theta = 30 * np.exp(-(((hp_bar - 275) / 25) ** 2))
+    Cp_bar7 = Cp_bar ** 7
+    r_c = 2 * np.sqrt(Cp_bar7 / (Cp_bar7 + 25.0 ** 7))
+    s_l = 1 + 0.015 * (Lp_bar - 50) ** 2 / np.sqrt(20 + (Lp_bar - 50) ** 2)
+    s_c = 1 + 0.045 * Cp_bar
+    s_h = 1 + 0.015 * Cp_bar * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    dL = dLp / (k_l * s_l)
+    dC = dCp / (k_c * s_c)
+    dH = dHp / (k_h * s_h)
+    return np.sqrt(dL ** 2 + dC ** 2 + dH ** 2 + r_t * dC * dH)
+
+
+Metric = namedtuple("Metric", "name space convert pairwise")
+
+METRICS = {
+    metric.name: metric
+    for metric in (
+        Metric("cam02ucs", "cam02ucs", srgb_to_cam02ucs, euclidean),
+        Metric("cie76", "lab", srgb_to_lab, euclidean),
+        Metric("cie94", "lab", srgb_to_lab, cie94),
+        Metric("ciede2000", "lab", srgb_to_lab, ciede2000),
+    )
+}
+DEFAULT_METRIC = "cam02ucs"
+
+
+def get_metric(name):
+    """Look up a metric by name. Raises ValueError for unknown names."""
+    try:
+        return METRICS[name]
+    except KeyError:
+        raise ValueError(f"Unknown colour metric {name!r}; expected one of {', '.join(METRICS)}")
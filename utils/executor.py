@@ -0,0 +1,400 @@
+"""
+Bounded executor for the CPU-bound stages of the request pipeline.
+
+The API handlers are ``async def`` but image decoding, BiSeNet inference,
+k-means and the palette checks are all synchronous. Running them directly on
+the event loop means one slow image stalls every other connection, health
+checks included. Requests are instead admitted here (up to a fixed in-flight
+limit) and each of their stages is run on a worker pool:
+
+- the thread pool is for work that releases the GIL (torch, cv2, PIL, numpy)
+- the process pool is for pure-Python stages
+
+When the limit is reached new requests are rejected straight away so the
+client gets a fast 429 with a Retry-After hint instead of a slow timeout.
+
+Each request may carry a Deadline. It is checked before every stage is
+submitted and again when a worker picks the stage up, so requests that
+expired in the queue, or whose client disconnected, never reach the model.
+
+Configuration (environment variables):
+    COLOR_AI_THREAD_WORKERS   threads for torch/cv2 stages (default: CPU count)
+    COLOR_AI_PROCESS_WORKERS  processes for pure-Python stages (default: 0,
+                              which runs those stages on the thread pool)
+    COLOR_AI_MAX_IN_FLIGHT    requests admitted at once (default: 4x threads)
+    COLOR_AI_DEFAULT_DEADLINE_MS
+                              deadline for requests that do not send one
+                              (default: 30000, 0 disables)
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.metrics import counter, gauge, histogram, register_collector
+
+requests_dropped = counter(
+    "color_ai_requests_dropped_total",
+    "Requests dropped before finishing because they expired or the client left.",
+    ("reason", "stage"),
+)
+wasted_work_avoided = counter(
+    "color_ai_wasted_work_avoided_seconds_total",
+    "Estimated compute seconds skipped by dropping expired or cancelled requests.",
+    ("reason",),
+)
+requests_total = counter(
+    "color_ai_requests_total",
+    "Requests by outcome (completed, rejected, dropped or error).",
+    ("outcome",),
+)
+queue_wait_seconds = histogram(
+    "color_ai_request_queue_wait_seconds",
+    "Time a request's stages spent waiting for a worker.",
+)
+compute_seconds = histogram(
+    "color_ai_request_compute_seconds",
+    "Time a request's stages spent running on a worker.",
+)
+executor_load = gauge(
+    "color_ai_executor_load",
+    "Executor occupancy: admitted requests, queued and running stages.",
+    ("state",),
+)
+
+
+class ExecutorRejected(Exception):
+    """Base class for requests the executor refuses to run."""
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExecutorSaturated(ExecutorRejected):
+    """The in-flight limit is reached; the client should back off and retry."""
+
+    status_code = 429
+
+
+class ExecutorUnavailable(ExecutorRejected):
+    """The executor is shut down and not accepting work."""
+
+    status_code = 503
+
+
+class RequestDropped(ExecutorRejected):
+    """Base class for admitted requests abandoned before they finished."""
+
+    reason = None
+
+
+class DeadlineExceeded(RequestDropped):
+    """The request's deadline passed before its next stage could start."""
+
+    status_code = 504
+    reason = "expired"
+
+
+class RequestCancelled(RequestDropped):
+    """The client disconnected; nobody is waiting for the result."""
+
+    status_code = 499
+    reason = "disconnected"
+
+
+class Deadline:
+    """
+    Point in time after which a request's result is no longer useful, plus a
+    cancellation flag for clients that go away early.
+
+    Uses time.monotonic(), which is system-wide on Linux, so the expiry can be
+    checked inside process-pool workers as well.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+        self.cancelled = False
+
+    def remaining(self):
+        """Seconds left, or None if the deadline is unbounded."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self, stage):
+        """Raise RequestCancelled or DeadlineExceeded if stage should not run."""
+        if self.cancelled:
+            raise RequestCancelled(f"Client disconnected before {stage}.")
+        _check_expiry(self.expires_at, stage)
+
+
+def _check_expiry(expires_at, stage):
+    if expires_at is not None and time.monotonic() >= expires_at:
+        raise DeadlineExceeded(f"Request deadline passed before {stage}.")
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, "") else int(value)
+
+
+def _timed_call(fn, args, kwargs, expires_at=None, stage=None):
+    """
+    Run fn and return (result, compute seconds, worker id). Module level so it
+    can be pickled for the process pool.
+    """
+    _check_expiry(expires_at, stage)
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    worker = f"{os.getpid()}/{threading.current_thread().name}"
+    return result, time.perf_counter() - start, worker
+
+
+class Ticket:
+    """
+    One admitted request. Runs the request's stages on the executor and
+    accumulates how long they waited for a worker versus how long they ran.
+    """
+
+    def __init__(self, executor, deadline=None, plan=()):
+        self._executor = executor
+        self.deadline = deadline
+        self.plan = tuple(plan)
+        self.queue_wait = 0.0
+        self.compute = 0.0
+        self.stages = {}
+        self.workers = []
+
+    async def run(self, fn, *args, pool="thread", stage=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the given pool ("thread" or "process") and
+        return its result. Timings are recorded under stage (default: fn name).
+        """
+        return await self._executor._submit(self, fn, args, kwargs, pool, stage or fn.__name__)
+
+    def timings(self):
+        """Queue-wait and compute time for this request, in milliseconds."""
+        return {
+            "queue_wait_ms": round(self.queue_wait * 1000, 2),
+            "compute_ms": round(self.compute * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+        }
+
+
+class PipelineExecutor:
+    """
+    Thread pool plus optional process pool with a bounded number of admitted
+    requests.
+    """
+
+    def __init__(self, thread_workers=None, process_workers=0, max_in_flight=None):
+        self.thread_workers = thread_workers or os.cpu_count() or 1
+        self.process_workers = process_workers
+        self.max_in_flight = max_in_flight or 4 * self.thread_workers
+
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.thread_workers, thread_name_prefix="color-ai"
+        )
+        self._processes = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.in_flight = 0  # admitted requests
+        self.queued = 0  # submitted stages not yet picked up by a worker
+        self.running = 0  # stages currently executing
+        self.rejected = 0
+        self._avg_compute = 0.0  # moving average of per-request compute seconds
+        self._avg_stage = {}  # moving average of compute seconds per stage name
+
+    def _pool(self, pool):
+        if pool == "thread" or (pool == "process" and self.process_workers <= 0):
+            return self._threads
+        if pool != "process":
+            raise ValueError(f"Unknown pool: {pool}")
+        if self._processes is None:
+            with self._lock:
+                if self._processes is None:
+                    # spawn rather than fork: the parent already holds torch's threads
+                    self._processes = ProcessPoolExecutor(
+                        max_workers=self.process_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._processes
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, estimated from recent compute times."""
+        backlog = self._avg_compute * self.in_flight / self.thread_workers
+        return max(1, min(30, math.ceil(backlog)))
+
+    @contextlib.asynccontextmanager
+    async def admit(self, deadline=None, plan=()):
+        """
+        Admit one request, yielding its Ticket. Raises ExecutorSaturated when
+        the in-flight limit is reached and ExecutorUnavailable after shutdown.
+
+        plan lists the stage names the request will run, in order; it is used
+        to estimate how much work a dropped request would have cost.
+        """
+        with self._lock:
+            if self._closed:
+                raise ExecutorUnavailable("Server is shutting down.")
+            if self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                requests_total.inc(outcome="rejected")
+                raise ExecutorSaturated("Server is busy, retry later.", self.retry_after())
+            self.in_flight += 1
+
+        ticket = Ticket(self, deadline, plan)
+        outcome = "error"
+        try:
+            yield ticket
+            outcome = "completed"
+        except RequestDropped:
+            outcome = "dropped"
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._avg_compute = 0.8 * self._avg_compute + 0.2 * ticket.compute
+            requests_total.inc(outcome=outcome)
+            queue_wait_seconds.observe(ticket.queue_wait)
+            compute_seconds.observe(ticket.compute)
+
+    def _dequeue(self, pending):
+        """Take a submitted stage off the queued count, once. Caller holds the lock."""
+        if pending:
+            pending.clear()
+            self.queued -= 1
+
+    def _run_on_thread(self, fn, args, kwargs, deadline, stage, pending):
+        with self._lock:
+            self._dequeue(pending)
+            self.running += 1
+        try:
+            if deadline is not None:
+                deadline.check(stage)
+            return _timed_call(fn, args, kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def _submit(self, ticket, fn, args, kwargs, pool, stage):
+        loop = asyncio.get_running_loop()
+        executor = self._pool(pool)
+        deadline = ticket.deadline
+        submitted = time.perf_counter()
+
+        try:
+            if deadline is not None:
+                deadline.check(stage)
+
+            # Holds a marker while the stage counts as queued; whoever takes it
+            # off the count first (the worker thread, or the cleanup below if
+            # submission fails or the job is cancelled before it starts) clears it.
+            pending = [True]
+            with self._lock:
+                self.queued += 1
+            try:
+                if executor is self._threads:
+                    # Run in a copy of the caller's context so spans reach its trace.
+                    context = contextvars.copy_context()
+                    future = loop.run_in_executor(
+                        executor, context.run, self._run_on_thread, fn, args, kwargs, deadline, stage, pending
+                    )
+                else:
+                    expires_at = None if deadline is None else deadline.expires_at
+                    future = loop.run_in_executor(
+                        executor, _timed_call, fn, args, kwargs, expires_at, stage
+                    )
+                result, compute, worker = await future
+            finally:
+                # Process workers cannot report when they pick a job up, so their
+                # stages count as queued until they complete.
+                with self._lock:
+                    self._dequeue(pending)
+        except RequestDropped as e:
+            self._record_dropped(ticket, stage, e.reason)
+            raise
+
+        elapsed = time.perf_counter() - submitted
+        ticket.compute += compute
+        ticket.queue_wait += max(0.0, elapsed - compute)
+        ticket.stages[stage] = ticket.stages.get(stage, 0.0) + compute
+        if worker not in ticket.workers:
+            ticket.workers.append(worker)
+        with self._lock:
+            previous = self._avg_stage.get(stage, compute)
+            self._avg_stage[stage] = 0.8 * previous + 0.2 * compute
+        return result
+
+    def _record_dropped(self, ticket, stage, reason):
+        requests_dropped.inc(reason=reason, stage=stage)
+        # Everything from this stage to the end of the plan was skipped.
+        remaining = ticket.plan[ticket.plan.index(stage):] if stage in ticket.plan else (stage,)
+        with self._lock:
+            avoided = sum(self._avg_stage.get(name, 0.0) for name in remaining)
+        wasted_work_avoided.inc(avoided, reason=reason)
+
+    def stats(self):
+        """Snapshot of the executor's load, for health checks."""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "running": self.running,
+            "rejected": self.rejected,
+            "thread_workers": self.thread_workers,
+            "process_workers": self.process_workers,
+        }
+
+    def collect(self):
+        """Publish current occupancy to the executor_load gauge."""
+        executor_load.set(self.in_flight, state="in_flight")
+        executor_load.set(self.queued, state="queued")
+        executor_load.set(self.running, state="running")
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        self._threads.shutdown(wait=False)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide PipelineExecutor, creating it from the environment."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                threads = _env_int("COLOR_AI_THREAD_WORKERS", os.cpu_count() or 1)
+                _executor = PipelineExecutor(
+                    thread_workers=threads,
+                    process_workers=_env_int("COLOR_AI_PROCESS_WORKERS", 0),
+                    max_in_flight=_env_int("COLOR_AI_MAX_IN_FLIGHT", 4 * threads),
+                )
+                register_collector(_executor.collect)
+    return _executor
+
+
+def default_deadline():
+    """Deadline for requests that did not send one, from COLOR_AI_DEFAULT_DEADLINE_MS."""
+    timeout_ms = _env_int("COLOR_AI_DEFAULT_DEADLINE_MS", 30000)
+    return Deadline(timeout_ms / 1000 if timeout_ms > 0 else None)
@@ -0,0 +1,187 @@
+"""
+Flight recorder for slow requests.
+
+Every request slower than a threshold is kept in an in-memory ring buffer
+with enough detail to reproduce it offline: stage timings, what the input
+looked like (format, dimensions, byte size, SHA-256), which engines or tiers
+handled it and which worker ran it. Entries can also be appended to a local
+JSONL file, and the raw uploads saved by hash so the exact inputs can be
+benchmarked later.
+
+Hashing and describing the upload and writing files happen on one
+background writer thread, so recording a slow request never blocks the
+event loop; entries appear in the buffer once the writer has stored them.
+
+Configuration (environment variables):
+    COLOR_AI_SLOW_REQUEST_MS          latency threshold (default: 1000)
+    COLOR_AI_FLIGHT_RECORDER_SIZE     entries kept in memory (default: 200)
+    COLOR_AI_FLIGHT_RECORDER_PATH     JSONL file to append entries to (default: off)
+    COLOR_AI_FLIGHT_RECORDER_INPUTS   directory to save slow uploads in,
+                                      as <sha256>.bin (default: off)
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from utils.metrics import counter, start_trace
+
+slow_requests = counter(
+    "color_ai_slow_requests_total",
+    "Requests slower than the flight recorder threshold.",
+    ("endpoint",),
+)
+
+
+def describe_input(contents):
+    """
+    Size, format and dimensions of an uploaded image, read from its header
+    only (the pixels are not decoded).
+    """
+    info = {"bytes": len(contents), "sha256": hashlib.sha256(contents).hexdigest()}
+    try:
+        with Image.open(BytesIO(contents)) as image:
+            info.update(format=image.format, width=image.width, height=image.height, mode=image.mode)
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+
+class RequestRecord:
+    """What one request did, filled in by the handler as it goes."""
+
+    def __init__(self, endpoint, contents):
+        self.endpoint = endpoint
+        self.contents = contents
+        self.engines = {}
+        self.ticket = None
+        self.outcome = "completed"
+        self.spans = start_trace()
+        self.started = time.perf_counter()
+        self.latency = None
+
+    def to_dict(self):
+        """The entry without "input", which the writer thread fills in."""
+        entry = {
+            "time": time.time(),
+            "endpoint": self.endpoint,
+            "outcome": self.outcome,
+            "latency_ms": round(self.latency * 1000, 2),
+            "spans_ms": {name: round(seconds * 1000, 2) for name, seconds in self.spans.items()},
+            "engines": self.engines,
+            "input": None,
+        }
+        if self.ticket is not None:
+            entry.update(self.ticket.timings())
+            entry["workers"] = self.ticket.workers
+        return entry
+
+
+class FlightRecorder:
+    """Ring buffer of the most recent slow requests."""
+
+    def __init__(self, threshold=1.0, capacity=200, dump_path=None, inputs_dir=None):
+        self.threshold = threshold
+        self.dump_path = dump_path
+        self.inputs_dir = inputs_dir
+        self.capacity = capacity
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        # One thread, so JSONL lines are appended in request order.
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="flight-recorder")
+        self._pending = 0
+
+    def record(self, record):
+        """
+        Keep the request if it was slow. Only the timings are copied here;
+        the upload is described and stored on the writer thread. Returns a
+        Future for the stored entry, or None for a fast request.
+        """
+        if record.latency < self.threshold:
+            return None
+        entry = record.to_dict()
+        slow_requests.inc(endpoint=record.endpoint)
+        contents = record.contents
+        with self._lock:
+            # Under a flood of slow requests, keep the entries but stop
+            # queueing uploads rather than holding them all in memory.
+            if self._pending >= self.capacity and contents is not None:
+                entry["input"] = {"bytes": len(contents), "dropped": True}
+                contents = None
+            self._pending += 1
+        return self._writer.submit(self._store, entry, contents)
+
+    def _store(self, entry, contents):
+        try:
+            if contents is not None:
+                entry["input"] = describe_input(contents)
+            with self._lock:
+                self._entries.append(entry)
+                if self.dump_path:
+                    with open(self.dump_path, "a") as f:
+                        f.write(json.dumps(entry) + "\n")
+            if self.inputs_dir and contents is not None:
+                os.makedirs(self.inputs_dir, exist_ok=True)
+                path = os.path.join(self.inputs_dir, entry["input"]["sha256"] + ".bin")
+                if not os.path.exists(path):
+                    with open(path, "wb") as f:
+                        f.write(contents)
+            return entry
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def flush(self):
+        """Wait until every entry recorded so far has been stored."""
+        self._writer.submit(lambda: None).result()
+
+    def entries(self, limit=None):
+        """Recorded entries, newest first."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries if limit is None else entries[:limit]
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_flight_recorder():
+    """Return the process-wide FlightRecorder, configured from the environment."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = FlightRecorder(
+                    threshold=float(os.environ.get("COLOR_AI_SLOW_REQUEST_MS", 1000)) / 1000,
+                    capacity=int(os.environ.get("COLOR_AI_FLIGHT_RECORDER_SIZE", 200)),
+                    dump_path=os.environ.get("COLOR_AI_FLIGHT_RECORDER_PATH") or None,
+                    inputs_dir=os.environ.get("COLOR_AI_FLIGHT_RECORDER_INPUTS") or None,
+                )
+    return _recorder
+
+
+@contextlib.contextmanager
+def track_request(endpoint, contents=None):
+    """
+    Track one request for the flight recorder. Yields the RequestRecord so the
+    handler can attach its ticket and the engines it chose.
+    """
+    record = RequestRecord(endpoint, contents)
+    try:
+        yield record
+    except Exception as e:
+        record.outcome = type(e).__name__
+        raise
+    finally:
+        record.latency = time.perf_counter() - record.started
+        get_flight_recorder().record(record)
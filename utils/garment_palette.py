@@ -0,0 +1,316 @@
+"""
+Garment colours checked against a season's palette.
+
+The k-means path clusters the garment from random centres and then checks
+one centre, the one nearest the median colour, against the palette.
+palette_clusters() works the other way round. It clusters the garment's
+colour histogram in CAM02-UCS, starting from the target season's own
+swatches, and reports which share of the garment's pixels sits near an
+allowed swatch:
+
+- The foreground's colours are reduced to a quantised histogram
+  (utils.color_histogram) and converted to CAM02-UCS once per occupied bin.
+- Every bin is assigned to its nearest swatch. The pixel-weighted share of
+  bins within threshold is the allowed fraction, the same test
+  color_is_allowed applies to a single colour.
+- Seeded with the swatches, weighted k-means converges in a few iterations
+  to the garment's actual colours. Clusters are grouped by the swatch they
+  settle nearest to and reported with their pixel share, mean RGB colour
+  and distance to that swatch.
+
+palette_coverage() goes down to the pixel. Every foreground pixel is mapped
+to its nearest swatch and marked allowed or not, for a coverage percentage
+and an optional mask or overlay PNG. The work is done per distinct colour.
+A photo has a few tens of thousands of distinct colours against millions of
+pixels, so each distinct colour is converted and matched once into a lookup
+table indexed by the packed 24-bit colour. The per-pixel maps are then one
+table lookup, and the result is exact, with no quantisation. The 16 MB
+tables are kept per (season, threshold) for the current palettes, up to
+COVERAGE_CACHE_SIZE of them, and filled in as new colours arrive, so later
+requests only match the colours no earlier request has seen.
+
+    python -m benchmarks.run garment_palette   # compare with the k-means verdict
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from utils.color_difference import get_palette_index
+from utils.color_histogram import DEFAULT_BITS, color_histogram, weighted_kmeans
+from utils.identify_clothing_color import foreground_mask
+from utils.metrics import record_cache
+from utils.palette_index import to_ucs
+
+DEFAULT_MIN_FRACTION = 0.5
+COVERAGE_CACHE_SIZE = 4
+PNG_KINDS = ("mask", "overlay")
+PNG_MAX_SIDE = 768
+
+# Lookup-table entries: nearest swatch in the low 7 bits, allowed flag in
+# the top bit; the two values no swatch can produce mark colours not matched
+# yet. Below _UNIQUE_MAX new pixels, their distinct colours are found by
+# sorting; above it, by marking them in the table and scanning it.
+_ALLOWED_BIT = 0x80
+_PENDING, _UNMATCHED = 0xFE, 0xFF
+_MAX_SWATCHES = 0x7E
+_UNIQUE_MAX = 1 << 16
+
+# Mask PNG values for background, not-allowed and allowed pixels, and the
+# overlay's per-state image weight (out of 256) and BGR tint, folded into a
+# (channel, state * 256 + value) blend table.
+MASK_VALUES = np.array([0, 128, 255], dtype=np.uint8)
+_OVERLAY_WEIGHT = np.array([77, 128, 128])
+_OVERLAY_TINT = np.array([[0, 0, 0], [30, 30, 230], [80, 200, 0]])
+_OVERLAY_BLEND = (
+    (np.arange(256)[None, None, :] * _OVERLAY_WEIGHT[None, :, None]
+     + _OVERLAY_TINT.T[:, :, None] * (256 - _OVERLAY_WEIGHT)[None, :, None]) >> 8
+).astype(np.uint8).reshape(3, -1)
+_STATE = np.ones(256, dtype=np.uint8)
+_STATE[_ALLOWED_BIT:] = 2
+_STATE[_UNMATCHED] = 0
+
+
+def _nearest_swatch(ucs, swatches):
+    """Index of and distance to the nearest swatch for every row of ucs."""
+    diff = ucs[:, None, :] - swatches[None, :, :]
+    dists = np.sqrt(np.sum(diff * diff, axis=2))
+    nearest = dists.argmin(axis=1)
+    return nearest, dists[np.arange(len(ucs)), nearest]
+
+
+def palette_clusters(img_rgb, season, threshold=40, mask=None, min_fraction=DEFAULT_MIN_FRACTION,
+                     max_iter=5, bits=DEFAULT_BITS):
+    """
+    Cluster a garment's colours from season's swatches and measure how much
+    of it is in palette.
+
+    Args:
+        img_rgb (np.ndarray): uint8 RGB image.
+        season (str): Season whose palette seeds the clusters.
+        threshold (float): CAM02-UCS distance under which a colour counts as
+            allowed, as in color_is_allowed.
+        mask (np.ndarray, optional): Garment pixels (non-zero). Defaults to
+            the non-white foreground (foreground_mask).
+        min_fraction (float): The garment is allowed when at least this
+            share of its pixels is within threshold of a swatch.
+        max_iter (int): k-means iterations after seeding.
+        bits (int): Histogram bits per channel.
+
+    Returns:
+        dict: "allowed" verdict, "allowed_fraction" of garment pixels within
+        threshold of a swatch, "pixels" counted and "clusters" (largest
+        first), each with its pixel "fraction", mean "rgb", the swatch it
+        settled "nearest" to, its "delta_e" from that swatch and an
+        "allowed" flag.
+
+    Raises:
+        ValueError: If the season is unknown or the mask selects no pixels.
+    """
+    index = get_palette_index()
+    if season not in index.ucs:
+        raise ValueError(f"Unknown season: {season}")
+    if mask is None:
+        mask = foreground_mask(img_rgb)
+
+    colours, counts = color_histogram(img_rgb, mask, bits)
+    total = counts.sum()
+    if total == 0:
+        raise ValueError("No garment pixels to analyse.")
+    ucs = to_ucs(colours)
+    swatches = index.ucs[season]
+
+    _, dists = _nearest_swatch(ucs, swatches)
+    allowed_fraction = float(counts[dists < threshold].sum() / total)
+
+    _, labels, centers, _ = weighted_kmeans(ucs, counts, len(swatches), init=swatches, max_iter=max_iter, eps=0.5)
+    # Several seeds can converge onto one garment colour; report clusters
+    # grouped by the swatch their centre ends up nearest to.
+    center_swatch, _ = _nearest_swatch(centers, swatches)
+    groups = center_swatch[labels]
+    sizes = np.bincount(groups, weights=counts, minlength=len(swatches))
+    used = np.flatnonzero(sizes)
+    used = used[np.argsort(-sizes[used], kind="stable")]
+
+    def group_mean(values):
+        sums = np.stack([np.bincount(groups, weights=counts * values[:, c], minlength=len(swatches)) for c in range(3)], axis=1)
+        return sums[used] / sizes[used, None]
+
+    rgb = group_mean(colours)
+    diff = group_mean(ucs) - swatches[used]
+    center_dists = np.sqrt(np.sum(diff * diff, axis=1))
+    hex_labels = index.hex[season]
+
+    return {
+        "season": season,
+        "threshold": threshold,
+        "allowed": allowed_fraction >= min_fraction,
+        "allowed_fraction": allowed_fraction,
+        "pixels": int(total),
+        "clusters": [
+            {
+                "rgb": [int(round(v)) for v in rgb[i]],
+                "fraction": float(sizes[used[i]] / total),
+                "nearest": hex_labels[used[i]],
+                "delta_e": float(center_dists[i]),
+                "allowed": bool(center_dists[i] < threshold),
+            }
+            for i in range(len(used))
+        ],
+    }
+
+
+def _coverage_png(img_rgb, state, kind, max_side):
+    """
+    Encode the coverage map (state 0 background, 1 not allowed, 2 allowed)
+    as a PNG, scaled down so its longer side is at most max_side.
+    """
+    scale = max_side / max(state.shape)
+    if scale < 1:
+        size = (max(1, round(state.shape[1] * scale)), max(1, round(state.shape[0] * scale)))
+        state = cv2.resize(state, size, interpolation=cv2.INTER_NEAREST)
+        if kind == "overlay":
+            img_rgb = cv2.resize(img_rgb, size, interpolation=cv2.INTER_AREA)
+    if kind == "mask":
+        image = MASK_VALUES[state]
+    else:
+        offsets = state.astype(np.intp) << 8
+        bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+        image = np.empty_like(bgr)
+        for channel in range(3):
+            image[..., channel] = _OVERLAY_BLEND[channel][offsets + bgr[..., channel]]
+    params = [cv2.IMWRITE_PNG_COMPRESSION, 1, cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE]
+    ok, encoded = cv2.imencode(".png", image, params)
+    if not ok:
+        raise ValueError("Could not encode the coverage image.")
+    return encoded.tobytes()
+
+
+class _CoverageTable:
+    """
+    Lookup table of one season and threshold, one entry per packed 24-bit
+    colour, _UNMATCHED until a garment pixel of that colour is first seen.
+    Matching happens under the lock and writes each entry once, with its
+    final value, so lookups need no lock.
+    """
+
+    def __init__(self, index, season, threshold):
+        self.index = index
+        self.season = season
+        self.threshold = threshold
+        self.table = np.full(1 << 24, _UNMATCHED, dtype=np.uint8)
+        self.lock = threading.Lock()
+
+    def lookup(self, codes, foreground):
+        """Entries for codes, matching foreground colours the table has not seen."""
+        entries = self.table[codes]
+        missing = foreground & (entries >= _PENDING)
+        if missing.any():
+            missing_codes = codes[missing]
+            with self.lock:
+                fresh = missing_codes[self.table[missing_codes] >= _PENDING]
+                if len(fresh):
+                    self._match(self._distinct(fresh))
+            entries[missing] = self.table[missing_codes]
+        return entries
+
+    def _distinct(self, codes):
+        if len(codes) <= _UNIQUE_MAX:
+            return np.unique(codes)
+        self.table[codes] = _PENDING
+        return np.flatnonzero(self.table == _PENDING)
+
+    def _match(self, distinct):
+        """One conversion and one nearest-swatch query per distinct colour."""
+        rgb = np.stack([distinct & 0xFF, (distinct >> 8) & 0xFF, distinct >> 16], axis=1).astype(np.uint8)
+        dists, nearest = self.index.season_nearest(to_ucs(rgb), self.season)
+        allowed = np.where(dists < self.threshold, _ALLOWED_BIT, 0)
+        self.table[distinct] = nearest.astype(np.uint8) | allowed.astype(np.uint8)
+
+
+_coverage_tables = {}
+_coverage_tables_lock = threading.Lock()
+
+
+def _coverage_table(index, season, threshold):
+    """The cached _CoverageTable for season and threshold on the current palettes."""
+    key = (season, float(threshold))
+    with _coverage_tables_lock:
+        table = _coverage_tables.get(key)
+        hit = table is not None and table.index is index
+        if not hit:
+            if table is None and len(_coverage_tables) >= COVERAGE_CACHE_SIZE:
+                _coverage_tables.pop(next(iter(_coverage_tables)))
+            table = _coverage_tables[key] = _CoverageTable(index, season, threshold)
+    record_cache("coverage_lut", hit)
+    return table
+
+
+def palette_coverage(img_rgb, season, threshold=40, mask=None, png=None, png_max_side=PNG_MAX_SIDE):
+    """
+    Map every garment pixel to its nearest swatch of season and measure how
+    much of the garment is in palette.
+
+    Args:
+        img_rgb (np.ndarray): uint8 RGB image.
+        season (str): Season to check against.
+        threshold (float): CAM02-UCS distance under which a pixel counts as
+            allowed, as in color_is_allowed.
+        mask (np.ndarray, optional): Garment pixels (non-zero). Defaults to
+            the non-white foreground, the mask
+            remove_white_background_and_get_median uses.
+        png (str, optional): "mask" for a greyscale PNG (255 allowed, 128
+            not allowed, 0 background) or "overlay" for the image tinted
+            green/red with the background dimmed; None for no image.
+        png_max_side (int): Longest side of the PNG; larger maps are
+            scaled down to keep it compact.
+
+    Returns:
+        dict: "coverage" (allowed share of garment pixels), "pixels",
+        "swatches" (each
+        matched swatch's "hex" and pixel "share", largest first), "nearest"
+        ((H, W) int16 swatch index into the season's palette, -1 for
+        background), "allowed_mask" ((H, W) bool) and "png" (bytes or None).
+
+    Raises:
+        ValueError: If the season or png kind is unknown.
+    """
+    index = get_palette_index()
+    if season not in index.ucs:
+        raise ValueError(f"Unknown season: {season}")
+    if png is not None and png not in PNG_KINDS:
+        raise ValueError(f"Unknown png kind: {png}. Choose from {', '.join(PNG_KINDS)}.")
+    hex_labels = index.hex[season]
+    if len(hex_labels) > _MAX_SWATCHES:
+        raise ValueError(f"{season} has more than {_MAX_SWATCHES} swatches.")
+    if mask is None:
+        mask = foreground_mask(img_rgb)
+    background = mask == 0
+
+    # Packed 0xBBGGRR colour of every pixel, via a zero-copy uint32 view.
+    codes = cv2.cvtColor(np.ascontiguousarray(img_rgb), cv2.COLOR_RGB2RGBA).view(np.uint32)[..., 0] & 0xFFFFFF
+    entries = _coverage_table(index, season, threshold).lookup(codes, ~background)
+    entries[background] = _UNMATCHED
+    tally = np.bincount(entries.ravel(), minlength=256)
+    total = int(tally[:_UNMATCHED].sum())
+    allowed_pixels = int(tally[_ALLOWED_BIT:_UNMATCHED].sum())
+    shares = tally[:len(hex_labels)] + tally[_ALLOWED_BIT:_ALLOWED_BIT + len(hex_labels)]
+    order = np.flatnonzero(shares)
+    order = order[np.argsort(-shares[order], kind="stable")]
+
+    allowed_mask = (entries & _ALLOWED_BIT).astype(bool) & ~background
+    result = {
+        "season": season,
+        "threshold": threshold,
+        "coverage": allowed_pixels / total if total else 0.0,
+        "pixels": total,
+        "swatches": [{"hex": hex_labels[i], "share": float(shares[i] / total)} for i in order],
+        "nearest": np.where(background, -1, (entries & (_ALLOWED_BIT - 1)).astype(np.int16)),
+        "allowed_mask": allowed_mask,
+        "png": None,
+    }
+    if png:
+        state = _STATE[entries]
+        result["png"] = _coverage_png(img_rgb, state, png, png_max_side)
+    return result
@@ -1,3 +1,5 @@
+import contextlib
+import logging
 import os
 import numpy as np
 import cv2
@@ -5,6 +7,12 @@ import torch
 from torchvision import transforms
 from utils.model import BiSeNet  # Import BiSeNet model
 from utils.undertone_analysis import classify_tone  # Import undertone classification logic
+from utils.identify_clothing_color import (
+    DEFAULT_KMEANS_ENGINE, garment_color_from_mask, process_image_with_combined_method,
+)
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
 
 # Preload the BiSeNet model globally
 n_classes = 19
@@ -14,6 +22,11 @@ net.load_state_dict(checkpoint)
 net.to("cpu")
 net.eval()
 
+# BiSeNet class of clothing, and the share of the parsed image it must cover
+# before garment_color_from_parsing trusts it over the white-background method.
+CLOTH_CLASS = 16
+MIN_CLOTH_FRACTION = 0.01
+
 # Preprocessing transformation
 to_tensor = transforms.Compose([
     transforms.ToTensor(),
@@ -22,7 +35,6 @@ to_tensor = transforms.Compose([
 def validate_image(image):
     if len(image.shape) != 3 or image.shape[-1] != 3:
         raise ValueError("Input image must be RGB with 3 channels.")
-    print("as\ndfdsafjsad;l\nkfjsdlak;fjsdal;kfjsdalkfjsdalfj\nasdfdsafdfdsafasdfads\n")
 
 
 
@@ -36,10 +48,14 @@ def get_median_color(image, mask):
         raise ValueError("No pixels found in the mask.")
     return np.median(pixels, axis=0).tolist()
 
-def get_undertones(image, parsing):
+def get_undertones(image, parsing, masked_pixels_only=False):
     """
     Expects an opened image and parsing mask.
     Returns the undertone: warm, cool, neutral.
+
+    With masked_pixels_only the tone is computed from the masked pixels alone
+    instead of a full-size masked copy of the image. The result is the same;
+    it skips building and LAB-converting the black background.
     """
     # Define the neck mask
     neck_mask = (parsing == 14)  # Neck mask
@@ -49,13 +65,15 @@ def get_undertones(image, parsing):
     min_neck_pixels = 500  # Define a threshold for a "reasonable" size
     if neck_pixels.size < min_neck_pixels:
         # Switch to the skin mask if neck mask is too small
-        print("Neck mask too small, switching to skin mask.")
+        logger.debug("Neck mask too small, switching to skin mask.")
         skin_mask = (parsing == 1)  # Skin mask
         skin_pixels = image[skin_mask]
         
         # Check if the skin mask has valid pixels
         if skin_pixels is None or skin_pixels.size == 0:
             raise ValueError("No skin pixels found in the mask.")
+        elif masked_pixels_only:
+            return classify_tone(np.ascontiguousarray(skin_pixels[:, ::-1]).reshape(-1, 1, 3))
         else:
             # Create a masked image for the skin
             skin_masked_image = np.zeros_like(image)
@@ -67,6 +85,8 @@ def get_undertones(image, parsing):
             # Compute the tone using the skin mask
             tone = classify_tone(skin_masked_image_bgr)
             return tone
+    elif masked_pixels_only:
+        return classify_tone(np.ascontiguousarray(neck_pixels[:, ::-1]).reshape(-1, 1, 3))
     else:
         # Create a masked image for the neck
         masked_image = np.zeros_like(image)  # Create a black image
@@ -81,49 +101,68 @@ def get_undertones(image, parsing):
         tone = classify_tone(masked_image_bgr)
         return tone
     
-def extract_features(image):
+def _precision_context(reduced_precision):
+    """bfloat16 autocast on CPU when requested and supported by this torch build."""
+    if reduced_precision and hasattr(torch, "autocast"):
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
 
+def parse_face(image, input_size=512, aux=True, reduced_precision=False):
     """
-    Extract features (hair color, eye color, skin color, undertones) from a single image.
+    Resize an image and run BiSeNet face parsing on it.
 
     Args:
         image (np.ndarray): Input image in RGB format.
+        input_size (int): Side length the image is resized to before parsing.
+        aux (bool): Also run BiSeNet's auxiliary heads (unused at inference).
+        reduced_precision (bool): Run the forward pass in bfloat16 if available.
 
     Returns:
-        dict: Extracted features including colors and undertones.
+        tuple: The resized RGB image and its per-pixel class map.
     """
+    logger.debug("Input image shape: %s", image.shape)
+    # Resize image for consistent processing
+    with span("resize"):
+        resized_image = cv2.resize(image, (input_size, input_size))
 
-    
+    # Convert to tensor and process with BiSeNet
+    with span("tensorise"):
+        img_tensor = to_tensor(resized_image).unsqueeze(0)
+    with span("forward"), torch.no_grad(), _precision_context(reduced_precision):
+        output = net(img_tensor, aux=aux)[0]
+    logger.debug("Model output shape: %s", output.shape)
 
-    try:
-        print(f"Input image shape: {image.shape}")
-        # Resize image for consistent processing
-        resized_image = cv2.resize(image, (512, 512))
-        print("Resized image shape:", resized_image.shape)
+    with span("argmax"):
+        parsing = output.squeeze(0).float().cpu().numpy().argmax(0)  # Parsing map
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Parsing map unique values: %s", np.unique(parsing))
+    return resized_image, parsing
 
-        # Convert to tensor and process with BiSeNet
-        img_tensor = to_tensor(resized_image).unsqueeze(0)
-        print("Tensor shape:", img_tensor.shape)
-        with torch.no_grad():
-            output = net(img_tensor)[0]
-        print("Model output shape:", output.shape)
-        
-        parsing = output.squeeze(0).cpu().numpy().argmax(0)  # Parsing map
-        print("Parsing map unique values:", np.unique(parsing))
-
-        neck_mask = (parsing == 14)
-        if not np.any(neck_mask):
-            neck_mask = (parsing == 1)
-
-        # Extract features
-        hair_color = get_median_color(resized_image, (parsing == 17))  # Hair mask
-        print("Hair Color:", hair_color)
-        eye_color = get_median_color(resized_image, (parsing == 5))   # Eye mask
-        print("eye_color:", eye_color)
-        skin_color = get_median_color(resized_image, neck_mask)  # Neck mask
-        print("skin_color:", skin_color)
-        undertones = get_undertones(resized_image, parsing)
-        print("undertones:", undertones)
+def features_from_parsing(resized_image, parsing, masked_pixels_only=False):
+    """
+    Extract hair, eye and skin colors and the undertone from a parsed image.
+
+    Args:
+        resized_image (np.ndarray): RGB image returned by parse_face.
+        parsing (np.ndarray): Class map returned by parse_face.
+        masked_pixels_only (bool): Passed through to get_undertones.
+
+    Returns:
+        dict: Extracted features including colors and undertones.
+    """
+    try:
+        with span("region_stats"):
+            neck_mask = (parsing == 14)
+            if not np.any(neck_mask):
+                neck_mask = (parsing == 1)
+
+            # Extract features
+            hair_color = get_median_color(resized_image, (parsing == 17))  # Hair mask
+            eye_color = get_median_color(resized_image, (parsing == 5))   # Eye mask
+            skin_color = get_median_color(resized_image, neck_mask)  # Neck mask
+        with span("undertone"):
+            undertones = get_undertones(resized_image, parsing, masked_pixels_only)
+        logger.debug("hair=%s eye=%s skin=%s undertone=%s", hair_color, eye_color, skin_color, undertones)
 
         return {
             "hair_color": hair_color,
@@ -134,3 +173,73 @@ def extract_features(image):
 
     except Exception as e:
         raise ValueError(f"Error in feature extraction: {e}")
+
+def cloth_mask(parsing, shape):
+    """
+    uint8 mask (255 on clothing) of BiSeNet's cloth class, scaled from the
+    parsing map up to an image of the given (height, width).
+    """
+    mask = (parsing == CLOTH_CLASS).astype(np.uint8) * 255
+    return cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+
+def garment_color_from_parsing(image, parsing, min_fraction=MIN_CLOTH_FRACTION, k=4, foreground_only=False,
+                               sample_size=None, seed=None, engine=DEFAULT_KMEANS_ENGINE):
+    """
+    Garment colour of a photo that has already been parsed by parse_face.
+
+    When BiSeNet's cloth class covers at least min_fraction of the parsing
+    map, the colour comes from those pixels of the full-resolution image
+    (garment_color_from_mask). Otherwise the photo is treated as a product
+    shot on a white background (process_image_with_combined_method).
+
+    Args:
+        image (np.ndarray): Original RGB image (not the resized copy).
+        parsing (np.ndarray): Class map returned by parse_face.
+        min_fraction (float): Smallest cloth share to use the parsing.
+        k, foreground_only, sample_size, seed, engine: Clustering options,
+            as for process_image_with_combined_method (kmeans_options gives
+            the configured ones). foreground_only only applies to the
+            white-background fallback; the cloth mask already selects the
+            garment.
+
+    Returns:
+        tuple: The garment colour (R, G, B) and the method used, "cloth" or
+        "white_background".
+    """
+    with span("cloth_mask"):
+        if np.count_nonzero(parsing == CLOTH_CLASS) >= min_fraction * parsing.size:
+            mask = cloth_mask(parsing, image.shape[:2])
+        else:
+            mask = None
+    options = {"k": k, "sample_size": sample_size, "seed": seed, "engine": engine}
+    if mask is not None:
+        return garment_color_from_mask(image, mask, **options), "cloth"
+    logger.debug("No clothing in the parsing map, using the white-background method.")
+    return process_image_with_combined_method(image, foreground_only=foreground_only, **options), "white_background"
+
+def extract_features(image, tier=None):
+
+    """
+    Extract features (hair color, eye color, skin color, undertones) from a single image.
+
+    Args:
+        image (np.ndarray): Input image in RGB format.
+        tier (InferenceTier, optional): Cheaper configuration to run under
+            load (see utils.degradation). Defaults to the full pipeline.
+
+    Returns:
+        dict: Extracted features including colors and undertones.
+    """
+
+    
+
+    try:
+        if tier is None:
+            resized_image, parsing = parse_face(image)
+        else:
+            resized_image, parsing = parse_face(image, **tier.parse_options())
+    except Exception as e:
+        raise ValueError(f"Error in feature extraction: {e}")
+    if tier is None:
+        return features_from_parsing(resized_image, parsing)
+    return features_from_parsing(resized_image, parsing, **tier.feature_options())
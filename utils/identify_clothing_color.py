@@ -1,5 +1,11 @@
+import logging
+import os
 import cv2
 import numpy as np
+from utils.color_histogram import DEFAULT_MIN_GAIN, DEFAULT_MIN_SEPARATION, color_histogram, select_k, weighted_kmeans
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
 
 def remove_white_background_and_get_median(
     img: np.ndarray,
@@ -26,32 +32,241 @@ def remove_white_background_and_get_median(
         The median color (R, G, B) of the non-white region.
     """
 
+    result_img, median_color_rgb, _ = _remove_white_background(img, white_threshold, make_transparent)
+    return result_img, median_color_rgb
+
+def foreground_mask(img: np.ndarray, white_threshold: int = 250):
+    """
+    uint8 mask that is 255 on the subject and 0 on the near-white background
+    (R, G, B all >= white_threshold).
+    """
     lower_bound = np.array([white_threshold, white_threshold, white_threshold], dtype=np.uint8)
     upper_bound = np.array([255, 255, 255], dtype=np.uint8)
-    mask_white = cv2.inRange(img, lower_bound, upper_bound)
+    return cv2.bitwise_not(cv2.inRange(img, lower_bound, upper_bound))
 
-    subject_mask = cv2.bitwise_not(mask_white)
+def median_color(img, mask):
+    """
+    Per-channel median of img's pixels where mask is non-zero, truncated to
+    ints exactly as int(np.median(...)) would be, or (0, 0, 0) for an empty
+    mask.
+
+    Instead of copying the masked pixels out and sorting each channel, it
+    builds one 256-bin histogram per channel over the mask (cv2.calcHist
+    reads the image in place) and walks the cumulative counts to the
+    middle element(s). np.median averages the two middle values of an even
+    count, so the result is their sum // 2.
+    """
+    count = cv2.countNonZero(mask)
+    if count == 0:
+        return (0, 0, 0)
+    lower, upper = (count - 1) // 2, count // 2
+    median = []
+    for channel in range(3):
+        if count < 1 << 24:
+            # float32 histogram counts are exact below 2 ** 24.
+            hist = cv2.calcHist([img], [channel], mask, [256], [0, 256]).ravel()
+        else:
+            hist = np.bincount(img[..., channel][mask > 0], minlength=256)
+        cumulative = np.cumsum(hist)
+        low = int(np.searchsorted(cumulative, lower, side="right"))
+        high = int(np.searchsorted(cumulative, upper, side="right"))
+        median.append((low + high) // 2)
+    return tuple(median)
 
-    if not make_transparent:
+def _remove_white_background(img, white_threshold=250, make_transparent=False, with_result=True):
+    """
+    remove_white_background_and_get_median, also returning the subject mask.
+    With with_result=False the background-removed image is not built and
+    None is returned in its place.
+    """
+    subject_mask = foreground_mask(img, white_threshold)
+
+    if not with_result:
+        result_img = None
+    elif not make_transparent:
         result_img = cv2.bitwise_and(img, img, mask=subject_mask)
     else:
         r, g, b = cv2.split(img)
         alpha = subject_mask
         result_img = cv2.merge((r, g, b, alpha))
 
-    subject_pixels = img[subject_mask == 255]
+    median_color_rgb = median_color(img, subject_mask)
+
+    return result_img, median_color_rgb, subject_mask
+
+_SAMPLE_BATCH = 1 << 16
+
+def sample_pixels(img, mask=None, sample_size=None, sampling="random", seed=None):
+    """
+    Pixels to cluster, as an (N, 3) float32 array: the pixels of img where
+    mask is non-zero (all pixels without a mask), subsampled to at most
+    sample_size of them.
+
+    Sampling methods:
+        "random"  sample_size pixels drawn uniformly (with replacement) from
+                  the masked region; nothing proportional to the image is
+                  allocated beyond a bounded batch of candidate positions.
+        "grid"    every s-th row and column from a random offset, with s
+                  chosen so about sample_size masked pixels remain
+                  (stratified: every region of the garment is represented).
+
+    Error bound: with n uniformly sampled pixels, a cluster covering a
+    fraction p of the garment receives about n * p samples, and its centre
+    is the mean of those. Per channel the centre's standard error is
+    sigma / sqrt(n * p), where sigma is the cluster's own spread. With the
+    default budget of 20,000 pixels, a cluster covering at least 5% of the
+    garment has 1,000+ samples. For sigma <= 40 levels, 99.7% of runs then
+    land within 3 * 40 / sqrt(1000), about 3.8 levels (0-255) per channel,
+    of the full-image centre. Smaller clusters, or clusters that k-means
+    splits differently, can move further; python -m benchmarks.run
+    garment_kmeans measures the end-to-end difference.
+    """
+    rng = np.random.default_rng(seed)
+    if mask is None:
+        mask = np.full(img.shape[:2], 255, dtype=np.uint8)
+    count = cv2.countNonZero(mask)
+    if count == 0:
+        return np.empty((0, 3), dtype=np.float32)
+    if sample_size is None or count <= sample_size:
+        return img[mask > 0].astype(np.float32)
+
+    if sampling == "grid":
+        stride = max(1, int(np.sqrt(count / sample_size)))
+        dy, dx = rng.integers(0, stride, 2)
+        sub_img, sub_mask = img[dy::stride, dx::stride], mask[dy::stride, dx::stride]
+        pixels = sub_img[sub_mask > 0]
+        if len(pixels) > sample_size:
+            pixels = pixels[rng.choice(len(pixels), sample_size, replace=False)]
+        return pixels.astype(np.float32)
+    if sampling != "random":
+        raise ValueError(f"Unknown sampling method: {sampling}")
+
+    flat_img, flat_mask = img.reshape(-1, 3), mask.reshape(-1)
+    fraction = count / flat_mask.size
+    chosen = []
+    needed = sample_size
+    while needed > 0:
+        # Capped so a small foreground loops over bounded batches rather
+        # than drawing about as many candidates as the image has pixels.
+        batch = min(int(needed / fraction * 1.2) + 16, _SAMPLE_BATCH)
+        candidates = rng.integers(0, flat_mask.size, batch)
+        hits = candidates[flat_mask[candidates] > 0][:needed]
+        chosen.append(hits)
+        needed -= len(hits)
+    return flat_img[np.concatenate(chosen)].astype(np.float32)
 
-    if len(subject_pixels) == 0:
-        median_color_rgb = (0, 0, 0)
+def _cluster_cv2(img_rgb, mask, k, sample_size, sampling, seed, attempts):
+    """cv2.kmeans over the (sampled) pixels."""
+    if mask is None and sample_size is None:
+        pixels = img_rgb.reshape(-1, 3).astype(np.float32)
     else:
-        median_r = np.median(subject_pixels[:, 0])
-        median_g = np.median(subject_pixels[:, 1])
-        median_b = np.median(subject_pixels[:, 2])
-        median_color_rgb = (int(median_r), int(median_g), int(median_b))
+        pixels = sample_pixels(img_rgb, mask, sample_size, sampling, seed)
+    if len(pixels) < k:
+        return None
 
-    return result_img, median_color_rgb
+    if seed is not None:
+        cv2.setRNGSeed(seed)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    _, labels, centers = cv2.kmeans(pixels, k, None, criteria, attempts, cv2.KMEANS_RANDOM_CENTERS)
+    return centers, np.bincount(labels.ravel(), minlength=k)
+
+def _cluster_histogram(img_rgb, mask, k, sample_size, sampling, seed, attempts):
+    """Weighted k-means over a 5-bit colour histogram (see utils.color_histogram)."""
+    if sample_size is not None:
+        pixels = sample_pixels(img_rgb, mask, sample_size, sampling, seed).astype(np.uint8)
+        colours, counts = color_histogram(pixels)
+    else:
+        colours, counts = color_histogram(img_rgb, mask)
+    if counts.sum() < k:
+        return None
+    _, _, centers, sizes = weighted_kmeans(colours, counts, k, seed=seed, attempts=attempts)
+    return centers, sizes
+
+# Clustering engines by name. Each takes (img_rgb, mask, k, sample_size,
+# sampling, seed, attempts) and returns (centers, pixels per cluster), or
+# None when there are fewer pixels than clusters.
+KMEANS_ENGINES = {
+    "cv2": _cluster_cv2,
+    "histogram": _cluster_histogram,
+}
+DEFAULT_KMEANS_ENGINE = "cv2"
+
+def get_kmeans_engine(name):
+    """Look up a clustering engine by name, raising ValueError for unknown names."""
+    try:
+        return KMEANS_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown k-means engine: {name}. Choose from {', '.join(KMEANS_ENGINES)}.")
+
+# Clustering configuration shared by the garment endpoints, so a photo gets
+# the same garment colour whichever endpoint it goes through:
+#   COLOR_AI_KMEANS_ENGINE   engine name from KMEANS_ENGINES (default: cv2)
+#   COLOR_AI_KMEANS_SAMPLE   foreground pixels clustered per image (see
+#                            sample_pixels for the error bound); 0 clusters
+#                            the whole image (default: 0)
+#   COLOR_AI_KMEANS_K        default number of clusters, an integer or "auto"
+KMEANS_ENGINE = os.environ.get("COLOR_AI_KMEANS_ENGINE", DEFAULT_KMEANS_ENGINE)
+KMEANS_SAMPLE_SIZE = int(os.environ.get("COLOR_AI_KMEANS_SAMPLE", 0))
+KMEANS_K = os.environ.get("COLOR_AI_KMEANS_K", "4")
+
+def parse_k(value):
+    """A cluster count from a string: a positive integer or "auto"."""
+    if value == "auto":
+        return value
+    try:
+        k = int(value)
+    except ValueError:
+        k = 0
+    if k < 1:
+        raise ValueError(f"Invalid k: {value}. Use a positive integer or 'auto'.")
+    return k
+
+def kmeans_options():
+    """
+    Keyword arguments for process_image_with_combined_method (and
+    garment_color_from_parsing) under the configured engine and sample size,
+    and a label for the flight recorder. The histogram engine's cost does not
+    grow with the image, so it clusters the whole foreground rather than a
+    sample. Raises ValueError for an unknown engine.
+    """
+    get_kmeans_engine(KMEANS_ENGINE)
+    if KMEANS_ENGINE == "histogram":
+        return {"foreground_only": True, "seed": 0, "engine": KMEANS_ENGINE}, "histogram-foreground"
+    if KMEANS_SAMPLE_SIZE:
+        options = {"foreground_only": True, "sample_size": KMEANS_SAMPLE_SIZE, "seed": 0, "engine": KMEANS_ENGINE}
+        return options, f"{KMEANS_ENGINE}-foreground-sampled"
+    return {"engine": KMEANS_ENGINE}, KMEANS_ENGINE
+
+AUTO_K_SAMPLE_SIZE = 20000
+AUTO_K_MAX = 8
 
-def get_shirt_base_color_kmeans(img_rgb, median_color_rgb, k=4, crop=None):
+def choose_k(img_rgb, mask=None, k_max=AUTO_K_MAX, sample_size=AUTO_K_SAMPLE_SIZE,
+             min_gain=DEFAULT_MIN_GAIN, min_separation=DEFAULT_MIN_SEPARATION, seed=None):
+    """
+    Pick the number of k-means clusters for an image: the inertia elbow of
+    utils.color_histogram.select_k (min_gain, min_separation in RGB levels)
+    over the colour histogram of a pixel sample (masked pixels only when a
+    mask is given), with each k warm-started from the previous one's
+    centres.
+
+    Returns:
+    --------
+    k : int
+        The chosen number of clusters.
+    inertias : list
+        Inertia of every k evaluated, from k = 1.
+    """
+    pixels = sample_pixels(img_rgb, mask, sample_size, "random", seed).astype(np.uint8)
+    if len(pixels) == 0:
+        return 1, []
+    colours, counts = color_histogram(pixels)
+    with span("auto_k"):
+        k, _, inertias = select_k(colours, counts, k_max, min_gain, min_separation, seed)
+    return k, inertias
+
+def get_shirt_base_color_kmeans(img_rgb, median_color_rgb, k=4, crop=None, mask=None,
+                                sample_size=None, sampling="random", seed=None, attempts=10,
+                                engine=DEFAULT_KMEANS_ENGINE):
     """
     Use k-means clustering to find the dominant color closest to the median color.
 
@@ -61,24 +276,48 @@ def get_shirt_base_color_kmeans(img_rgb, median_color_rgb, k=4, crop=None):
         Path to the input image.
     median_color_rgb : tuple
         The median color (R, G, B) from the previous step.
-    k : int
-        Number of clusters for k-means.
+    k : int or "auto"
+        Number of clusters for k-means; "auto" picks it with choose_k.
     crop : tuple, optional
         Region to crop as (x, y, w, h).
+    mask : np.ndarray, optional
+        Only cluster pixels where this mask is non-zero (e.g. the foreground
+        from foreground_mask), cropped along with the image.
+    sample_size : int, optional
+        Cluster at most this many pixels, drawn with sample_pixels. None
+        clusters every (masked) pixel.
+    sampling : str
+        Sampling method for sample_pixels ("random" or "grid").
+    seed : int, optional
+        Seed for sampling and for the initial centres.
+    attempts : int
+        k-means restarts.
+    engine : str
+        Clustering engine from KMEANS_ENGINES: "cv2" (cv2.kmeans over the
+        pixels) or "histogram" (weighted k-means++ over the occupied bins
+        of a quantised colour histogram, whose cost depends on the number
+        of distinct colours rather than the number of pixels).
 
     Returns:
     --------
     closest_color_rgb : tuple
         The cluster center (R, G, B) closest to the median color.
     """
+    cluster = get_kmeans_engine(engine)
     if crop is not None:
         x, y, w, h = crop
         img_rgb = img_rgb[y:y+h, x:x+w]
+        if mask is not None:
+            mask = mask[y:y+h, x:x+w]
 
-    pixels = img_rgb.reshape(-1, 3).astype(np.float32)
+    if k == "auto":
+        k, _ = choose_k(img_rgb, mask, seed=seed)
+        logger.debug("Chose k=%d", k)
 
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-    _, labels, centers = cv2.kmeans(pixels, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+    clusters = cluster(img_rgb, mask, k, sample_size, sampling, seed, attempts)
+    if clusters is None:
+        return tuple(int(c) for c in median_color_rgb)
+    centers, _ = clusters
 
     distances = np.linalg.norm(centers - np.array(median_color_rgb), axis=1)
     closest_idx = np.argmin(distances)
@@ -86,7 +325,9 @@ def get_shirt_base_color_kmeans(img_rgb, median_color_rgb, k=4, crop=None):
 
     return tuple(closest_color_rgb)
 
-def process_image_with_combined_method(img_rgb, output_path: str = None, k=4, crop=None):
+def process_image_with_combined_method(img_rgb, output_path: str = None, k=4, crop=None,
+                                       foreground_only=False, sample_size=None, sampling="random", seed=None,
+                                       engine=DEFAULT_KMEANS_ENGINE):
     """
     Process an image by removing the white background, finding the median color,
     and identifying the dominant k-means cluster closest to the median color.
@@ -97,10 +338,21 @@ def process_image_with_combined_method(img_rgb, output_path: str = None, k=4, cr
         Path to the input image.
     output_path : str, optional
         Path to save the processed image.
-    k : int
-        Number of clusters for k-means.
+    k : int or "auto"
+        Number of clusters for k-means ("auto": see choose_k).
     crop : tuple, optional
         Region to crop as (x, y, w, h).
+    foreground_only : bool
+        Cluster only the non-white pixels instead of the whole image.
+    sample_size : int, optional
+        Cluster at most this many pixels (see sample_pixels for the error
+        bound). None clusters all of them.
+    sampling : str
+        "random" or "grid" subsampling.
+    seed : int, optional
+        Seed for sampling and k-means initialisation.
+    engine : str
+        Clustering engine name (see KMEANS_ENGINES).
 
     Returns:
     --------
@@ -109,30 +361,105 @@ def process_image_with_combined_method(img_rgb, output_path: str = None, k=4, cr
     closest_color_rgb : tuple
         The closest k-means cluster center to the median color (R, G, B).
     """
-    print("starting process_image_with_combined_method")
     try:
-        result, median_color_rgb = remove_white_background_and_get_median(img_rgb)
+        with span("background"):
+            result, median_color_rgb, mask = _remove_white_background(img_rgb, with_result=bool(output_path))
 
-        closest_color_rgb = get_shirt_base_color_kmeans(
-            img_rgb, median_color_rgb, k=k, crop=crop
-        )
+        with span("kmeans"):
+            closest_color_rgb = get_shirt_base_color_kmeans(
+                img_rgb, median_color_rgb, k=k, crop=crop, mask=mask if foreground_only else None,
+                sample_size=sample_size, sampling=sampling, seed=seed, engine=engine,
+            )
 
         if output_path:
             result_bgr = cv2.cvtColor(result, cv2.COLOR_RGB2BGR)
             cv2.imwrite(output_path, result_bgr)
-            print(f"Processed image saved to: {output_path}")
+            logger.debug("Processed image saved to: %s", output_path)
 
-        print(f"Median color (RGB): {median_color_rgb}")
-        print(f"Closest color (RGB): {closest_color_rgb}")
+        logger.debug("Median color (RGB): %s, closest color (RGB): %s", median_color_rgb, closest_color_rgb)
 
         return closest_color_rgb
     except Exception as e:
         raise ValueError(f"Error processing image: {e}")
 
-# # Example usage
-# if __name__ == "__main__":
-#     input_path = "photos/clothes/image2.png"
-#     output_path = "output.png"  # Optional
-#     processed_image, closest_color = process_image_with_combined_method(input_path, output_path, k=5)
-#     print(f"Closest color to the median (RGB): {closest_color}")
+def garment_color_from_mask(img_rgb, mask, k=4, sample_size=None, sampling="random", seed=None,
+                            attempts=10, engine=DEFAULT_KMEANS_ENGINE):
+    """
+    The garment colour within a segmentation mask (e.g. a parsing model's
+    clothing class) rather than on a white background: the median colour
+    of the masked pixels, then the k-means cluster of those pixels closest
+    to it, as in process_image_with_combined_method.
+
+    Parameters:
+    -----------
+    img_rgb : np.ndarray
+        RGB image.
+    mask : np.ndarray
+        uint8 mask of img_rgb's shape, non-zero on the garment.
+    k, sample_size, sampling, seed, attempts, engine :
+        As for get_shirt_base_color_kmeans.
+
+    Returns:
+    --------
+    closest_color_rgb : tuple
+        The cluster center (R, G, B) closest to the garment's median color.
+    """
+    with span("background"):
+        median_color_rgb = median_color(img_rgb, mask)
+    with span("kmeans"):
+        return get_shirt_base_color_kmeans(
+            img_rgb, median_color_rgb, k=k, mask=mask, sample_size=sample_size, sampling=sampling,
+            seed=seed, attempts=attempts, engine=engine,
+        )
+
+def dominant_colors(img_rgb, k=4, crop=None, foreground_only=True, sample_size=None, sampling="random",
+                    seed=None, attempts=10, engine=DEFAULT_KMEANS_ENGINE):
+    """
+    The garment's k dominant colours and the share of its pixels each covers,
+    for patterned garments where a single colour closest to the median is
+    meaningless.
+
+    The clustering engine's labels are counted once (np.bincount) to get the
+    coverage, so nothing is re-clustered or re-assigned. With sample_size
+    set, coverage is the share of the sample, an estimate whose standard
+    error for a colour covering p is sqrt(p * (1 - p) / sample_size).
+
+    Parameters:
+    -----------
+    img_rgb : np.ndarray
+        RGB image.
+    k : int or "auto"
+        Number of clusters ("auto": see choose_k).
+    crop, sample_size, sampling, seed, attempts, engine :
+        As for get_shirt_base_color_kmeans.
+    foreground_only : bool
+        Cluster only the non-white pixels.
+
+    Returns:
+    --------
+    colors : list
+        (rgb tuple, coverage fraction) pairs, largest coverage first, for
+        the clusters that received pixels. Empty if there are fewer pixels
+        than clusters.
+    """
+    cluster = get_kmeans_engine(engine)
+    mask = foreground_mask(img_rgb) if foreground_only else None
+    if crop is not None:
+        x, y, w, h = crop
+        img_rgb = img_rgb[y:y+h, x:x+w]
+        if mask is not None:
+            mask = mask[y:y+h, x:x+w]
 
+    if k == "auto":
+        k, _ = choose_k(img_rgb, mask, seed=seed)
+    with span("kmeans"):
+        clusters = cluster(img_rgb, mask, k, sample_size, sampling, seed, attempts)
+    if clusters is None:
+        return []
+    centers, sizes = clusters
+    order = np.argsort(-np.asarray(sizes), kind="stable")
+    total = float(np.sum(sizes))
+    return [
+        (tuple(int(c) for c in centers[i].astype(int)), float(sizes[i]) / total)
+        for i in order if sizes[i] > 0
+    ]
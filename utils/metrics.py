@@ -0,0 +1,252 @@
+"""
+In-process metrics registry.
+
+Metrics are registered once at import time with ``counter(...)``,
+``gauge(...)`` or ``histogram(...)`` and updated from any thread.
+``snapshot()`` returns the current values as plain dicts and
+``render_prometheus()`` renders them in the Prometheus text format for the
+/metrics endpoint.
+
+``span(stage)`` times a block of pipeline work into the
+color_ai_stage_duration_seconds histogram. It costs two clock reads and one
+locked update, cheap enough to leave on in the hot path. Inside
+``start_trace()`` the same timings are also collected per request (the
+executor carries the trace into its worker threads).
+
+Values are per process: work run on the process pool (see utils.executor)
+is timed in the worker process and is not visible here.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """List of (labels dict, value) pairs."""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        """List of (labels dict, {"buckets", "sum", "count"}) pairs; buckets are cumulative."""
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        result = []
+        for key, (counts, total, count) in items:
+            cumulative, running = {}, 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                cumulative[bound] = running
+            result.append((dict(zip(self.labelnames, key)), {"buckets": cumulative, "sum": total, "count": count}))
+        return result
+
+
+def _register(cls, name, documentation, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels.")
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    """Return the Counter called name, registering it on first use."""
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    """Return the Gauge called name, registering it on first use."""
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=Histogram.DEFAULT_BUCKETS):
+    """Return the Histogram called name, registering it on first use."""
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+_collectors = []
+
+
+def register_collector(fn):
+    """
+    Register fn() to be called before metrics are read, for gauges that are
+    cheaper to sample on scrape (queue depth) than to keep up to date.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def _collect():
+    for fn in list(_collectors):
+        fn()
+    with _registry_lock:
+        return list(_registry.values())
+
+
+def _json_value(metric, value):
+    # JSON has no infinity: histogram bounds become strings, the last "+Inf"
+    # as in the Prometheus text format.
+    if metric.kind != "histogram":
+        return value
+    return dict(value, buckets={_format_value(bound): count for bound, count in value["buckets"].items()})
+
+
+def snapshot():
+    """Current value of every registered metric, JSON-serialisable."""
+    return {
+        metric.name: [{"labels": labels, "value": _json_value(metric, value)} for labels, value in metric.samples()]
+        for metric in _collect()
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _collect():
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in metric.samples():
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for bound, count in value["buckets"].items():
+                bucket_labels = dict(labels, le=_format_value(bound))
+                lines.append(f"{metric.name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+stage_duration = histogram(
+    "color_ai_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    ("stage",),
+)
+cache_lookups = counter(
+    "color_ai_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+
+
+_trace = contextvars.ContextVar("color_ai_trace", default=None)
+
+
+def start_trace():
+    """
+    Start collecting span timings for the current request. Returns the dict
+    (stage -> seconds) that spans in this context will add to.
+    """
+    trace = {}
+    _trace.set(trace)
+    return trace
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the enclosed block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + elapsed
+
+
+def record_cache(cache, hit):
+    """Count one lookup in the named cache."""
+    cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
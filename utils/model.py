@@ -238,13 +238,17 @@ class BiSeNet(nn.Module):
         self.conv_out32 = BiSeNetOutput(128, 64, n_classes)
         self.init_weight()
 
-    def forward(self, x):
+    def forward(self, x, aux=True):
         H, W = x.size()[2:]
         feat_res8, feat_cp8, feat_cp16 = self.cp(x)  # here return res3b1 feature
         feat_sp = feat_res8  # use res3b1 feature to replace spatial path feature
         feat_fuse = self.ffm(feat_sp, feat_cp8)
 
         feat_out = self.conv_out(feat_fuse)
+        if not aux:
+            # the 16/32 heads only matter for training; skip them at inference
+            feat_out = F.interpolate(feat_out, (H, W), mode='bilinear', align_corners=True)
+            return feat_out, None, None
         feat_out16 = self.conv_out16(feat_cp8)
         feat_out32 = self.conv_out32(feat_cp16)
 
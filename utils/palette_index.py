@@ -0,0 +1,299 @@
+"""
+Precompiled palette index.
+
+color_is_allowed used to re-parse every hex string and run a full
+colour-appearance-model conversion per palette swatch on every call. The
+index does that work once: for each season it keeps the hex labels, the RGB
+values and an (N, 3) array of CAM02-UCS coordinates, so a membership check is
+one conversion of the query colour plus a vectorised distance computation.
+
+Conversions go through utils.cam02ucs, which reproduces colorspacious'
+cspace_convert(rgb, "sRGB1", "CAM02-UCS") on 0-255 values, exactly as
+rgb_to_lch in utils.color_difference always has; the default threshold of 40
+is tuned to that scale.
+
+Membership checks and per-season scores can also use any metric from
+utils.delta_e (metric="ciede2000" and so on); palette coordinates for other
+colour spaces are converted on first use.
+"""
+
+import numpy as np
+from colorspacious import cspace_convert
+from scipy.spatial import cKDTree, distance
+
+from utils.cam02ucs import srgb_to_cam02ucs
+from utils.delta_e import DEFAULT_METRIC, get_metric
+from utils.metrics import record_cache
+
+# utils.cam02ucs agrees with colorspacious to about 1e-9, so only a swatch
+# this close to the threshold can get a different verdict. Those are
+# re-checked with colorspacious itself, so is_allowed matches the original
+# per-swatch cspace_convert loop exactly.
+_EXACT_RECHECK_EPS = 1e-6
+
+
+def _hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def to_ucs(rgb):
+    """Convert RGB values (0-255, any leading shape) to CAM02-UCS."""
+    return srgb_to_cam02ucs(rgb)
+
+
+def _reference_ucs(rgb):
+    """The original colorspacious conversion, for exact re-checks."""
+    return cspace_convert(rgb, "sRGB1", "CAM02-UCS")
+
+
+class PaletteIndex:
+    """
+    CAM02-UCS coordinates of every season's palette, computed once.
+
+    Nearest-swatch queries (nearest, within) go through KD-trees over the
+    same coordinates: one over all swatches and one per season, built on
+    first use.
+
+    Attributes:
+        seasons (list): Season names, in palette order.
+        hex (dict): Season -> list of hex labels.
+        rgb (dict): Season -> (N, 3) uint8 array.
+        ucs (dict): Season -> (N, 3) float64 array of CAM02-UCS coordinates.
+        all_ucs (np.ndarray): Every swatch of every season, concatenated in
+            season order; season i owns rows offsets[i]:offsets[i + 1].
+        all_rgb (np.ndarray): The same swatches as uint8 RGB.
+    """
+
+    def __init__(self, palettes):
+        all_hex = [h for hexes in palettes.values() for h in hexes]
+        all_rgb = np.array([_hex_to_rgb(h) for h in all_hex], dtype=np.uint8).reshape(-1, 3)
+        offsets = np.concatenate([[0], np.cumsum([len(hexes) for hexes in palettes.values()])])
+        self._setup(list(palettes), offsets, all_hex, all_rgb, to_ucs(all_rgb))
+
+    @classmethod
+    def from_compiled(cls, seasons, offsets, all_hex, all_rgb, all_ucs):
+        """
+        Build an index from already-converted arrays (see utils.palette_store)
+        without parsing or converting anything: flat hex labels, uint8 RGB and
+        CAM02-UCS rows in season order, season i owning offsets[i]:offsets[i + 1].
+        """
+        index = cls.__new__(cls)
+        index._setup(list(seasons), offsets, list(all_hex), all_rgb, all_ucs)
+        return index
+
+    def _setup(self, seasons, offsets, all_hex, all_rgb, all_ucs):
+        self.seasons = seasons
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+        self.all_hex = all_hex
+        self.all_rgb = all_rgb
+        self.all_ucs = all_ucs
+        spans = [(season, self.offsets[i], self.offsets[i + 1]) for i, season in enumerate(seasons)]
+        self.hex = {season: all_hex[a:b] for season, a, b in spans}
+        self.rgb = {season: all_rgb[a:b] for season, a, b in spans}
+        self.ucs = {season: all_ucs[a:b] for season, a, b in spans}
+        self._coords = {"cam02ucs": self.all_ucs}
+        sizes = np.diff(self.offsets)
+
+        # (seasons, longest palette) grid of row numbers into all_ucs, padded
+        # with -1, so per-season reductions are a single gather + argmin.
+        columns = np.arange(sizes.max(initial=0))
+        self._padding = columns >= sizes[:, None]
+        self._slots = np.where(self._padding, -1, self.offsets[:-1, None] + columns)
+
+        self._season_of_row = np.repeat(np.arange(len(sizes)), sizes)
+        self._trees = {}
+
+    def _tree(self, season):
+        """KD-tree over all swatches (season None) or one season's swatches."""
+        tree = self._trees.get(season)
+        record_cache("kdtree", tree is not None)
+        if tree is None:
+            points = self.all_ucs if season is None else self.ucs[season]
+            tree = self._trees[season] = cKDTree(points)
+        return tree
+
+    def season_grid(self):
+        """
+        (seasons, longest palette) grid of row numbers into all_ucs, padded
+        with -1, and its padding mask. Gathering an all-swatch array through
+        it gives per-season rows for a single reduction.
+        """
+        return self._slots, self._padding
+
+    def season_nearest(self, ucs, season):
+        """
+        Nearest swatch of season to each CAM02-UCS point, from the season's
+        KD-tree. Returns (distances, indices into the season's palette).
+        """
+        return self._tree(season).query(ucs)
+
+    def _rows(self, season, local):
+        """Map row numbers from a season's tree to rows of all_ucs."""
+        if season is None:
+            return local
+        return self.offsets[self.seasons.index(season)] + local
+
+    def _swatch(self, row, delta_e):
+        return {
+            "season": self.seasons[self._season_of_row[row]],
+            "hex": self.all_hex[row],
+            "delta_e": float(delta_e),
+        }
+
+    def nearest(self, colors, k=5, season=None):
+        """
+        The k nearest palette swatches to each colour, optionally limited to
+        one season.
+
+        Args:
+            colors: One RGB colour or an (N, 3) array of them (0-255).
+            k (int): Swatches to return per colour.
+            season (str, optional): Only consider this season's swatches.
+
+        Returns:
+            list: Per colour, a list of up to k swatch dicts (season, hex,
+            delta_e), nearest first.
+        """
+        tree = self._tree(season)
+        k = min(k, tree.n)
+        ucs = to_ucs(colors).reshape(-1, 3)
+        dists, local = tree.query(ucs, k=k)
+        dists = np.asarray(dists).reshape(len(ucs), k)
+        rows = self._rows(season, np.asarray(local).reshape(len(ucs), k))
+        return [
+            [self._swatch(row, d) for row, d in zip(rows[i], dists[i])]
+            for i in range(len(ucs))
+        ]
+
+    def within(self, colors, radius, season=None):
+        """
+        Every palette swatch within radius of each colour, nearest first,
+        optionally limited to one season. Same arguments and result shape as
+        nearest.
+        """
+        tree = self._tree(season)
+        ucs = to_ucs(colors).reshape(-1, 3)
+        results = []
+        for point, local in zip(ucs, tree.query_ball_point(ucs, r=radius)):
+            rows = self._rows(season, np.asarray(local, dtype=np.intp))
+            diff = self.all_ucs[rows] - point
+            dists = np.sqrt(np.sum(diff * diff, axis=1))
+            order = np.argsort(dists, kind="stable")
+            results.append([self._swatch(rows[j], dists[j]) for j in order])
+        return results
+
+    def _distances(self, color, season):
+        color_ucs = to_ucs(color)
+        diff = self.ucs[season] - color_ucs
+        return color_ucs, np.sqrt(np.sum(diff * diff, axis=1))
+
+    def coords(self, metric):
+        """Every swatch (rows as in all_ucs) in metric's colour space."""
+        coords = self._coords.get(metric.space)
+        record_cache("metric_coords", coords is not None)
+        if coords is None:
+            coords = self._coords[metric.space] = metric.convert(self.all_rgb)
+        return coords
+
+    def _metric_distances(self, color, metric, season=None):
+        """Distances from color to every swatch (or one season's) under metric."""
+        coords = self.coords(metric)
+        if season is not None:
+            i = self.seasons.index(season)
+            coords = coords[self.offsets[i]:self.offsets[i + 1]]
+        return metric.pairwise(coords, metric.convert(color))[:, 0]
+
+    def distances(self, color, season, metric=DEFAULT_METRIC):
+        """Distance from color (RGB tuple) to every swatch of season."""
+        if metric == DEFAULT_METRIC:
+            return self._distances(color, season)[1]
+        return self._metric_distances(color, get_metric(metric), season)
+
+    def is_allowed(self, color, season, threshold=40, metric=DEFAULT_METRIC):
+        """True if color is within threshold of any swatch in season's palette."""
+        if metric != DEFAULT_METRIC:
+            return bool(np.any(self._metric_distances(color, get_metric(metric), season) < threshold))
+
+        _, dists = self._distances(color, season)
+
+        if np.any(dists < threshold - _EXACT_RECHECK_EPS):
+            return True
+        near = np.flatnonzero(np.abs(dists - threshold) <= _EXACT_RECHECK_EPS)
+        if len(near):
+            color_ucs = _reference_ucs(color)
+            for i in near:
+                swatch_ucs = _reference_ucs(_hex_to_rgb(self.hex[season][i]))
+                if distance.euclidean(color_ucs, swatch_ucs) < threshold:
+                    return True
+        return False
+
+    def seasons_for_color(self, color, threshold=40, metric=DEFAULT_METRIC):
+        """
+        Score color against every season in one pass: a single conversion of
+        the query colour, one distance computation over all swatches, then a
+        per-season minimum.
+
+        Returns:
+            list: One dict per season (in palette order) with the minimum
+            distance ("delta_e"), the nearest swatch's hex and whether the
+            colour is allowed at threshold.
+        """
+        if metric == DEFAULT_METRIC:
+            diff = self.all_ucs - to_ucs(color)
+            dists = np.sqrt(np.sum(diff * diff, axis=1))
+        else:
+            dists = self._metric_distances(color, get_metric(metric))
+
+        grid = np.where(self._padding, np.inf, dists[self._slots])
+        columns = grid.argmin(axis=1)
+        rows = np.arange(len(self.seasons))
+        minima = grid[rows, columns]
+        nearest = self._slots[rows, columns]
+
+        return [
+            {
+                "season": season,
+                "delta_e": float(minima[i]),
+                "nearest": self.all_hex[nearest[i]],
+                "allowed": bool(minima[i] < threshold),
+            }
+            for i, season in enumerate(self.seasons)
+        ]
+
+    def match_colors(self, colors, seasons=None, threshold=40, metric=DEFAULT_METRIC):
+        """
+        Score many colours against one or more seasons at once: one
+        conversion of all query colours, one (colours x swatches) distance
+        matrix over the selected seasons' palettes, then a per-season minimum.
+
+        Args:
+            colors: (N, 3) RGB array (0-255).
+            seasons (list, optional): Seasons to check; all when None.
+            threshold (float): Allowed if the minimum distance is below this.
+            metric (str): Metric name from utils.delta_e.
+
+        Returns:
+            tuple: (N, S) minimum distances, (N, S) row numbers of the nearest
+            swatch in all_hex, and (N, S) allowed flags, with seasons in the
+            order given.
+        """
+        metric = get_metric(metric)
+        seasons = self.seasons if seasons is None else list(seasons)
+        unknown = [season for season in seasons if season not in self.hex]
+        if unknown:
+            raise ValueError(f"Unknown season: {', '.join(unknown)}")
+        which = [self.seasons.index(season) for season in seasons]
+        slots, padding = self._slots[which], self._padding[which]
+
+        query = metric.convert(np.asarray(colors).reshape(-1, 3))
+        rows = slots[~padding]
+        # Palette swatches are the reference colour for asymmetric metrics (CIE94).
+        dists = metric.pairwise(self.coords(metric)[rows], query).T
+
+        grid = np.full((len(query),) + slots.shape, np.inf)
+        grid[:, ~padding] = dists
+        columns = grid.argmin(axis=2)
+        minima = np.take_along_axis(grid, columns[..., None], axis=2)[..., 0]
+        nearest = slots[np.arange(len(seasons)), columns]
+        return minima, nearest, minima < threshold
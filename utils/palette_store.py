@@ -0,0 +1,241 @@
+"""
+Compiled palette artifact.
+
+Color-AI/palettes.json is the single source of truth for the season
+palettes. Parsing it and converting every swatch to CAM02-UCS on each cold
+start is wasted work, so the compiler writes everything a PaletteIndex needs
+(season names, hex labels, uint8 RGB and CAM02-UCS coordinates, flattened in
+season order with row offsets) to one binary file, stamped with the format
+version and the SHA-256 of the source file. Loading it is a header read and a
+memory map; nothing is parsed per swatch or converted.
+
+At runtime PaletteStore serves the current PaletteIndex:
+
+- On first use it loads the artifact, or compiles it when it is missing,
+  from an older format or built from a different palettes.json. If the
+  artifact cannot be written (read-only deploys) the freshly compiled
+  palettes are used from memory.
+- Afterwards it stats the artifact and the source at most every
+  reload_interval seconds. A replaced artifact is loaded and swapped in as
+  one reference assignment, so in-flight requests keep the index they
+  started with and workers never need a restart. Publishing a new artifact
+  is atomic too: the compiler writes a temporary file and os.replace()s it.
+
+Configuration (environment variables):
+    COLOR_AI_PALETTE_ARTIFACT    artifact path (default: res/palettes.bin)
+    COLOR_AI_PALETTE_RELOAD_S    seconds between freshness checks (default: 5;
+                                 0 checks on every call)
+
+Usage:
+    python -m utils.palette_store build     # compile palettes.json
+    python -m utils.palette_store check     # report whether the artifact is fresh
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import record_cache
+from utils.palette_index import PaletteIndex
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PALETTES_PATH = os.path.join(REPO_ROOT, "Color-AI", "palettes.json")
+ARTIFACT_PATH = os.environ.get("COLOR_AI_PALETTE_ARTIFACT", os.path.join(REPO_ROOT, "res", "palettes.bin"))
+FORMAT_VERSION = 1
+
+
+def palettes_version(path=PALETTES_PATH):
+    """SHA-256 of the palette source file, used to stamp derived artifacts."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+_MAGIC = b"CAIPAL"
+_ALIGN = 64
+
+
+def compile_palettes(source=PALETTES_PATH, target=ARTIFACT_PATH):
+    """
+    Compile source into the artifact at target, replacing it atomically.
+
+    The file is a small fixed header (magic, format version, metadata
+    length), JSON metadata (source SHA-256, seasons, row offsets, hex labels),
+    then the CAM02-UCS float64 and RGB uint8 rows, 64-byte aligned so they
+    can be memory-mapped in place.
+
+    Returns:
+        PaletteIndex: The compiled palettes.
+    """
+    with open(source, "rb") as f:
+        raw = f.read()
+    index = PaletteIndex(json.loads(raw))
+    meta = json.dumps({
+        "source_sha256": hashlib.sha256(raw).hexdigest(),
+        "seasons": index.seasons,
+        "offsets": index.offsets.tolist(),
+        "hex": index.all_hex,
+    }).encode()
+    header = _MAGIC + struct.pack("<HI", FORMAT_VERSION, len(meta)) + meta
+    header += b"\0" * (-len(header) % _ALIGN)
+
+    directory = os.path.dirname(target) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(np.ascontiguousarray(index.all_ucs, dtype="<f8").tobytes())
+            f.write(np.ascontiguousarray(index.all_rgb, dtype=np.uint8).tobytes())
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return index
+
+
+def read_artifact(path=ARTIFACT_PATH):
+    """
+    Load a compiled artifact, memory-mapping its arrays.
+
+    Returns:
+        tuple: (PaletteIndex, source SHA-256 it was built from).
+
+    Raises:
+        ValueError: If the file is not a compiled palette artifact of the
+            current format version.
+    """
+    with open(path, "rb") as f:
+        fixed = f.read(len(_MAGIC) + 6)
+        if len(fixed) < len(_MAGIC) + 6 or not fixed.startswith(_MAGIC):
+            raise ValueError(f"{path} is not a palette artifact")
+        version, meta_len = struct.unpack("<HI", fixed[len(_MAGIC):])
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} is format version {version}, expected {FORMAT_VERSION}")
+        meta = json.loads(f.read(meta_len))
+
+    start = len(fixed) + meta_len
+    start += -start % _ALIGN
+    n = meta["offsets"][-1]
+    with open(path, "rb") as f:
+        # A plain ndarray over the mapping; np.memmap's subclass overhead
+        # shows up on every per-season slice.
+        data = np.frombuffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), dtype=np.uint8)
+    if len(data) != start + n * 3 * 9:
+        raise ValueError(f"{path} is truncated")
+    ucs = data[start:start + n * 24].view("<f8").reshape(n, 3)
+    rgb = data[start + n * 24:].reshape(n, 3)
+    index = PaletteIndex.from_compiled(meta["seasons"], meta["offsets"], meta["hex"], rgb, ucs)
+    return index, meta["source_sha256"]
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class PaletteStore:
+    """
+    The current PaletteIndex, loaded from the compiled artifact and reloaded
+    when the artifact or its source changes.
+    """
+
+    def __init__(self, source=PALETTES_PATH, artifact=ARTIFACT_PATH, reload_interval=5.0):
+        self.source = source
+        self.artifact = artifact
+        self.reload_interval = reload_interval
+        self._index = None
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._source_stat = None
+        self._artifact_stat = None
+
+    def current(self):
+        """The PaletteIndex to use for this call."""
+        index = self._index
+        if index is None or time.monotonic() - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if self._index is None or time.monotonic() - self._checked_at >= self.reload_interval:
+                    self._refresh()
+            index = self._index
+        return index
+
+    def reload(self):
+        """Check the artifact and source now, reloading or rebuilding if needed."""
+        with self._lock:
+            self._refresh()
+        return self._index
+
+    def _refresh(self):
+        self._checked_at = time.monotonic()
+        source_stat, artifact_stat = _stat(self.source), _stat(self.artifact)
+        if self._index is not None and source_stat == self._source_stat and artifact_stat == self._artifact_stat:
+            return
+
+        index = None
+        if artifact_stat is not None:
+            try:
+                index, built_from = read_artifact(self.artifact)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring palette artifact %s: %s", self.artifact, e)
+            else:
+                if source_stat is not None and built_from != palettes_version(self.source):
+                    logger.info("Palette artifact %s is stale; rebuilding", self.artifact)
+                    index = None
+        record_cache("palette_artifact", index is not None)
+
+        if index is None:
+            try:
+                index = compile_palettes(self.source, self.artifact)
+            except OSError as e:
+                # Read-only filesystem: keep the compiled palettes in memory.
+                logger.warning("Could not write palette artifact %s: %s", self.artifact, e)
+                with open(self.source) as f:
+                    index = PaletteIndex(json.load(f))
+            artifact_stat = _stat(self.artifact)
+
+        self._index = index
+        self._source_stat, self._artifact_stat = source_stat, artifact_stat
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_palette_store():
+    """Return the process-wide PaletteStore, configured from the environment."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PaletteStore(reload_interval=float(os.environ.get("COLOR_AI_PALETTE_RELOAD_S", 5)))
+    return _store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("build", "check"))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = compile_palettes()
+        print(f"Compiled {len(index.all_hex)} swatches in {len(index.seasons)} seasons "
+              f"to {ARTIFACT_PATH} in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    else:
+        index, built_from = read_artifact()
+        fresh = built_from == palettes_version()
+        print(f"{ARTIFACT_PATH}: {'fresh' if fresh else 'stale'} ({len(index.all_hex)} swatches)")
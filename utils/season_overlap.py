@@ -0,0 +1,141 @@
+"""
+Season-to-season palette overlap.
+
+When a classification lands between seasons we show which swatches the
+neighbouring seasons share. Rather than comparing palettes on every request,
+SeasonOverlap precomputes, once per palette version, the nearest swatch of
+every other season for each swatch:
+
+    nearest_dist   (swatches, seasons) float32 CAM02-UCS distance
+    nearest_row    (swatches, seasons) int32 row of that swatch in all_hex
+
+That is a few tens of kilobytes for all palettes and does not depend on the
+threshold. From it:
+
+- similarity(delta_e) is the (seasons, seasons) matrix of the fraction of
+  swatches that have a partner within delta_e in the other season, averaged
+  over both directions (1.0 = every swatch has a near twin). The last
+  SIMILARITY_CACHE_SIZE matrices are cached per delta_e, so after the first
+  call a pair is an O(1) lookup.
+- chamfer is the threshold-free (seasons, seasons) mean nearest-swatch
+  distance, averaged over both directions.
+- pair(a, b, delta_e) lists the shared swatches themselves.
+"""
+
+import threading
+
+import numpy as np
+
+from utils.color_difference import get_palette_index
+from utils.metrics import record_cache
+
+DEFAULT_DELTA_E = 5.0
+SIMILARITY_CACHE_SIZE = 32
+
+
+class SeasonOverlap:
+    """Precomputed nearest-swatch distances between every pair of seasons."""
+
+    def __init__(self, index):
+        self.index = index
+        self.seasons = list(index.seasons)
+        self._season_index = {season: i for i, season in enumerate(self.seasons)}
+        ucs = index.all_ucs
+        n_seasons = len(self.seasons)
+
+        diff = ucs[:, None, :] - ucs[None, :, :]
+        dists = np.sqrt(np.sum(diff * diff, axis=2))
+        # Reuse the index's padded (season, slot) grid: gather each season's
+        # columns, pad with inf, and take the per-season minimum.
+        slots, padding = index.season_grid()
+        grid = np.where(padding[None], np.inf, dists[:, slots])
+        columns = grid.argmin(axis=2)
+        self.nearest_dist = np.take_along_axis(grid, columns[..., None], axis=2)[..., 0].astype(np.float32)
+        self.nearest_row = slots[np.arange(n_seasons), columns].astype(np.int32)
+
+        starts = index.offsets[:-1]
+        sizes = np.diff(index.offsets)
+        self._starts, self._sizes = starts, sizes
+        one_way = np.add.reduceat(self.nearest_dist.astype(np.float64), starts, axis=0) / sizes[:, None]
+        self.chamfer = (one_way + one_way.T) / 2
+        self._similarity = {}
+        self._similarity_lock = threading.Lock()
+
+    def _compute_similarity(self, delta_e):
+        within = np.add.reduceat((self.nearest_dist < delta_e).astype(np.float64), self._starts, axis=0)
+        one_way = within / self._sizes[:, None]
+        return (one_way + one_way.T) / 2
+
+    def similarity(self, delta_e=DEFAULT_DELTA_E):
+        """(seasons, seasons) overlap scores at delta_e, cached per value."""
+        delta_e = float(delta_e)
+        matrix = self._similarity.get(delta_e)
+        record_cache("season_similarity", matrix is not None)
+        if matrix is None:
+            matrix = self._compute_similarity(delta_e)
+            with self._similarity_lock:
+                if len(self._similarity) >= SIMILARITY_CACHE_SIZE:
+                    self._similarity.pop(next(iter(self._similarity)))
+                self._similarity[delta_e] = matrix
+        return matrix
+
+    def _season(self, name):
+        try:
+            return self._season_index[name]
+        except KeyError:
+            raise ValueError(f"Unknown season: {name}")
+
+    def pair(self, season_a, season_b, delta_e=DEFAULT_DELTA_E):
+        """
+        Overlap between two seasons: similarity, chamfer distance and every
+        swatch of season_a with a partner in season_b within delta_e,
+        closest first.
+        """
+        a, b = self._season(season_a), self._season(season_b)
+        rows = np.arange(self._starts[a], self._starts[a] + self._sizes[a])
+        dists = self.nearest_dist[rows, b]
+        hits = np.flatnonzero(dists < delta_e)
+        hits = hits[np.argsort(dists[hits], kind="stable")]
+        hex_labels = self.index.all_hex
+        return {
+            "seasons": [season_a, season_b],
+            "delta_e": delta_e,
+            "similarity": float(self.similarity(delta_e)[a, b]),
+            "chamfer": float(self.chamfer[a, b]),
+            "shared": [
+                {
+                    season_a: hex_labels[rows[i]],
+                    season_b: hex_labels[self.nearest_row[rows[i], b]],
+                    "delta_e": float(dists[i]),
+                }
+                for i in hits
+            ],
+        }
+
+    def neighbours(self, season, delta_e=DEFAULT_DELTA_E):
+        """Every other season ranked by similarity to season (most similar first)."""
+        a = self._season(season)
+        scores = self.similarity(delta_e)[a]
+        order = sorted((i for i in range(len(self.seasons)) if i != a), key=lambda i: (-scores[i], self.chamfer[a, i]))
+        return [
+            {"season": self.seasons[i], "similarity": float(scores[i]), "chamfer": float(self.chamfer[a, i])}
+            for i in order
+        ]
+
+
+_overlap = None
+_overlap_lock = threading.Lock()
+
+
+def get_season_overlap():
+    """The SeasonOverlap for the current palettes, rebuilt when they are reloaded."""
+    global _overlap
+    index = get_palette_index()
+    overlap = _overlap
+    record_cache("season_overlap", overlap is not None and overlap.index is index)
+    if overlap is None or overlap.index is not index:
+        with _overlap_lock:
+            if _overlap is None or _overlap.index is not index:
+                _overlap = SeasonOverlap(index)
+            overlap = _overlap
+    return overlap
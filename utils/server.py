@@ -0,0 +1,109 @@
+"""
+Shared FastAPI plumbing for the serverless endpoints in ``api/``.
+"""
+
+import asyncio
+import contextlib
+from io import BytesIO
+
+import numpy as np
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from PIL import Image
+
+from utils.degradation import get_degradation_controller
+from utils.executor import Deadline, ExecutorSaturated, default_deadline, get_executor
+from utils.flight_recorder import get_flight_recorder
+from utils.metrics import render_prometheus, snapshot, span
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+DISCONNECT_POLL_SECONDS = 0.1
+
+ops_router = APIRouter()
+
+
+@ops_router.get("/api/health")
+async def health():
+    """
+    Liveness check. Served on the event loop, so it stays responsive while
+    inference runs on the executor.
+    """
+    return {"status": "ok", "executor": get_executor().stats(), "metrics": snapshot()}
+
+
+@ops_router.get("/metrics")
+@ops_router.get("/api/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@ops_router.get("/api/debug/slow_requests")
+async def slow_requests(limit: int = 50):
+    """Most recent requests over the flight recorder's latency threshold."""
+    recorder = get_flight_recorder()
+    return {"threshold_ms": recorder.threshold * 1000, "requests": recorder.entries(limit)}
+
+
+def rejection_response(exc):
+    """
+    Turn an ExecutorRejected error into a fast 429/503 with Retry-After.
+    Saturation is reported to the degradation controller so it steps the
+    inference tier down.
+    """
+    if isinstance(exc, ExecutorSaturated):
+        get_degradation_controller().observe_rejection()
+    return JSONResponse(
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={"error": str(exc)},
+    )
+
+
+def request_deadline(request):
+    """
+    Deadline for a request: the client's X-Request-Deadline-Ms budget if it
+    sent one, otherwise the configured default.
+    """
+    value = request.headers.get(DEADLINE_HEADER)
+    if value is None:
+        return default_deadline()
+    try:
+        timeout_ms = float(value)
+    except ValueError:
+        raise ValueError(f"{DEADLINE_HEADER} must be a number of milliseconds.")
+    return Deadline(max(0.0, timeout_ms) / 1000)
+
+
+@contextlib.asynccontextmanager
+async def cancel_on_disconnect(request, deadline):
+    """
+    Watch the connection while the body runs and cancel the deadline if the
+    client goes away, so the remaining stages are skipped.
+    """
+
+    async def watch():
+        while not deadline.cancelled:
+            if await request.is_disconnected():
+                deadline.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+
+def decode_image(contents):
+    """
+    Decode uploaded image bytes into an RGB numpy array.
+    """
+    with span("decode"):
+        pil_image = Image.open(BytesIO(contents)).convert("RGB")
+        image_np = np.array(pil_image)
+
+    if image_np is None or len(image_np.shape) != 3 or image_np.shape[-1] != 3:  # Validate the image
+        raise ValueError("Invalid image file or incorrect number of channels (not RGB).")
+    return image_np
@@ -1,6 +1,9 @@
+import logging
 import numpy as np
 import cv2
 
+logger = logging.getLogger(__name__)
+
 
 def process_image(image):
     """
@@ -13,7 +16,7 @@ def process_image(image):
     Returns:
         tuple: A-channel, B-channel, and mask of valid pixels.
     """
-    print("image shape recived:", image.shape)
+    logger.debug("image shape received: %s", image.shape)
     # Convert BGR image to LAB color space
     lab_image = cv2.cvtColor(image, cv2.COLOR_BGR2Lab)
     a_channel = lab_image[:, :, 1]
@@ -75,8 +78,6 @@ def classify_tone(image):
     Returns:
         str: The detected tone ('Warm', 'Cool', 'Neutral').
     """
-    print("starting undertone_analysis function")
-    
     try:
         # Process the image to extract LAB channels and mask
         a_channel, b_channel, mask = process_image(image)